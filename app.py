@@ -4,12 +4,16 @@ import csv
 import json
 import requests
 import os
-import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, ServerlessSpec
+from batch_encoder import BatchEncoder
+from inference import load_sentence_model
+from lazy import Lazy, lazy_import, preload
+from result_cache import ResultCache, cache_key
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+pd = lazy_import("pandas")
+# The model and the Pinecone connection are made on first use (or by the preload below),
+# so the server starts accepting requests straight away
+model = Lazy(lambda: load_sentence_model('all-MiniLM-L6-v2'), "sentence model")
 
 app = Flask(__name__)
 # Load environment variables
@@ -18,15 +22,41 @@ load_dotenv()
 FREESOUND_API_KEY = os.getenv('FREESOUND_API_KEY')
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 
-# Initialize Pinecone
-pc = Pinecone(
-    api_key=os.environ.get("PINECONE_API_KEY")
-)
-
 index_name = "freesound-sounds"  # Index name
-
-index = pc.Index(index_name)
-print(index)
+# "pinecone", or "local" to answer /search from sounds.csv/samples.csv on disk (works offline)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'pinecone')
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'search_index.npz')
+
+def connect_index():
+    if SEARCH_BACKEND == 'local':
+        from vector_index import LocalIndex
+
+        return LocalIndex(['sounds.csv', 'samples.csv'], path=SEARCH_INDEX_PATH)
+    if SEARCH_BACKEND != 'pinecone':
+        raise ValueError(f"Unknown SEARCH_BACKEND: {SEARCH_BACKEND}")
+    from pinecone import Pinecone
+
+    pc = Pinecone(
+        api_key=os.environ.get("PINECONE_API_KEY")
+    )
+    pinecone_index = pc.Index(index_name)
+    print(pinecone_index)
+    return pinecone_index
+
+index = Lazy(connect_index, f"{SEARCH_BACKEND} index")
+preload(model, index)
+
+# /search queries that arrive within SEARCH_BATCH_WAIT_MS of each other share one forward pass
+# (SEARCH_BATCH_SIZE=1 encodes every query on its own)
+encoder = BatchEncoder(model,
+                       max_batch=int(os.getenv('SEARCH_BATCH_SIZE', '32')),
+                       max_wait=float(os.getenv('SEARCH_BATCH_WAIT_MS', '5')) / 1000,
+                       report_interval=float(os.getenv('SEARCH_STATS_INTERVAL', '0')))
+
+# Responses of the search routes, keyed by route, normalized query and parameters
+# (SEARCH_CACHE_SIZE=0 turns caching off)
+cache = ResultCache(maxsize=int(os.getenv('SEARCH_CACHE_SIZE', '256')),
+                    ttl=float(os.getenv('SEARCH_CACHE_TTL', '300')))
 
 
 # Blank route
@@ -38,6 +68,10 @@ def home():
 @app.route('/search_sound', methods=['GET'])
 def search_sounds():
     query = request.args.get('query', 'nature')  # Default to 'nature' if no query
+    key = cache_key('search_sound', query)
+    cached = cache.get(key)
+    if cached is not None:
+        return jsonify(cached)
     try:
         # Make a request to Freesound's API
         url = f"https://freesound.org/apiv2/search/text/"
@@ -60,7 +94,7 @@ def search_sounds():
                 "preview": sound["previews"]["preview-lq-mp3"]  # Low-quality preview URL
             })
 
-        return jsonify(sounds)
+        return jsonify(cache.put(key, sounds))
 
     except requests.exceptions.RequestException as e:  # Corrected this line
         return jsonify({"error": str(e)}), 500
@@ -70,6 +104,11 @@ def search_sounds():
 @app.route('/random_search', methods=['GET'])
 def random_search_sounds():
     query = request.args.get('query', 'sound')  # Default to 'sound'
+    # A repeat within the TTL returns the same sounds without refetching, re-embedding or re-pushing them
+    key = cache_key('random_search', query, page_size=50)
+    cached = cache.get(key)
+    if cached is not None:
+        return jsonify(cached)
     try:
         # Fetch sounds from Freesound API
         url = f"https://freesound.org/apiv2/search/text/"
@@ -103,8 +142,10 @@ def random_search_sounds():
 
         # Push to Pinecone
         push_to_pinecone(sound_metadata, embeddings)
+        # The index changed, so earlier /search results may be out of date
+        cache.invalidate('search')
 
-        return jsonify(sound_metadata)
+        return jsonify(cache.put(key, sound_metadata))
 
     except requests.exceptions.RequestException as e:
         return jsonify({"error": str(e)}), 500
@@ -120,7 +161,12 @@ def search_embeddings():
         if not query_text:
             return jsonify({"error": "Query text is required"}), 400
 
-        query_embedding = model.encode([query_text])[0].tolist()
+        key = cache_key('search', query_text, top_k=5, backend=SEARCH_BACKEND)
+        cached = cache.get(key)
+        if cached is not None:
+            return jsonify(cached)
+
+        query_embedding = encoder.encode([query_text])[0].tolist()
 
         results = index.query(
             vector=query_embedding,
@@ -138,12 +184,18 @@ def search_embeddings():
                 "metadata": match.get('metadata', {})
             })
 
-        return jsonify(response_data)
+        return jsonify(cache.put(key, response_data))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# Throughput, latency and batch sizes of the /search encoder, and result cache hit rate
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(dict(encoder.stats(), cache=cache.stats()))
+
+
 @app.route('/test', methods=['POST'])
 def test():
     return jsonify({"message": "POST request received"})
@@ -162,9 +214,10 @@ def save_to_csv(metadata, embeddings, filename='sounds.csv'):
 
 
 # Push metadata and embeddings to Pinecone
+# (or to the local index with SEARCH_BACKEND=local), in one upsert
 def push_to_pinecone(metadata, embeddings):
-    for item, embedding in zip(metadata, embeddings):
-        index.upsert([(str(item["id"]), embedding, {"name": item["name"], "description": item["description"]})])
+    index.upsert([(str(item["id"]), embedding, {"name": item["name"], "description": item["description"]})
+                  for item, embedding in zip(metadata, embeddings)])
 
 
 # Run the app
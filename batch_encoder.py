@@ -0,0 +1,169 @@
+"""
+Micro-batching front end for a SentenceTransformer.
+
+Request threads (Flask's, for app.py) submit single queries. One worker
+thread collects whatever arrives within max_wait of the first query, up to
+max_batch, and encodes it with a single model.encode call. Each waiting
+request then gets its own row. Under concurrent load, many requests share
+one forward pass instead of each running its own. A lone request waits at
+most max_wait.
+
+    encoder = BatchEncoder(model, max_batch=32, max_wait=0.005)
+    encoder.encode([query_text])[0]     # same call as model.encode
+    encoder.stats()                     # throughput, latency, batch sizes
+"""
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+MAX_BATCH = 32
+MAX_WAIT = 0.005           # Seconds to wait for more queries after the first
+REPORT_INTERVAL = 0.0      # Seconds between metric log lines (0 = off)
+LATENCY_HISTORY = 1000     # Recent requests kept for latency percentiles
+
+
+class Request:
+    def __init__(self, text):
+        self.text = text
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class BatchEncoder:
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT, report_interval=REPORT_INTERVAL,
+                 **encode_options):
+        """
+        Args:
+            model: Anything with model.encode(list_of_texts) -> 2-D array (a Lazy model works;
+                it is only loaded when the first batch is encoded)
+            max_batch (int): Most queries encoded together; 1 turns batching off
+            max_wait (float): Seconds to wait for more queries after the first
+            report_interval (float): Seconds between metric log lines, 0 to disable
+            encode_options: Passed to every model.encode call
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.encode_options = encode_options
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+        self.thread = threading.Thread(target=self.run, name="batch-encoder", daemon=True)
+        self.thread.start()
+        if report_interval:
+            threading.Thread(target=self.report, args=(report_interval,), daemon=True).start()
+
+    # -------------------------------
+    # REQUESTS
+    # -------------------------------
+    def submit(self, text):
+        """
+        Queue one text for encoding.
+
+        Returns:
+            Future: Resolves to its embedding (1-D np.ndarray)
+        """
+        request = Request(text)
+        self.queue.put(request)
+        return request.future
+
+    def encode(self, texts, **_options):
+        """
+        Blocking encode with the same call shape as model.encode: a string
+        gives one vector, a list gives a 2-D array. Per-call options are
+        ignored; the batch uses the encoder's encode_options.
+        """
+        if isinstance(texts, str):
+            return self.submit(texts).result()
+        futures = [self.submit(text) for text in texts]
+        return np.array([future.result() for future in futures])
+
+    # -------------------------------
+    # WORKER
+    # -------------------------------
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+                except queue.Empty:
+                    break
+            self.encode_batch(batch)
+
+    def encode_batch(self, batch):
+        # The same query sent twice in one batch is encoded once
+        texts = list(dict.fromkeys(request.text for request in batch))
+        start = time.perf_counter()
+        try:
+            vectors = self.model.encode(texts, **self.encode_options)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        encode_time = time.perf_counter() - start
+        rows = dict(zip(texts, vectors))
+        now = time.perf_counter()
+        with self.lock:
+            self.batch_sizes[len(batch)] += 1
+            self.encode_times.append(encode_time)
+            for request in batch:
+                self.latencies.append(now - request.submitted)
+            self.completed += len(batch)
+            self.batches += 1
+        for request in batch:
+            request.future.set_result(rows[request.text])
+
+    # -------------------------------
+    # METRICS
+    # -------------------------------
+    def reset_stats(self):
+        with self.lock:
+            self.latencies = collections.deque(maxlen=LATENCY_HISTORY)
+            self.encode_times = collections.deque(maxlen=LATENCY_HISTORY)
+            self.batch_sizes = collections.Counter()
+            self.completed = 0
+            self.batches = 0
+            self.since = time.perf_counter()
+
+    def stats(self):
+        """Throughput since the last reset, request latency (queueing + encode) and encode time percentiles in ms."""
+        with self.lock:
+            latencies = list(self.latencies)
+            encode_times = list(self.encode_times)
+            batches = dict(self.batch_sizes)
+            completed, batch_count = self.completed, self.batches
+            elapsed = time.perf_counter() - self.since
+
+        def percentiles(values):
+            if not values:
+                return {}
+            return {f"p{p}": float(np.percentile(values, p)) * 1000 for p in (50, 95, 99)}
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "completed": completed,
+            "throughput": completed / elapsed if elapsed > 0 else 0.0,
+            "mean_batch": completed / batch_count if batch_count else 0.0,
+            "latency_ms": percentiles(latencies),
+            "encode_ms": percentiles(encode_times),
+            "batch_sizes": batches,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def report(self, interval):
+        while True:
+            time.sleep(interval)
+            stats = self.stats()
+            if stats["completed"]:
+                print(f"[Encoder] queue={stats['queue_depth']} done={stats['completed']} "
+                      f"{stats['throughput']:.1f} req/s mean batch={stats['mean_batch']:.1f} "
+                      f"latency p50={stats['latency_ms'].get('p50', 0):.1f}ms "
+                      f"p95={stats['latency_ms'].get('p95', 0):.1f}ms "
+                      f"encode p50={stats['encode_ms'].get('p50', 0):.1f}ms")
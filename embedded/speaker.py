@@ -1,44 +1,248 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from math import gcd
 import sounddevice as sd
 import soundfile as sf
 import numpy as np
 from scipy import signal
 
-def play_audio(mp3_path, volume_increase=1):
-    # Set the desired audio device
-    device_name = "USBAudio2.0"  # Name of the USB audio device
-    device_info = sd.query_devices(device_name, 'output')
-    device_id = device_info['index']
-    device_sample_rate = device_info['default_samplerate']
-
-    # Load the MP3 file
-    data, sample_rate = sf.read(mp3_path, dtype='float32')
-
-    # Resample if necessary
-    if sample_rate != device_sample_rate:
-        print(f"Resampling from {sample_rate} to {device_sample_rate}")
-        number_of_samples = int(round(len(data) * float(device_sample_rate) / sample_rate))
-        data = signal.resample(data, number_of_samples)
-        sample_rate = device_sample_rate
-
-    # Increase the volume (optional)
-    data = data * volume_increase
-
-    max_val = np.max(np.abs(data))
-    target_max = 0.1 #decided for this specific device and where clipping occurs
-    if max_val > 0:
-        data = (data / max_val) * target_max
-        
-    if len(data.shape) == 1:
-        data = np.stack((data, data), axis=1)
+DEVICE_NAME = "USBAudio2.0"  # Name of the USB audio device
+TARGET_PEAK = 0.1            # Decided for this specific device and where clipping occurs
+CHANNELS = 2
+BLOCK_SIZE = 512
+CACHE_CLIPS = 16             # Prepared clips kept in memory
 
+_session = None
+_session_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def polyphase_filter(up, down):
+    """Anti-aliasing FIR for resample_poly, designed once per rate pair (same design scipy uses)."""
+    factor = max(up, down)
+    return signal.firwin(2 * 10 * factor + 1, 1.0 / factor, window=('kaiser', 5.0))
+
+def resample(data, sample_rate, device_rate):
+    g = gcd(int(sample_rate), int(device_rate))
+    up, down = int(device_rate) // g, int(sample_rate) // g
+    return signal.resample_poly(data, up, down, axis=0, window=polyphase_filter(up, down)).astype(np.float32)
+
+
+class Voice:
+    def __init__(self, data, requested=None):
+        self.data = data          # (frames, 1) or (frames, CHANNELS); mono is broadcast when mixed
+        self.position = 0
+        self.done = threading.Event()
+        self.requested = requested or time.perf_counter()
+        self.first_audio = None   # perf_counter() of the first callback that played this voice
+
+    @property
+    def time_to_first_audio(self):
+        return self.first_audio - self.requested if self.first_audio else None
+
+    def mix_into(self, mix):
+        """Add the next block. Returns False once the clip has finished."""
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        chunk = self.data[self.position:self.position + len(mix)]
+        mix[:len(chunk)] += chunk
+        self.position += len(chunk)
+        if self.position >= len(self.data):
+            self.done.set()
+            return False
+        return True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class StreamVoice(Voice):
+    def __init__(self, requested=None):
+        """
+        A voice fed block by block while it plays (see SpeakerSession.play_stream).
+        If the renderer falls behind the callback plays silence for it and counts
+        an underrun instead of waiting.
+        """
+        super().__init__(None, requested)
+        self.blocks = deque()
+        self.ended = False
+        self.underruns = 0
+
+    def feed(self, block):
+        self.blocks.append(block)
+
+    def end(self):
+        self.ended = True
+
+    def mix_into(self, mix):
+        if self.first_audio is None:
+            if not self.blocks:
+                if self.ended:
+                    # The renderer finished (or failed) without producing anything
+                    self.done.set()
+                    return False
+                return True   # Not started yet; don't count the wait for the first block
+            self.first_audio = time.perf_counter()
+        written = 0
+        while written < len(mix):
+            if self.data is None or self.position >= len(self.data):
+                if not self.blocks:
+                    if self.ended:
+                        self.done.set()
+                        return False
+                    self.underruns += 1
+                    return True
+                self.data = self.blocks.popleft()
+                self.position = 0
+            chunk = self.data[self.position:self.position + len(mix) - written]
+            mix[written:written + len(chunk)] += chunk
+            written += len(chunk)
+            self.position += len(chunk)
+        return True
+
+
+class SpeakerSession:
+    def __init__(self, device_name=DEVICE_NAME, channels=CHANNELS, blocksize=BLOCK_SIZE, cache_size=CACHE_CLIPS):
+        """
+        Keep the output device open and play clips through one persistent stream.
+
+        The device is looked up once, decoded and resampled clips are cached
+        by file content, and play() returns immediately; the callback mixes
+        whatever is playing. Falls back to the default output if the USB
+        device isn't connected.
+        """
+        try:
+            device_info = sd.query_devices(device_name, 'output')
+        except ValueError:
+            print(f"{device_name} not found, using the default output")
+            device_info = sd.query_devices(kind='output')
+        self.device_id = device_info['index']
+        self.sample_rate = int(device_info['default_samplerate'])
+        self.channels = channels
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.incoming = deque()   # Voices handed to the callback (append/popleft are atomic)
+        self.voices = []
+        self.stop_requested = False
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=channels, blocksize=blocksize,
+                                      dtype='float32', device=self.device_id, callback=self.callback)
+        self.stream.start()
+
+    def callback(self, outdata, frames, time_info, status):
+        if self.stop_requested:
+            for voice in self.voices:
+                voice.done.set()
+            self.voices = []
+            self.stop_requested = False
+        while self.incoming:
+            self.voices.append(self.incoming.popleft())
+        outdata.fill(0)
+        if self.voices:
+            self.voices = [voice for voice in self.voices if voice.mix_into(outdata)]
+            np.clip(outdata, -1.0, 1.0, out=outdata)
+
+    def prepare(self, data, sample_rate, volume_increase=1, target_peak=TARGET_PEAK):
+        """Resample, apply gain and peak-normalize float32 audio for the device."""
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = data[:, None]
+        if sample_rate != self.sample_rate and len(data):
+            data = resample(data, sample_rate, self.sample_rate)
+        data = data * volume_increase
+        max_val = np.max(np.abs(data)) if len(data) else 0.0
+        if max_val > 0 and target_peak:
+            data *= target_peak / max_val
+        if data.shape[1] not in (1, self.channels):
+            data = data.mean(axis=1, keepdims=True)
+        return np.ascontiguousarray(data)
+
+    def load(self, path, volume_increase=1, target_peak=TARGET_PEAK):
+        """Decode and prepare a file, reusing the result if the same content was played before."""
+        with open(path, 'rb') as f:
+            content = f.read()
+        key = (hashlib.sha1(content).hexdigest(), volume_increase, target_peak)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        data, sample_rate = sf.read(io.BytesIO(content), dtype='float32')
+        data = self.prepare(data, sample_rate, volume_increase, target_peak)
+        self.cache[key] = data
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return data
+
+    def play_array(self, data, requested=None):
+        """Start playing prepared audio (see prepare()). Returns a Voice; call .wait() to block."""
+        voice = Voice(data, requested)
+        self.incoming.append(voice)
+        return voice
+
+    def play(self, path, volume_increase=1, target_peak=TARGET_PEAK, requested=None):
+        requested = requested or time.perf_counter()
+        return self.play_array(self.load(path, volume_increase, target_peak), requested)
+
+    def play_stream(self, blocks, requested=None):
+        """
+        Play (frames, channels) float32 blocks at the device rate as a
+        generator renders them. Playback starts with the first block; the
+        rest are rendered on a background thread while it plays.
+        """
+        voice = StreamVoice(requested)
+
+        def render():
+            try:
+                for block in blocks:
+                    voice.feed(np.ascontiguousarray(block, dtype=np.float32))
+            except Exception as e:
+                print(f"Error rendering audio: {e}")
+            finally:
+                voice.end()
+
+        threading.Thread(target=render, daemon=True).start()
+        self.incoming.append(voice)
+        return voice
+
+    def stop(self):
+        self.stop_requested = True
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+def get_session(device_name=DEVICE_NAME):
+    """Process-wide speaker session, opened on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = SpeakerSession(device_name)
+        return _session
+
+
+def play_audio(mp3_path, volume_increase=1, wait=True, requested=None):
+    """
+    Play a file on the USB speaker. The device stays open between calls and
+    repeated files skip decoding and resampling.
+
+    Args:
+        requested (float): perf_counter() time the caller started, for voice.time_to_first_audio
+
+    Returns:
+        Voice: The playing clip; with wait=False call .wait() on it to block
+    """
     try:
-        # Play the audio using the specified device
-        sd.play(data, samplerate=sample_rate, device=device_id)
-        sd.wait()
-        print("Audio played successfully")
+        voice = get_session().play(mp3_path, volume_increase, requested=requested)
     except sd.PortAudioError as e:
         print(f"Error playing audio: {e}")
-        print(f"Supported sample rates for this device: {device_sample_rate}")
-        
+        return None
+    if wait:
+        voice.wait()
+        print("Audio played successfully")
+    return voice
+
 if __name__ == "__main__":
-    play_audio("midi/C Major Piano.wav", volume_increase=0.3)
\ No newline at end of file
+    play_audio("midi/C Major Piano.wav", volume_increase=0.3)
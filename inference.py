@@ -0,0 +1,137 @@
+"""
+Model loading for CPU inference (the Pi and the no-GPU hosts).
+
+INFERENCE_MODE=int8 applies dynamic int8 quantization to the Linear layers
+of Whisper and the sentence model. The quantized model is cached on disk, so
+later starts skip loading the fp32 weights and converting them.
+INFERENCE_THREADS sets torch's thread count. With neither set, the models
+load exactly as before (fp32, torch's default threads).
+
+    from inference import load_whisper, load_sentence_model
+    model = load_whisper("tiny")
+    encoder = load_sentence_model('all-MiniLM-L6-v2')
+"""
+import os
+import tempfile
+import threading
+import time
+
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "fp32")   # "fp32" or "int8"
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0")) or None
+CACHE_DIR = os.environ.get("QUANTIZED_CACHE", os.path.expanduser("~/.cache/w25-ai-instrument/quantized"))
+MODES = ("fp32", "int8")
+
+_cache_lock = threading.Lock()   # One build per process; the others wait and load the result
+
+
+def set_threads(threads):
+    """Set torch's intra-op thread count (and inter-op, if torch hasn't started using it yet)."""
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass  # Only allowed before the first parallel op
+
+
+def cache_path(kind, name):
+    import torch
+
+    safe_name = name.strip("/").replace("/", "_")
+    return os.path.join(CACHE_DIR, f"{kind}-{safe_name}-torch{torch.__version__}.pt")
+
+
+def quantize(model):
+    """Dynamic int8 quantization: Linear weights stored as int8, activations quantized per batch."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_cached(kind, name, build):
+    """
+    Load a quantized model from the cache, or build and cache it.
+
+    The whole module is pickled, so a cached load doesn't touch the fp32
+    checkpoint at all. The cache key includes the torch version, because
+    packed int8 weights aren't portable across versions.
+    """
+    import torch
+
+    path = cache_path(kind, name)
+    with _cache_lock:
+        if os.path.exists(path):
+            try:
+                start = time.perf_counter()
+                model = torch.load(path, weights_only=False)
+                print(f"[Inference] Loaded int8 {name} from cache ({time.perf_counter() - start:.2f}s)")
+                return model
+            except Exception as e:
+                print(f"[Inference] Cached {path} is unusable ({e}), rebuilding")
+        start = time.perf_counter()
+        model = build()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Each builder writes its own file, so worker processes building at once can't interleave
+        # writes; the last complete rename wins
+        fd, temporary = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                torch.save(model, f)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        print(f"[Inference] Quantized {name} to int8 in {time.perf_counter() - start:.2f}s, cached at {path}")
+        return model
+
+
+def load_whisper(name="tiny", mode=None, threads=None, device=None):
+    """
+    whisper.load_model with an optional int8 mode.
+
+    Args:
+        name (str): Whisper model name
+        mode (str): "fp32" or "int8", defaults to INFERENCE_MODE
+        threads (int): torch threads, defaults to INFERENCE_THREADS
+        device (str): Only used in fp32 mode; int8 always runs on the CPU
+    """
+    import whisper
+
+    mode = mode or INFERENCE_MODE
+    threads = threads or INFERENCE_THREADS
+    if threads:
+        set_threads(threads)
+    if mode == "fp32":
+        return whisper.load_model(name, device=device)
+    if mode != "int8":
+        raise ValueError(f"Unknown inference mode: {mode}")
+
+    def build():
+        import torch
+
+        model = whisper.load_model(name, device="cpu")
+        # whisper.model.Linear only adds a dtype cast for fp16; quantize_dynamic
+        # matches exact types, so turn it back into a plain Linear first
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear):
+                module.__class__ = torch.nn.Linear
+        return quantize(model)
+
+    return load_cached("whisper", name, build)
+
+
+def load_sentence_model(name_or_path='all-MiniLM-L6-v2', mode=None, threads=None):
+    """SentenceTransformer(name_or_path) with the same int8 mode and thread options as load_whisper."""
+    from sentence_transformers import SentenceTransformer
+
+    mode = mode or INFERENCE_MODE
+    threads = threads or INFERENCE_THREADS
+    if threads:
+        set_threads(threads)
+    if mode == "fp32":
+        return SentenceTransformer(name_or_path)
+    if mode != "int8":
+        raise ValueError(f"Unknown inference mode: {mode}")
+    return load_cached("sentence", name_or_path,
+                       lambda: quantize(SentenceTransformer(name_or_path, device="cpu")))
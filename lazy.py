@@ -0,0 +1,91 @@
+"""
+Deferred imports and models for faster start-up.
+
+    pd = lazy_import("pandas")               # imported on first attribute access
+    model = Lazy(lambda: load_sentence_model('all-MiniLM-L6-v2'))
+    model.encode(texts)                      # built on first use, once
+    preload(pd, model)                       # or warm them up on a background thread
+
+Set PRELOAD=0 to turn background preloading off (everything then loads on
+first use). scripts/profile_startup.py shows what each entry point still
+imports eagerly.
+"""
+import importlib
+import os
+import threading
+import time
+
+PRELOAD = os.environ.get("PRELOAD", "1") != "0"
+
+
+class Lazy:
+    def __init__(self, factory, name=None):
+        """
+        A value built by factory() the first time it's needed. Attribute
+        access is forwarded to it, so a Lazy can stand in for a module or a
+        model. Building is thread-safe: concurrent first uses wait for the
+        same build instead of starting their own.
+        """
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "value")
+        self._value = None
+        self._loaded = False
+        self._error = None
+        self._lock = threading.Lock()
+        self.load_time = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self._factory()
+                self.load_time = time.perf_counter() - start
+                self._loaded = True
+        return self._value
+
+    def __getattr__(self, attribute):
+        return getattr(self.get(), attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __repr__(self):
+        state = f"loaded in {self.load_time:.2f}s" if self._loaded else "not loaded"
+        return f"<Lazy {self._name} ({state})>"
+
+
+def lazy_import(module_name):
+    """A module that is imported the first time one of its attributes is used."""
+    return Lazy(lambda: importlib.import_module(module_name), module_name)
+
+
+def preload(*values, verbose=False):
+    """
+    Build Lazy values on a daemon thread, in order, so they are usually ready
+    by the time they are first used. Errors are left for the first real use
+    to raise. Does nothing with PRELOAD=0.
+
+    Returns:
+        threading.Thread or None
+    """
+    if not PRELOAD:
+        return None
+
+    def run():
+        for value in values:
+            try:
+                value.get()
+                if verbose:
+                    print(f"[Preload] {value!r}")
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
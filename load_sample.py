@@ -1,8 +1,10 @@
-from text_to_filename import text_to_filename
+from text_to_filename import model, text_to_filename
+from lazy import preload
 from pynput import keyboard
 import threading
 import time
 import zmq
+from midi import wire
 
 class KeyMonitor:
     def __init__(self):
@@ -33,6 +35,8 @@ def main():
     socket = context.socket(zmq.PUSH)  # Changed to PUSH socket
     socket.connect("tcp://localhost:5556")  # Connect to a different port for PUSH/PULL
     
+    # Load the sentence model while the first description is being typed
+    preload(model)
     print("Sample loader started. Waiting for input...")
     
     while True:
@@ -42,9 +46,8 @@ def main():
             filename = text_to_filename(text, 'samples.csv')
             full_path = 'samples/' + filename
             
-            # Send file change message
-            file_change_msg = ((255, full_path), 0)  # Type 255 for file change
-            socket.send_pyobj(file_change_msg)
+            # Send file change message (type 255)
+            socket.send_multipart([wire.CONTROL_TOPIC, wire.encode_control(wire.FILE_CHANGE, full_path)])
             print(f"Sent file change message for: {full_path}")
             
             print("Monitoring MIDI input. Press 'u' to change sample.")
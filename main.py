@@ -1,82 +1,99 @@
+import atexit
 import os
-import wave
+import sys
+import threading
 import time
 import ast
 import subprocess
-import requests
 import numpy as np
-import pandas as pd
-import pyaudio
-import whisper
-from midi.speaker import play_audio
-from sentence_transformers import SentenceTransformer
-from pedalboard import Pedalboard, Chorus, Reverb
-import embedded.get_reading as get_reading
-import soundfile as sf
-import librosa
+from whisper_STT.capture import get_capture
+from whisper_STT.vad import listen_for_utterance, make_detector
+from whisper_STT.server import get_client, get_service
+from whisper_STT.incremental import StreamingTranscriber, block_is_speech
+from inference import load_sentence_model
+from lazy import lazy_import, preload
+from pipeline import Pipeline, Stage
+
+# Heavy or hardware-bound modules are imported on first use (and preloaded in the background by main())
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+librosa = lazy_import("librosa")
+sf = lazy_import("soundfile")
+effects = lazy_import("pedalboard")
+audio_io = lazy_import("pedalboard.io")
+speaker = lazy_import("embedded.speaker")
+get_reading = lazy_import("embedded.get_reading")
 
 
 # -------------------------------
 # CONFIGURATION
 # -------------------------------
-RECORD_SECONDS = 8              # Total duration to record (in seconds)
+RECORD_SECONDS = 8              # Total duration to record (in seconds); with VAD, how long to wait for speech
+VAD = "energy"                  # "energy", "webrtc" (needs webrtcvad) or None for a fixed-length recording
+PRE_ROLL_SECONDS = 0.5           # Audio from before record_audio() was called that is kept
+WHISPER_MODEL = "tiny"
+WHISPER_SERVER = os.environ.get("WHISPER_SERVER")  # e.g. tcp://127.0.0.1:5590 to share a running whisper_STT.server
 SAMPLE_RATE = 16000              # Whisper prefers 16kHz
 CHANNELS = 1                     # Mono recording
 CHUNK_SIZE = 1024                # Number of frames per buffer
-AUDIO_FORMAT = pyaudio.paInt16   # Audio format
 
-WAVE_OUTPUT_FILENAME = "temp_chunk.wav"    # Temporary audio file
 TRANSCRIPT_FILE = "transcript.txt"         # File to save transcription
 SOUNDS_CSV = "sounds.csv"                  # CSV file with sound metadata and embeddings
+SEARCH_CSV = SOUNDS_CSV if os.path.exists(SOUNDS_CSV) else "samples.csv"  # Freesound previews, or local samples/
+SAMPLES_DIR = "samples"                    # Where samples.csv's files live
+DOWNLOAD_DIR = "downloads"                 # Downloaded previews, kept so repeated matches don't refetch
 TEMP_MP3_FILENAME = "temp_sound.mp3"       # Temporary sound preview file
+EFFECT_BLOCK = 4096                        # Frames rendered through the effects at a time
+
+# Set by main() when playback runs in the isolated audio process (--isolated-audio)
+audio_client = None
 
 # Local path to the SentenceTransformer model (update as needed)
 SENTENCE_MODEL_PATH = '/home/athavan/w25-ai-instrument/whisper_embeddings/all-MiniLM-L6-v2'
+SENTENCE_MODEL = SENTENCE_MODEL_PATH if os.path.exists(SENTENCE_MODEL_PATH) else 'all-MiniLM-L6-v2'
 
 # -------------------------------
 # RECORDING FUNCTION
 # -------------------------------
-def record_audio(filename, record_seconds=15):
-    """
-    Records audio for a given duration and saves it to a WAV file.
-    """
-    p = pyaudio.PyAudio()
-    stream = p.open(format=AUDIO_FORMAT,
-                    channels=CHANNELS,
-                    rate=SAMPLE_RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK_SIZE)
-    print(f"Recording audio for {record_seconds} seconds...")
-    frames = []
-    num_frames = int(SAMPLE_RATE / CHUNK_SIZE * record_seconds)
-    for _ in range(num_frames):
-        data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-        frames.append(data)
-    print("Recording finished.")
-
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+def record_audio(record_seconds=15, vad=VAD):
+    """
+    Returns microphone audio as a float32 array at SAMPLE_RATE, ready for
+    Whisper (no WAV file or ffmpeg decode).
 
-    with wave.open(filename, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(p.get_sample_size(AUDIO_FORMAT))
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(b''.join(frames))
-    print(f"Audio saved to {filename}.")
+    Audio comes from the always-on capture ring, so there is no device
+    start-up delay and the PRE_ROLL_SECONDS before the call are included.
+    With a VAD, recording stops as soon as the performer stops speaking and
+    only the utterance (with a little padding) is returned, or None if nobody
+    spoke within record_seconds. Without one, records record_seconds.
+    """
+    capture = get_capture(sample_rate=SAMPLE_RATE)
+    if vad:
+        print("Listening...")
+        blocks = capture.reader(PRE_ROLL_SECONDS).blocks(CHUNK_SIZE)
+        audio = listen_for_utterance(blocks, make_detector(vad), record_seconds, SAMPLE_RATE)
+    else:
+        print(f"Recording audio for {record_seconds} seconds...")
+        audio = capture.record(record_seconds, PRE_ROLL_SECONDS)
+    print("Recording finished.")
+    return audio
 
 # -------------------------------
 # TRANSCRIPTION FUNCTION
 # -------------------------------
-def transcribe_audio(audio_filename, transcript_filename):
+def transcribe_audio(audio, transcript_filename):
     """
-    Uses the Whisper model to transcribe the given audio file.
+    Uses the Whisper model to transcribe the given float32 16kHz audio array.
     Writes the transcription text to transcript_filename.
+
+    The model stays resident between calls: either a shared server process
+    (WHISPER_SERVER) or a service loaded in this process on first use.
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model("tiny")
+    if WHISPER_SERVER:
+        transcriber = get_client(WHISPER_SERVER)
+    else:
+        transcriber = get_service(WHISPER_MODEL)
     print("Transcribing audio...")
-    result = model.transcribe(audio_filename)
+    result = transcriber.transcribe(audio)
     text = result.get("text", "").strip()
     print("Transcription:", text)
 
@@ -138,65 +155,288 @@ def download_sound(url, filename):
         f.write(response.content)
     print(f"Downloaded sound saved as {filename}.")
 
-def play_sound(filename):
-    sound, sr = librosa.load(filename)
+def read_effect_settings():
+    """Reverb room size and chorus mix from the two knobs (0-3.3 V)."""
     r1, r2 = get_reading.get_reading()
-    r2 = r2 / 3.3
-    r1 = r1 / 3.3
-    pedalboard = Pedalboard([Reverb(room_size=r2), Chorus(mix=r1)])
-    sound = pedalboard(sound, sr)
-    sf.write("play.wav", sound, sr)
-    #play_audio("play.wav", volume_increase=4)
+    return r2 / 3.3, r1 / 3.3
+
+def render_effects(audio, sample_rate, room_size, chorus_mix, target_peak=0.1):
+    """
+    Yield the sound through the effects in EFFECT_BLOCK-frame blocks, so the
+    first block can play while the rest are processed. Streaming through the
+    board with reset=False gives the same output as one call on the whole clip.
+
+    The wet signal can peak above the dry one, and the whole clip can't be
+    normalized after the effects without waiting for all of it. So a peak
+    guard keeps the output at or below target_peak (the device's clipping
+    point). Its gain only ever drops, ramped across the block that needed it.
+
+    Args:
+        audio (np.ndarray): Mono float32 at the output rate
+    """
+    pedalboard = effects.Pedalboard([effects.Reverb(room_size=room_size), effects.Chorus(mix=chorus_mix)])
+    # Normalized on the dry peak (play_audio normalized after the effects)
+    sound = audio[None, :].copy()
+    peak = np.max(np.abs(sound)) if sound.size else 0.0
+    if peak > 0:
+        sound *= target_peak / peak
+    gain = 1.0
+    for start in range(0, sound.shape[1], EFFECT_BLOCK):
+        block = pedalboard(sound[:, start:start + EFFECT_BLOCK], sample_rate, reset=False)
+        wet_peak = np.max(np.abs(block)) if block.size else 0.0
+        if wet_peak * gain > target_peak:
+            new_gain = target_peak / wet_peak
+            block *= np.linspace(gain, new_gain, block.shape[1], dtype=np.float32)
+            gain = new_gain
+        elif gain != 1.0:
+            block *= gain
+        # The start of a ramp can still overshoot slightly
+        np.clip(block, -target_peak, target_peak, out=block)
+        yield block.T
+
+def play_sound(filename):
     """
-    Plays the sound file using an external player (here, mpv).
+    Decode the sound once at the speaker's rate, run it through the effects
+    in blocks and stream the blocks straight to the output: no play.wav, one
+    resample. Returns the playing Voice (voice.time_to_first_audio once it starts).
     """
+    requested = time.perf_counter()
     print(f"Playing sound: {filename}")
-    try: 
-        play_audio("play.wav", volume_increase=4)
-        #subprocess.run(["mpv", filename], check=True)
-    except subprocess.CalledProcessError as e:
-        print("Error playing sound:", e)
+    if audio_client is not None:
+        # The isolated audio process reads files, so it still gets play.wav
+        return play_sound_via_file(filename)
+    session = speaker.get_session()
+    with audio_io.AudioFile(filename) as f:
+        audio = f.read(f.frames)
+        sample_rate = f.samplerate
+    # Mono like librosa.load, then the speaker's cached polyphase filter straight to the device rate
+    audio = audio.mean(axis=0)
+    if sample_rate != session.sample_rate:
+        audio = speaker.resample(audio, sample_rate, session.sample_rate)
+    room_size, chorus_mix = read_effect_settings()
+    return session.play_stream(render_effects(audio, session.sample_rate, room_size, chorus_mix), requested)
+
+def play_sound_via_file(filename):
+    """The original path: librosa.load at 22050, effects, play.wav, then play_audio resamples it again."""
+    requested = time.perf_counter()
+    sound, sr = librosa.load(filename)
+    room_size, chorus_mix = read_effect_settings()
+    pedalboard = effects.Pedalboard([effects.Reverb(room_size=room_size), effects.Chorus(mix=chorus_mix)])
+    sound = pedalboard(sound, sr)
+    sf.write("play.wav", sound, sr)
+    if audio_client is not None:
+        # Same gain and 0.1 peak as play_audio, but played by the audio process
+        audio_client.play("play.wav", volume=4, normalize=0.1)
+        return None
+    return speaker.play_audio("play.wav", volume_increase=4, wait=False, requested=requested)
+
+def time_playback(filename, runs=3):
+    """Print time to first audio for the in-memory path and the play.wav path."""
+    for name, play in (("play.wav", play_sound_via_file), ("in-memory", play_sound)):
+        times = []
+        for _ in range(runs):
+            voice = play(filename)
+            if voice is None:   # Played by the isolated audio process, which isn't timed
+                continue
+            voice.wait()
+            if voice.time_to_first_audio is not None:   # None if nothing was rendered
+                times.append(voice.time_to_first_audio * 1000)
+        print(f"{name:<10} time to first audio: " + (", ".join(f"{t:.1f}" for t in times) or "-") + " ms")
+
+# -------------------------------
+# PIPELINE
+# -------------------------------
+class VoiceToSample:
+    def __init__(self, csv_filename=SEARCH_CSV):
+        """
+        Stages for one spoken request, run as a Pipeline:
+
+            listen -> transcribe -> search -> fetch -> play
+
+        Whisper, the sentence model and the dataset load while the performer
+        is already speaking. The transcription is incremental, so the search
+        runs on stable partial text and the fetch stage downloads those
+        matches early; by the time the final transcript arrives its sound is
+        usually already on disk.
+        """
+        self.csv_filename = csv_filename
+        self.timeline = {}   # Event -> seconds after the pipeline started
+        self.pending = []    # Transcripts produced by the transcriber callbacks
+        self.finished = False
+        self.last_query = None
+        self.fetched = {}
+        self.voice = None    # The clip play_sound started, if any
+        self.pipeline = Pipeline([
+            Stage("listen", self.listen),
+            Stage("transcribe", self.transcribe, setup=self.load_transcriber, flush=self.flush_transcriber,
+                  maxsize=int(10 * SAMPLE_RATE / CHUNK_SIZE)),  # Blocks captured while Whisper loads
+            Stage("search", self.search, setup=self.load_search),
+            Stage("fetch", self.fetch),
+            Stage("play", self.play),
+        ])
+
+    def mark(self, event):
+        self.timeline.setdefault(event, self.pipeline.elapsed())
+
+    def run(self):
+        results = self.pipeline.run()
+        self.pipeline.report()
+        for event, at in sorted(self.timeline.items(), key=lambda e: e[1]):
+            print(f"  {event:<16} {at:6.2f}s")
+        if "final transcript" in self.timeline and "sound" in self.timeline:
+            print(f"Final transcript to sound: {self.timeline['sound'] - self.timeline['final transcript']:.2f}s")
+        return results
+
+    def listen(self):
+        """Capture blocks tagged speech/non-speech until the transcript is final or nobody speaks."""
+        detector = make_detector(VAD or "energy")
+        reader = get_capture(sample_rate=SAMPLE_RATE).reader(PRE_ROLL_SECONDS)
+        waited = 0
+        for block in reader.blocks(CHUNK_SIZE):
+            if self.pipeline.stopped:
+                return
+            speech = block_is_speech(detector, block, SAMPLE_RATE)
+            if speech:
+                self.mark("speech")
+            elif "speech" not in self.timeline:
+                waited += len(block)
+                if waited > RECORD_SECONDS * SAMPLE_RATE:
+                    print("No speech detected.")
+                    return
+            # Copy: the transcriber may still be loading when the ring wraps
+            yield block.copy(), speech
+
+    def load_transcriber(self):
+        model = get_client(WHISPER_SERVER) if WHISPER_SERVER else get_service(WHISPER_MODEL)
+        self.transcriber = StreamingTranscriber(model, self.on_partial, self.on_final, SAMPLE_RATE)
+
+    def on_partial(self, stable, unstable):
+        if stable:
+            self.pending.append(("partial", stable))
+
+    def on_final(self, text):
+        self.pending.append(("final", text))
+
+    def take_transcripts(self):
+        for kind, text in self.pending:
+            print(f"[{kind.capitalize()}] {text}")
+            if kind == "final":
+                self.mark("final transcript")
+                self.finished = True
+                self.pipeline.stop()
+            else:
+                self.mark("first partial")
+            yield kind, text
+        self.pending.clear()
+
+    def transcribe(self, item):
+        if self.finished:
+            return  # Blocks captured after the request ended
+        block, speech = item
+        self.transcriber.insert(block, speech)
+        yield from self.take_transcripts()
+
+    def flush_transcriber(self):
+        # Capture ended mid-utterance: finalize what was said
+        if not self.finished:
+            self.transcriber.finish()
+            yield from self.take_transcripts()
+
+    def load_search(self):
+        self.encoder = load_sentence_model(SENTENCE_MODEL)
+        self.dataset = load_dataset(self.csv_filename)
+        index = np.array(self.dataset['embedding'].tolist(), dtype=np.float32)
+        self.index = index / np.linalg.norm(index, axis=1, keepdims=True)
+
+    def search(self, item):
+        kind, text = item
+        if kind == "partial" and text == self.last_query:
+            return
+        self.last_query = text
+        query = self.encoder.encode(text)
+        similarities = self.index @ (query / np.linalg.norm(query))
+        best = int(np.argmax(similarities))
+        match = self.dataset.iloc[best].drop('embedding').to_dict()
+        match['similarity'] = float(similarities[best])
+        self.mark("first match" if kind == "partial" else "final match")
+        print(f"[Search] {text!r} -> {match.get('name', match.get('filename'))} ({match['similarity']:.2f})")
+        yield kind, text, match
+
+    def fetch(self, item):
+        """Get the match onto disk; partial matches are prefetched and go no further."""
+        kind, text, match = item
+        key = match.get('preview') or match['filename']
+        if key not in self.fetched:
+            if match.get('preview'):
+                os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+                path = os.path.join(DOWNLOAD_DIR, f"{match.get('id', len(self.fetched))}.mp3")
+                if not os.path.exists(path):
+                    download_sound(match['preview'], path)
+            else:
+                path = os.path.join(SAMPLES_DIR, match['filename'])
+            self.fetched[key] = path
+        if kind == "final":
+            yield text, match, self.fetched[key]
+
+    def report_first_audio(self):
+        while self.voice.first_audio is None and not self.voice.done.is_set():
+            time.sleep(0.001)
+        if self.voice.time_to_first_audio is not None:
+            print(f"Time to first audio: {self.voice.time_to_first_audio * 1000:.1f} ms")
+
+    def play(self, item):
+        text, match, path = item
+        self.mark("sound")
+        self.voice = play_sound(path)
+        if self.voice is not None:
+            threading.Thread(target=self.report_first_audio, daemon=True).start()
+        yield text, match, path
 
 # -------------------------------
 # MAIN SCRIPT
 # -------------------------------
+def start_audio_server():
+    """
+    Run playback in its own minimal process so Whisper and the sentence model
+    in this one can't hold up the audio callback.
+    """
+    global audio_client
+    from midi.audio_server import AudioClient
+
+    process = subprocess.Popen([sys.executable, "-m", "midi.audio_server"])
+    atexit.register(process.terminate)
+    audio_client = AudioClient()
+    return process
+
 def main():
-    # Record audio for 15 seconds.
-    record_audio(WAVE_OUTPUT_FILENAME, RECORD_SECONDS)
-
-    # Transcribe the recorded audio using Whisper.
-    # transcribe_audio(WAVE_OUTPUT_FILENAME, TRANSCRIPT_FILE)
-    # if os.path.exists(WAVE_OUTPUT_FILENAME):
-    #     os.remove(WAVE_OUTPUT_FILENAME)
-
-    # # Create embeddings for the transcription.
-    # print("Loading sentence transformer model...")
-    # sentence_model = SentenceTransformer(SENTENCE_MODEL_PATH)
-    # print("Sentence model loaded.")
-    # query_text = get_query_text(TRANSCRIPT_FILE)
-    # if not query_text:
-    #     print("The transcript is empty. Exiting.")
-    #     return
-    # query_embedding = compute_query_embedding(query_text, sentence_model)
-
-    # # Compare the query embedding with embeddings from sounds.csv.
-    # print(f"Loading dataset from {SOUNDS_CSV} ...")
-    # df = load_dataset(SOUNDS_CSV)
-    # best_match = find_best_match(query_embedding, df)
-    # print("\nBest Matching Sound:")
-    # print("ID:", best_match['id'])
-    # print("Name:", best_match['name'])
-    # print("Description:", best_match['description'])
-    # print("Preview URL:", best_match['preview'])
-    # print("Similarity Score:", best_match['similarity'])
-
-    # # Download and play the most similar sound.
-    # preview_url = best_match['preview']
-    # download_sound(preview_url, TEMP_MP3_FILENAME)
-    # play_sound(TEMP_MP3_FILENAME)
-    # if os.path.exists(TEMP_MP3_FILENAME):
-    #     os.remove(TEMP_MP3_FILENAME)
-    # print("Done.")
+    # Everything the flow needs later is imported while the microphone opens and the models load
+    preload(pd, requests, speaker, effects, audio_io, get_reading)
+    if "--isolated-audio" in sys.argv and "--time-playback" in sys.argv:
+        # The audio process doesn't report when a clip starts, so there is nothing to time
+        print("--time-playback measures the in-process player; run it without --isolated-audio.")
+        return
+    if "--isolated-audio" in sys.argv:
+        start_audio_server()
+    if "--time-playback" in sys.argv:
+        # python main.py --time-playback samples/ESSKEETIT_808.wav
+        time_playback(sys.argv[sys.argv.index("--time-playback") + 1])
+        return
+    # Open the microphone now so it is already capturing (and filling the pre-roll) when we listen
+    get_capture(sample_rate=SAMPLE_RATE)
+
+    # Listen, transcribe, search, fetch and play as overlapping stages
+    flow = VoiceToSample()
+    results = flow.run()
+    if not results:
+        print("Nothing to play.")
+        return
+    text, match, path = results[-1]
+    print("\nBest Matching Sound:", match.get('name', match.get('filename')))
+    print("Description:", match.get('description'))
+    print("Similarity Score:", match['similarity'])
+    if flow.voice is not None:
+        flow.voice.wait()  # Let the sound finish before exiting
+    print("Done.")
 
 if __name__ == '__main__':
     main()
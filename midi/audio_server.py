@@ -0,0 +1,228 @@
+"""
+Dedicated real-time audio process.
+
+Plays clips on request from other processes (STT, embedding search, the
+sample loader) so that Whisper or SentenceTransformer work never runs in the
+interpreter that owns the audio callback. This module only imports numpy,
+sounddevice, soundfile and zmq: no torch, pandas, librosa, scipy or pedalboard.
+Effects are rendered by the requesting process before it sends the clip path.
+
+On start the process raises its scheduling priority (SCHED_FIFO if allowed,
+otherwise a lower nice value) so PortAudio's callback thread inherits it. The
+loader and stats threads drop back to normal priority.
+
+Usage:
+    python -m midi.audio_server --priority 70
+Then from any process:
+    AudioClient().play("play.wav", volume=4, normalize=0.1)
+"""
+import argparse
+import gc
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+import zmq
+from midi import wire
+from midi.stats import CallbackStats, StatsReporter, zmq_sink
+
+COMMAND_ADDRESS = "tcp://127.0.0.1:5580"  # PULL: commands from ML processes
+STATUS_ADDRESS = "tcp://127.0.0.1:5581"   # PUB: stats snapshots (topic stats/)
+AUDIO_TOPIC = b"audio/"
+SAMPLE_RATE = 48000
+CHANNELS = 2
+BLOCK_SIZE = 512
+STATUS_INTERVAL = 1.0
+
+# Command types (255 file change, 254 stats, 253/252 cluster)
+PLAY = 240
+STOP = 241
+SHUTDOWN = 242
+
+
+def raise_priority(priority):
+    """
+    Give this thread (and threads it starts later) real-time priority if the
+    OS allows it, falling back to a lower nice value.
+
+    Returns:
+        str: What was applied, for logging
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return f"SCHED_FIFO {priority}"
+    except (AttributeError, PermissionError, OSError):
+        pass
+    try:
+        os.nice(-10)
+        return "nice -10"
+    except (AttributeError, PermissionError, OSError):
+        return "normal (no permission to raise priority)"
+
+def normal_priority():
+    """Drop the calling thread back to the default scheduler."""
+    try:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+    except (AttributeError, PermissionError, OSError):
+        pass
+
+
+class StatusReporter(StatsReporter):
+    def run(self):
+        normal_priority()
+        super().run()
+
+
+class Clip:
+    def __init__(self, data, loop=False):
+        self.data = data
+        self.position = 0
+        self.loop = loop
+
+    def mix_into(self, mix):
+        """Add the next len(mix) frames. Returns False once the clip has finished."""
+        frames = len(mix)
+        written = 0
+        while written < frames:
+            chunk = self.data[self.position:self.position + frames - written]
+            mix[written:written + len(chunk)] += chunk
+            written += len(chunk)
+            self.position += len(chunk)
+            if self.position >= len(self.data):
+                if not self.loop or not len(self.data):
+                    return False
+                self.position = 0
+        return True
+
+
+class AudioServer:
+    def __init__(self, samplerate=SAMPLE_RATE, channels=CHANNELS, device=None):
+        """
+        Mix clips in the audio callback. Everything that allocates or touches
+        the disk happens on the loader thread; the callback only sums arrays.
+        """
+        self.samplerate = samplerate
+        self.channels = channels
+        self.device = device
+        self.incoming = deque()  # Loaded clips handed to the callback (deque append/popleft are atomic)
+        self.clips = []
+        self.stop_requested = False
+        self.running = True
+        self.stats = CallbackStats(samplerate, name="audio-server")
+        self.context = zmq.Context()
+
+    def load(self, path, volume=1.0, normalize=None, loop=False):
+        """Decode a file and convert it to the output format (loader thread only)."""
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        if sr != self.samplerate and len(data):
+            # Linear interpolation keeps scipy out of this process; fine for previews and one-shots
+            length = int(round(len(data) * self.samplerate / sr))
+            source = np.arange(len(data))
+            target = np.linspace(0, len(data) - 1, length)
+            data = np.stack([np.interp(target, source, data[:, c]) for c in range(data.shape[1])], axis=1)
+        if data.shape[1] != self.channels:
+            data = np.repeat(data.mean(axis=1, keepdims=True), self.channels, axis=1)
+        data = data.astype(np.float32) * volume
+        peak = np.max(np.abs(data)) if len(data) else 0.0
+        if normalize and peak > 0:
+            data *= normalize / peak
+        return Clip(np.ascontiguousarray(data), loop)
+
+    def callback(self, outdata, frames, time_info, status):
+        start = self.stats.begin()
+        if self.stop_requested:
+            self.clips = []
+            self.stop_requested = False
+        while self.incoming:
+            self.clips.append(self.incoming.popleft())
+        outdata.fill(0)
+        if self.clips:
+            self.clips = [clip for clip in self.clips if clip.mix_into(outdata)]
+            np.clip(outdata, -1.0, 1.0, out=outdata)
+        self.stats.set_voices(len(self.clips))
+        self.stats.end(start, frames, status)
+
+    def serve_commands(self):
+        normal_priority()
+        socket = self.context.socket(zmq.PULL)
+        socket.bind(COMMAND_ADDRESS)
+        while self.running:
+            if not socket.poll(100):
+                continue
+            topic, frame = socket.recv_multipart()
+            for (kind, value), _ in wire.decode(frame):
+                if kind == PLAY:
+                    try:
+                        self.incoming.append(self.load(value["path"], value.get("volume", 1.0),
+                                                       value.get("normalize"), value.get("loop", False)))
+                    except Exception as e:
+                        print(f"[Audio] Error loading {value.get('path')}: {e}")
+                elif kind == STOP:
+                    self.stop_requested = True
+                elif kind == SHUTDOWN:
+                    self.running = False
+        socket.close()
+
+    def run(self, priority=None):
+        if priority:
+            print(f"[Audio] Priority: {raise_priority(priority)}")
+        status = self.context.socket(zmq.PUB)
+        status.bind(STATUS_ADDRESS)
+        reporter = StatusReporter(self.stats, [zmq_sink(status)], interval=STATUS_INTERVAL)
+        loader = threading.Thread(target=self.serve_commands, daemon=True)
+
+        # Startup objects are never freed; keep the collector from rescanning them
+        gc.collect()
+        gc.freeze()
+        stream = sd.OutputStream(samplerate=self.samplerate, channels=self.channels, blocksize=BLOCK_SIZE,
+                                 dtype='float32', device=self.device, callback=self.callback)
+        loader.start()
+        reporter.start()
+        with stream:
+            print(f"[Audio] Running at {self.samplerate} Hz, commands on {COMMAND_ADDRESS}")
+            try:
+                while self.running:
+                    time.sleep(0.1)
+            except KeyboardInterrupt:
+                self.running = False
+        reporter.stop()
+        loader.join()
+        status.close()
+        self.context.term()
+
+
+class AudioClient:
+    def __init__(self, address=COMMAND_ADDRESS):
+        """Send playback commands to a running audio server."""
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PUSH)
+        self.socket.connect(address)
+
+    def send(self, kind, value=None):
+        self.socket.send_multipart([AUDIO_TOPIC, wire.encode_control(kind, value)])
+
+    def play(self, path, volume=1.0, normalize=None, loop=False):
+        """Play a file. The path must be readable by the audio process."""
+        self.send(PLAY, {"path": os.path.abspath(path), "volume": volume, "normalize": normalize, "loop": loop})
+
+    def stop(self):
+        self.send(STOP)
+
+    def shutdown(self):
+        self.send(SHUTDOWN)
+
+    def close(self):
+        self.socket.close(linger=500)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the isolated real-time audio process.")
+    parser.add_argument("--samplerate", type=int, default=SAMPLE_RATE)
+    parser.add_argument("--device", default=None, help="Output device name or index")
+    parser.add_argument("--priority", type=int, default=70, help="SCHED_FIFO priority (0 to skip)")
+    args = parser.parse_args()
+    device = int(args.device) if args.device and args.device.isdigit() else args.device
+    AudioServer(args.samplerate, device=device).run(args.priority)
@@ -0,0 +1,264 @@
+"""
+Reproducible MIDI-storm benchmark for the sampler engines.
+
+Runs an engine against a virtual audio clock (no sound card needed) while a
+seeded generator fires chords, trills or sustained clusters at it, and writes
+callback CPU percentiles, note-on-to-audio latency, peak memory and voice
+counts to a JSON file so results can be compared between commits.
+
+Usage:
+    python -m midi.bench --engine sampler playback --pattern chords trills clusters -o bench.json
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import time
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+import soundfile as sf
+from midi.engine import Mixer, naive_pitch_shift, BLOCK_SIZE, NOTE_ON, NOTE_OFF
+
+DEFAULT_SAMPLE = "samples/C Major Piano.wav"
+DEFAULT_DURATION = 10.0  # seconds of virtual time per run
+PATTERNS = ("chords", "trills", "clusters")
+ENGINES = ("sampler", "playback")
+
+
+# -------------------------------
+# SYNTHETIC MIDI
+# -------------------------------
+def generate_events(pattern, duration, seed=0):
+    """
+    Generate a seeded list of (seconds, status, note, velocity) events.
+
+    chords:   three/four-note chords every 250ms, held for 200ms
+    trills:   two alternating notes every 30ms, released after 25ms
+    clusters: up to 12 adjacent notes held for 2s, restruck every second
+    """
+    rng = random.Random(seed)
+    events = []
+
+    def note(t, n, length, velocity=100):
+        events.append((t, NOTE_ON, n, velocity))
+        events.append((t + length, NOTE_OFF, n, 0))
+
+    t = 0.0
+    if pattern == "chords":
+        while t < duration:
+            root = rng.randint(48, 72)
+            for interval in rng.choice([(0, 4, 7), (0, 3, 7), (0, 4, 7, 11), (0, 3, 7, 10)]):
+                note(t, root + interval, 0.2)
+            t += 0.25
+    elif pattern == "trills":
+        low = rng.randint(55, 70)
+        while t < duration:
+            note(t, low + (int(t / 0.03) % 2), 0.025)
+            t += 0.03
+            if rng.random() < 0.01:
+                low = rng.randint(55, 70)
+    elif pattern == "clusters":
+        while t < duration:
+            base = rng.randint(40, 70)
+            for n in range(base, base + rng.randint(6, 12)):
+                note(t + rng.random() * 0.01, n, 2.0)
+            t += 1.0
+    else:
+        raise ValueError(f"Unknown pattern: {pattern}")
+
+    return sorted(e for e in events if e[0] < duration)
+
+
+# -------------------------------
+# ENGINES
+# -------------------------------
+class PlaybackEngine:
+    """midi/playback.py: one stream mixing every voice through the shared Mixer."""
+
+    def __init__(self, data, samplerate):
+        if data.ndim == 1:
+            data = np.column_stack((data, data))
+        self.mixer = Mixer(data, samplerate, shift=naive_pitch_shift)
+
+    def handle(self, status, note, velocity):
+        # playback.py only reacts to note on
+        if status & 0xF0 == NOTE_ON and velocity > 0:
+            return self.mixer.note_on(note)
+
+    def render(self, frames):
+        self.mixer.render(frames)
+        return len(self.mixer.voices)
+
+    def started(self, voice):
+        return voice.position > 0
+
+
+class SamplerEngine:
+    """midi/sampler.py: one SamplePlayer (one stream) per note, summed by the OS."""
+
+    def __init__(self, data, samplerate):
+        from midi import sampler
+        import sounddevice as sd
+
+        self.sampler = sampler
+        self.stop_exception = sd.CallbackStop
+        sampler.sr = samplerate
+        sampler.stats.samplerate = samplerate
+        sampler.data = np.mean(data, axis=1)[:, np.newaxis] if data.ndim > 1 else data[:, np.newaxis]
+        self.players = []
+        self.active_notes = {}
+        self.output = None  # The last summed block
+        self.time_info = SimpleNamespace(outputBufferDacTime=0.0, currentTime=0.0)
+
+    def handle(self, status, note, velocity):
+        kind = status & 0xF0
+        if kind == NOTE_ON and velocity > 0:
+            if note in self.active_notes:
+                self.active_notes[note].stop()
+            shifted = self.sampler.pitch_shift(self.sampler.data, self.sampler.midi_note_to_semitone(note))
+            player = self.sampler.SamplePlayer(shifted, use_pedalboard=False)
+            self.active_notes[note] = player
+            self.players.append(player)
+            return player
+        elif note in self.active_notes:
+            self.active_notes.pop(note).stop()
+
+    def render(self, frames):
+        # Sum the players' blocks the way the OS mixes their streams, so that cost is measured too
+        mix = np.zeros((frames, 1), dtype=np.float32)
+        outdata = np.zeros((frames, 1), dtype=np.float32)
+        for player in self.players[:]:
+            try:
+                player.render(outdata, frames, self.time_info)
+            except self.stop_exception:
+                # The stream would have ended here without playing this block
+                self.players.remove(player)
+                continue
+            mix += outdata
+        self.output = mix
+        return len(self.players)
+
+    def started(self, player):
+        return player.pointer > 0
+
+
+# -------------------------------
+# BENCHMARK
+# -------------------------------
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+    result = {f"p{p}": float(np.percentile(values, p)) for p in points}
+    result["max"] = float(np.max(values))
+    result["mean"] = float(np.mean(values))
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(engine_name, pattern, sample_file=DEFAULT_SAMPLE, duration=DEFAULT_DURATION,
+                  seed=0, block_size=BLOCK_SIZE):
+    """
+    Drive one engine with one pattern on a virtual clock.
+
+    The virtual device asks for a block every block_size / samplerate seconds
+    of virtual time but never sleeps, so the run is as fast as the CPU allows.
+    Note-on handling cost counts towards latency, as it would on the MIDI thread.
+    """
+    data, samplerate = sf.read(sample_file)
+    engine = (SamplerEngine if engine_name == "sampler" else PlaybackEngine)(data, samplerate)
+    events = generate_events(pattern, duration, seed)
+    deadline = block_size / samplerate
+
+    tracemalloc.start()
+    callback_times = []
+    note_on_times = []
+    latencies = []
+    voice_counts = []
+    pending = []  # (voice, event time, handling cost)
+    index = 0
+    block = 0
+    total_blocks = int(np.ceil(duration / deadline))
+
+    while block < total_blocks:
+        block_time = block * deadline
+        # Deliver every event due before this block starts
+        while index < len(events) and events[index][0] <= block_time:
+            event_time, status, note, velocity = events[index]
+            start = time.perf_counter()
+            voice = engine.handle(status, note, velocity)
+            cost = time.perf_counter() - start
+            if voice is not None:
+                note_on_times.append(cost)
+                pending.append((voice, event_time, cost))
+            index += 1
+
+        start = time.perf_counter()
+        voices = engine.render(block_size)
+        callback_times.append(time.perf_counter() - start)
+        voice_counts.append(voices)
+
+        # A voice is heard at the start of the first block it played in
+        for item in pending[:]:
+            voice, event_time, cost = item
+            if engine.started(voice):
+                latencies.append(block_time - event_time + cost + deadline)
+                pending.remove(item)
+        block += 1
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    loads = [t / deadline for t in callback_times]
+    return {
+        "engine": engine_name,
+        "pattern": pattern,
+        "seed": seed,
+        "duration": duration,
+        "samplerate": samplerate,
+        "block_size": block_size,
+        "events": len(events),
+        "callbacks": len(callback_times),
+        "callback_ms": percentiles([t * 1000 for t in callback_times]),
+        "callback_load": percentiles(loads),
+        "deadline_misses": sum(load > 1.0 for load in loads),
+        "note_on_ms": percentiles([t * 1000 for t in note_on_times]),
+        "latency_ms": percentiles([t * 1000 for t in latencies]),
+        "peak_traced_mb": peak / 2 ** 20,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "voices": {"mean": float(np.mean(voice_counts)), "max": int(np.max(voice_counts))},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sampler engines under synthetic MIDI load.")
+    parser.add_argument("--engine", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--pattern", nargs="+", choices=PATTERNS, default=list(PATTERNS))
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Virtual seconds per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("-o", "--output", default="bench.json")
+    args = parser.parse_args()
+
+    results = []
+    for engine_name in args.engine:
+        for pattern in args.pattern:
+            print(f"[Bench] {engine_name} / {pattern}...")
+            result = run_benchmark(engine_name, pattern, args.sample, args.duration, args.seed, args.block_size)
+            print(f"[Bench]   callback p99={result['callback_ms'].get('p99', 0):.3f}ms "
+                  f"latency p99={result['latency_ms'].get('p99', 0):.1f}ms "
+                  f"voices max={result['voices']['max']} peak mem={result['peak_traced_mb']:.1f}MB")
+            results.append(result)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"commit": git_commit(), "created": time.time(), "results": results}, f, indent=2)
+    print(f"[Bench] Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
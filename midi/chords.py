@@ -3,6 +3,7 @@ import numpy as np
 import sounddevice as sd
 from scipy.signal import resample_poly
 import time
+from midi.stats import CallbackStats, StatsReporter, log_sink
 
 chord_data = None
 chord_position = 0
@@ -12,6 +13,13 @@ def shift_pitch(data, semitones):
     return resample_poly(data, int(len(data) * factor), len(data))
 
 def callback(outdata, frames, time, status):
+    start = stats.begin()
+    try:
+        render(outdata, frames)
+    finally:
+        stats.end(start, frames, status)
+
+def render(outdata, frames):
     global chord_data, chord_position
 
     if chord_data is None:
@@ -60,9 +68,12 @@ data, samplerate = sf.read("C Major Piano.wav")
 if data.ndim == 1:
     data = data[:, np.newaxis]  # convert mono to (n, 1)
 
+stats = CallbackStats(samplerate, name="chords")
+
 # Start audio stream
 stream = sd.OutputStream(samplerate=samplerate, channels=data.shape[1], blocksize=512, callback=callback)
 stream.start()
+StatsReporter(stats, [log_sink]).start()
 
 # Example: Trigger a chord
 chord_data = get_chord("A,C,E", data.copy())
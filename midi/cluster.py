@@ -0,0 +1,501 @@
+"""
+Scale the sampler across processes (or hosts) by splitting the keyboard.
+
+A coordinator assigns each worker a partition, either a note range or a set
+of MIDI channels. Workers subscribe to the broadcaster for their slice only,
+render it with the engine Mixer, and send fixed-size blocks to the
+coordinator's final bus. The bus sums one block per worker per callback.
+Local workers use a shared-memory ring per worker. Remote workers send
+blocks over ZMQ.
+
+Workers report their render load and per-note/per-channel activity once a
+second. When loads drift apart, the coordinator re-splits the keyboard so the
+estimated cost is even, and workers release voices that left their partition.
+
+Usage (everything local, 4 workers spawned by the coordinator):
+    python -m midi.cluster coordinator --workers 4 --split notes --spawn
+    python -m midi.cluster coordinator --workers 4 --spawn --output bus.wav --duration 30   # no sound card
+Remote worker (the coordinator runs with --remote for that id):
+    python -m midi.cluster worker --id 3 --coordinator 192.168.1.10 --connect tcp://192.168.1.10:5555 --bus zmq
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, deque
+import numpy as np
+import soundfile as sf
+import zmq
+from midi import wire
+from midi.engine import Mixer, pitch_shift, limit_audio, release_time_for, BLOCK_SIZE, NOTE_ON, NOTE_OFF
+from midi.shm import ShmRing, RECORD
+from midi.stats import CallbackStats, StatsReporter, log_sink
+from midi.streaming import load_source
+
+DEFAULT_SAMPLE = "samples/C Major Piano.wav"
+CONTROL_PORT = 5570  # Coordinator PUB: partition assignments
+REPORT_PORT = 5571   # Coordinator PULL: worker load reports
+BUS_PORT = 5572      # Coordinator PULL: audio blocks from remote workers
+
+# Control message types (255 is file change, 254 stats)
+ASSIGN = 253
+LOAD_REPORT = 252
+ASSIGN_TOPIC = b"cluster/"
+REPORT_TOPIC = b"load/"
+BUS_TOPIC = b"bus/"
+
+LEAD_BLOCKS = 4             # Blocks each worker renders ahead of the bus
+REPORT_INTERVAL = 1.0       # Seconds between worker load reports
+REBALANCE_INTERVAL = 5.0    # Seconds between rebalancing decisions
+IMBALANCE_THRESHOLD = 0.15  # Rebalance when max load - min load exceeds this
+MIN_LOAD = 0.2              # ...and the busiest worker is at least this loaded
+ACTIVITY_DECAY = 0.5        # Weight of older activity in the cost estimate
+PIANO_RANGE = (21, 108)
+
+
+def bus_ring_name(worker_id):
+    return f"midi-bus-{worker_id}"
+
+def assign_topic(worker_id):
+    return ASSIGN_TOPIC + b"%02d/" % worker_id
+
+
+# -------------------------------
+# PARTITIONING
+# -------------------------------
+def split_notes(workers, weights):
+    """
+    Split notes 0-127 into contiguous ranges of roughly equal total weight.
+
+    Args:
+        workers (int): Number of ranges
+        weights (list): 128 per-note costs
+
+    Returns:
+        list: [{"notes": [low, high]}, ...], one per worker, covering every note
+    """
+    total = float(sum(weights)) or 1.0
+    bounds = []  # Highest note of every range but the last
+    cumulative = 0.0
+    for note, weight in enumerate(weights[:-1]):
+        cumulative += weight
+        if len(bounds) < workers - 1 and cumulative >= total * (len(bounds) + 1) / workers:
+            bounds.append(note)
+    while len(bounds) < workers - 1:
+        bounds.append((bounds[-1] if bounds else -1) + 1)
+    lows = [0] + [b + 1 for b in bounds]
+    highs = bounds + [127]
+    return [{"notes": [low, high]} for low, high in zip(lows, highs)]
+
+def split_channels(workers, weights):
+    """
+    Assign the 16 channels to workers, heaviest first to the least loaded.
+
+    Returns:
+        list: [{"channels": [...]}, ...], one per worker
+    """
+    loads = [0.0] * workers
+    parts = [[] for _ in range(workers)]
+    for channel in sorted(range(16), key=lambda c: -weights[c]):
+        target = loads.index(min(loads))
+        parts[target].append(channel)
+        loads[target] += weights[channel]
+    return [{"channels": sorted(part)} for part in parts]
+
+def initial_weights(split):
+    if split == "notes":
+        return [1.0 if PIANO_RANGE[0] <= n <= PIANO_RANGE[1] else 0.01 for n in range(128)]
+    return [1.0] * 16
+
+def in_partition(partition, status, note):
+    if "notes" in partition:
+        low, high = partition["notes"]
+        return low <= note <= high
+    return (status & 0x0F) in partition["channels"]
+
+
+class Rebalancer:
+    def __init__(self, workers, split):
+        """
+        Decide when and how to re-split the keyboard from worker load reports.
+
+        Each worker's load is spread over the notes (or channels) it played in
+        proportion to their note-on counts, giving a per-key cost estimate
+        that is smoothed over time and fed back into split_notes/split_channels.
+        """
+        self.workers = workers
+        self.split = split
+        self.keys = 128 if split == "notes" else 16
+        self.weights = initial_weights(split)
+        self.reports = {}
+
+    def report(self, report):
+        self.reports[report["id"]] = report
+
+    def loads(self):
+        return {worker_id: report["load"] for worker_id, report in self.reports.items()}
+
+    def partitions(self):
+        if self.split == "notes":
+            return split_notes(self.workers, self.weights)
+        return split_channels(self.workers, self.weights)
+
+    def rebalance(self):
+        """Return new partitions if the load is uneven enough to move keys, else None."""
+        loads = self.loads()
+        if len(loads) < self.workers:
+            return None
+        if max(loads.values()) < MIN_LOAD or max(loads.values()) - min(loads.values()) < IMBALANCE_THRESHOLD:
+            return None
+        cost = [0.0] * self.keys
+        for report in self.reports.values():
+            activity = {int(key): count for key, count in report[self.split].items()}
+            total = sum(activity.values())
+            for key, count in activity.items():
+                cost[key] += report["load"] * count / total
+        # Keep a little of the default spread so idle keys still land somewhere sensible,
+        # and scale to the old weights' total so the two can be blended
+        base = initial_weights(self.split)
+        floor = 0.05 * sum(cost) / sum(base)
+        estimate = [c + floor * b for c, b in zip(cost, base)]
+        scale = sum(self.weights) / sum(estimate) if sum(estimate) else 1.0
+        self.weights = [ACTIVITY_DECAY * old + (1 - ACTIVITY_DECAY) * e * scale
+                        for old, e in zip(self.weights, estimate)]
+        self.reports = {}
+        return self.partitions()
+
+
+# -------------------------------
+# WORKER
+# -------------------------------
+class Worker:
+    def __init__(self, worker_id, sample_file, connect, coordinator, bus, samplerate=None):
+        """
+        One partition of the keyboard, rendered into the coordinator's bus.
+
+        Args:
+            worker_id (int): Index of this worker (0 .. workers-1)
+            sample_file (str): Sample to play
+            connect (str): Broadcaster PUB address
+            coordinator (str): Coordinator host
+            bus (str): "shm" for a shared-memory ring (same host) or "zmq"
+            samplerate (int): The bus's rate, defaults to the sample's; every sample
+                loaded later is resampled to it
+        """
+        self.id = worker_id
+        data, sr = load_source(sample_file, samplerate=samplerate)
+        self.samplerate = sr
+        self.mixer = Mixer(data, sr, shift=pitch_shift, release_time=release_time_for(sample_file), channels=1)
+        self.block_seconds = BLOCK_SIZE / sr
+        self.topic = BUS_TOPIC + b"%02d/" % worker_id
+        self.record_size = RECORD.size + len(self.topic) + BLOCK_SIZE * 4
+        self.partition = None
+        self.topics = []
+        self.notes = Counter()
+        self.channels = Counter()
+        self.held_status = {}  # Note -> status byte of its latest note-on, for the channel it came in on
+        self.busy = 0.0
+        self.rendered = 0
+
+        self.context = zmq.Context()
+        self.midi = self.context.socket(zmq.SUB)
+        self.midi.connect(connect)
+        self.midi.setsockopt(zmq.SUBSCRIBE, wire.CONTROL_TOPIC)
+        self.control = self.context.socket(zmq.SUB)
+        self.control.connect(f"tcp://{coordinator}:{CONTROL_PORT}")
+        self.control.setsockopt(zmq.SUBSCRIBE, assign_topic(worker_id))
+        self.reports = self.context.socket(zmq.PUSH)
+        self.reports.connect(f"tcp://{coordinator}:{REPORT_PORT}")
+        self.ring = None
+        self.bus = None
+        if bus == "shm":
+            self.ring = ShmRing.attach(bus_ring_name(worker_id))
+        else:
+            self.bus = self.context.socket(zmq.PUSH)
+            self.bus.setsockopt(zmq.SNDHWM, LEAD_BLOCKS * 4)
+            self.bus.connect(f"tcp://{coordinator}:{BUS_PORT}")
+
+    def assign(self, partition):
+        """Switch to a new partition: resubscribe and release voices that moved elsewhere."""
+        if partition == self.partition:
+            return
+        for topic in self.topics:
+            self.midi.setsockopt(zmq.UNSUBSCRIBE, topic)
+        if "notes" in partition:
+            self.topics = wire.subscriptions(notes=tuple(partition["notes"]), controls=False)
+        else:
+            self.topics = wire.subscriptions(channels=partition["channels"], controls=False)
+        for topic in self.topics:
+            self.midi.setsockopt(zmq.SUBSCRIBE, topic)
+        for note in list(self.mixer.held):
+            if not in_partition(partition, self.held_status.get(note, 0), note):
+                self.mixer.note_off(note)
+        self.partition = partition
+        print(f"[Worker {self.id}] Partition {partition}")
+
+    def handle(self, frame, block_time):
+        for message, timestamp in wire.decode(frame):
+            if isinstance(message, tuple):
+                kind, value = message
+                if kind == wire.FILE_CHANGE:
+                    # The bus stays at its start-up rate, so the new sample is brought to it
+                    data, sr = load_source(value, samplerate=self.samplerate)
+                    self.mixer.set_sample(data, sr, release_time_for(value))
+                continue
+            status, note, velocity = message
+            kind = status & 0xF0
+            if kind not in (NOTE_ON, NOTE_OFF):
+                continue
+            if kind == NOTE_ON and velocity > 0:
+                if self.partition is None or not in_partition(self.partition, status, note):
+                    continue
+                self.notes[note] += 1
+                self.channels[status & 0x0F] += 1
+                self.held_status[note] = status
+            self.mixer.schedule(status, note, velocity, timestamp or block_time)
+
+    def queued_blocks(self, started):
+        """Blocks rendered but not yet played by the bus."""
+        if self.ring is not None:
+            return self.ring.used() // self.record_size
+        return self.rendered - (time.monotonic() - started) / self.block_seconds
+
+    def render_block(self, block_time):
+        start = time.perf_counter()
+        block = self.mixer.render(BLOCK_SIZE, block_time=block_time)
+        self.busy += time.perf_counter() - start
+        payload = block.astype(np.float32).tobytes()
+        if self.ring is not None:
+            self.ring.write(self.topic, payload)
+        else:
+            self.bus.send_multipart([self.topic, payload])
+        self.rendered += 1
+
+    def report(self, elapsed):
+        report = {
+            "id": self.id,
+            "load": self.busy / elapsed,
+            "voices": len(self.mixer.voices),
+            "notes": dict(self.notes),
+            "channels": dict(self.channels),
+        }
+        self.reports.send_multipart([REPORT_TOPIC, wire.encode_control(LOAD_REPORT, report)])
+        self.busy = 0.0
+        self.notes.clear()
+        self.channels.clear()
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.midi, zmq.POLLIN)
+        poller.register(self.control, zmq.POLLIN)
+        started = time.monotonic()
+        last_report = started
+        print(f"[Worker {self.id}] Waiting for a partition...")
+        try:
+            while True:
+                queued = self.queued_blocks(started)
+                # Events are placed relative to when the next rendered block will reach the bus
+                block_time = time.monotonic() + max(queued, 0) * self.block_seconds
+                timeout = 0 if queued < LEAD_BLOCKS else self.block_seconds / 4
+                for socket, _ in poller.poll(timeout * 1000):
+                    topic, frame = socket.recv_multipart()
+                    try:
+                        if socket is self.control:
+                            for (kind, value), _ in wire.decode(frame):
+                                if kind == ASSIGN:
+                                    self.assign(value)
+                        else:
+                            self.handle(frame, block_time)
+                    except ValueError as e:
+                        print(f"[Worker {self.id}] Dropped malformed frame: {e}")
+                while self.queued_blocks(started) < LEAD_BLOCKS:
+                    self.render_block(block_time)
+                    block_time += self.block_seconds
+                now = time.monotonic()
+                if now - last_report >= REPORT_INTERVAL:
+                    self.report(now - last_report)
+                    last_report = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.ring is not None:
+                self.ring.close()
+            self.context.destroy(linger=0)
+
+
+# -------------------------------
+# COORDINATOR
+# -------------------------------
+class Coordinator:
+    def __init__(self, workers, split, remote=()):
+        """
+        Own the partitions and the final bus.
+
+        Args:
+            workers (int): Number of workers
+            split (str): "notes" or "channels"
+            remote (list): Worker ids that send blocks over ZMQ instead of shared memory
+        """
+        self.workers = workers
+        self.rebalancer = Rebalancer(workers, split)
+        self.partitions = self.rebalancer.partitions()
+        self.rings = {i: ShmRing(bus_ring_name(i), capacity=1 << 16, create=True)
+                      for i in range(workers) if i not in remote}
+        self.remote = {i: deque(maxlen=LEAD_BLOCKS * 4) for i in remote}
+        self.underruns = Counter()
+        self.live = set()  # Workers that have delivered a block; before that silence isn't an underrun
+        self.processes = []
+
+        self.context = zmq.Context()
+        self.control = self.context.socket(zmq.PUB)
+        self.control.bind(f"tcp://*:{CONTROL_PORT}")
+        self.reports = self.context.socket(zmq.PULL)
+        self.reports.bind(f"tcp://*:{REPORT_PORT}")
+        self.bus = self.context.socket(zmq.PULL)
+        self.bus.bind(f"tcp://*:{BUS_PORT}")
+        self.running = True
+        self.thread = threading.Thread(target=self.run_control, daemon=True)
+
+    def spawn(self, sample_file, connect, samplerate):
+        """Start every local worker as a separate process on this host."""
+        for i in self.rings:
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "-m", "midi.cluster", "worker", "--id", str(i), "--sample", sample_file,
+                 "--connect", connect, "--bus", "shm", "--samplerate", str(samplerate)]))
+
+    def publish(self):
+        for i, partition in enumerate(self.partitions):
+            self.control.send_multipart([assign_topic(i), wire.encode_control(ASSIGN, partition)])
+
+    def run_control(self):
+        """Handle load reports and remote blocks, resend assignments, rebalance."""
+        poller = zmq.Poller()
+        poller.register(self.reports, zmq.POLLIN)
+        poller.register(self.bus, zmq.POLLIN)
+        last_publish = 0.0
+        last_rebalance = time.monotonic()
+        while self.running:
+            for socket, _ in poller.poll(100):
+                topic, frame = socket.recv_multipart()
+                if socket is self.bus:
+                    worker_id = int(topic[len(BUS_TOPIC):-1])
+                    if worker_id in self.remote:
+                        self.remote[worker_id].append(np.frombuffer(frame, dtype=np.float32))
+                    continue
+                for (kind, report), _ in wire.decode(frame):
+                    if kind == LOAD_REPORT:
+                        self.rebalancer.report(report)
+            now = time.monotonic()
+            if now - last_rebalance >= REBALANCE_INTERVAL:
+                loads = self.rebalancer.loads()
+                partitions = self.rebalancer.rebalance()
+                if partitions is not None and partitions != self.partitions:
+                    print(f"[Coordinator] Rebalancing, loads {loads}: {partitions}")
+                    self.partitions = partitions
+                    last_publish = 0.0
+                last_rebalance = now
+            # Resend periodically so late-joining workers get their partition
+            if now - last_publish >= REPORT_INTERVAL:
+                self.publish()
+                last_publish = now
+
+    def mix(self, frames=BLOCK_SIZE):
+        """Sum one block from every worker. Missing blocks play as silence and count as underruns."""
+        mix = np.zeros(frames, dtype=np.float32)
+        for i, ring in self.rings.items():
+            messages = ring.read_all(limit=1)
+            if messages:
+                mix += np.frombuffer(messages[0][1], dtype=np.float32)
+                self.live.add(i)
+            elif i in self.live:
+                self.underruns[i] += 1
+        for i, blocks in self.remote.items():
+            if blocks:
+                mix += blocks.popleft()
+                self.live.add(i)
+            elif i in self.live:
+                self.underruns[i] += 1
+        return limit_audio(mix[:, np.newaxis], threshold=0.8)
+
+    def close(self):
+        self.running = False
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+        for ring in self.rings.values():
+            ring.close()
+        self.context.destroy(linger=0)
+        if self.underruns:
+            print(f"[Coordinator] Bus underruns per worker: {dict(self.underruns)}")
+
+
+def run_coordinator(args):
+    coordinator = Coordinator(args.workers, args.split, args.remote)
+    coordinator.thread.start()
+    # The bus runs at the start-up sample's rate; workers resample every sample to it
+    samplerate = args.samplerate or sf.info(args.sample).samplerate
+    if args.spawn:
+        coordinator.spawn(args.sample, args.connect, samplerate)
+    try:
+        if args.output:
+            # No sound card: pull blocks on a timer and write them to a file
+            blocks = []
+            block_seconds = BLOCK_SIZE / samplerate
+            start = time.monotonic()
+            for i in range(int(args.duration / block_seconds)):
+                delay = start + (i + 1) * block_seconds - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                blocks.append(coordinator.mix())
+            sf.write(args.output, np.concatenate(blocks), samplerate)
+            print(f"[Coordinator] Wrote {args.output}")
+        else:
+            import sounddevice as sd
+            stats = CallbackStats(samplerate, name="bus")
+
+            def callback(outdata, frames, time_info, status):
+                start = stats.begin()
+                outdata[:] = coordinator.mix(frames)
+                stats.end(start, frames, status)
+
+            StatsReporter(stats, [log_sink]).start()
+            with sd.OutputStream(channels=1, samplerate=samplerate, blocksize=BLOCK_SIZE, callback=callback):
+                print(f"[Coordinator] Mixing {args.workers} workers ({args.split}). Ctrl+C to stop.")
+                while True:
+                    time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the sampler across worker processes.")
+    roles = parser.add_subparsers(dest="role", required=True)
+    coordinator_parser = roles.add_parser("coordinator", help="Assign partitions and mix the final bus")
+    coordinator_parser.add_argument("--workers", type=int, default=4)
+    coordinator_parser.add_argument("--split", choices=("notes", "channels"), default="notes")
+    coordinator_parser.add_argument("--remote", type=int, nargs="*", default=[],
+                                    help="Worker ids running on other hosts (bus over ZMQ)")
+    coordinator_parser.add_argument("--spawn", action="store_true", help="Start the local workers as processes")
+    coordinator_parser.add_argument("--sample", default=DEFAULT_SAMPLE)
+    coordinator_parser.add_argument("--connect", default="tcp://localhost:5555", help="Broadcaster PUB address")
+    coordinator_parser.add_argument("--output", help="Write the bus to this WAV instead of a sound card")
+    coordinator_parser.add_argument("--duration", type=float, default=30.0, help="Seconds to record with --output")
+    coordinator_parser.add_argument("--samplerate", type=int, help="Bus rate (default: the sample's)")
+    worker_parser = roles.add_parser("worker", help="Render one partition")
+    worker_parser.add_argument("--id", type=int, required=True)
+    worker_parser.add_argument("--sample", default=DEFAULT_SAMPLE)
+    worker_parser.add_argument("--connect", default="tcp://localhost:5555", help="Broadcaster PUB address")
+    worker_parser.add_argument("--coordinator", default="localhost", help="Coordinator host")
+    worker_parser.add_argument("--bus", choices=("shm", "zmq"), default="shm")
+    worker_parser.add_argument("--samplerate", type=int,
+                               help="Bus rate (default: the sample's); must match the coordinator's")
+    args = parser.parse_args()
+
+    if args.role == "coordinator":
+        run_coordinator(args)
+    else:
+        Worker(args.id, args.sample, args.connect, args.coordinator, args.bus, args.samplerate).run()
@@ -74,7 +74,7 @@ class EffectBoard:
         """Remove all effects from the pedalboard."""
         self.board.clear()
     
-    def apply(self, audio, sample_rate, normalize=True):
+    def apply(self, audio, sample_rate, normalize=True, reset=True):
         """
         Apply all effects in the pedalboard to the audio.
         
@@ -82,8 +82,10 @@ class EffectBoard:
             audio (numpy.ndarray): Input audio signal
             sample_rate (int): Sample rate of the audio
             normalize (bool): Whether to normalize the output to prevent clipping
+            reset (bool): Clear effect state (reverb/delay tails) before processing.
+                Pass False when feeding consecutive blocks of one stream.
         """
-        processed = self.board(audio, sample_rate)
+        processed = self.board(audio, sample_rate, reset=reset)
         
         if normalize:
             # Normalize if the signal exceeds 1.0
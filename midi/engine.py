@@ -0,0 +1,354 @@
+import os
+import threading
+import numpy as np
+from scipy.signal import resample
+from midi.effectboard import EffectBoard
+from midi.envelope import Envelope, SUSTAIN
+from midi.streaming import StreamingSample, read_frames
+
+BASE_NOTE = 60      # Samples are assumed to be recorded at MIDI note 60 (C4)
+RELEASE_TIME = 0.5  # Release fade (in seconds)
+BLOCK_SIZE = 512
+LOOKAHEAD = 0.02    # Fixed latency (in seconds) added to timestamped events so they land sample-accurately
+MAX_AHEAD = 1.0     # Events scheduled further ahead than this are from another clock; play them now
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+
+# Per-sample release times (in seconds), keyed by file name; others use RELEASE_TIME
+RELEASE_TIMES = {
+    "Cymatics - PAD Clouds - C.wav": 2.0,
+    "C Major Violin Chord One Shot.wav": 1.0,
+    "Soft String Violin One Shot.wav": 1.0,
+    "Violin Bass One Shot 128 BPM C Major.wav": 1.0,
+    "Cymatics - KEYS Flying - C.wav": 1.0,
+    "Cymatics - INSTR Organ - C.wav": 0.8,
+    "Cymatics - Heater Kick 26.wav": 0.1,
+    "Cymatics - Harmonica Kick - A.wav": 0.1,
+    "Kick [Drill Part].wav": 0.1,
+    "Old Kick.wav": 0.1,
+}
+
+
+def midi_note_to_semitone(note, base_note=BASE_NOTE):
+    return note - base_note
+
+def schedule_offset(timestamp, block_time, samplerate, lookahead=LOOKAHEAD):
+    """
+    Frame offset of a timestamped event inside the block whose first frame
+    reaches the DAC at block_time. Both times are time.monotonic() seconds.
+    Late events get offset 0.
+    """
+    delay = timestamp + lookahead - block_time
+    if delay > MAX_AHEAD:
+        return 0
+    return max(int(round(delay * samplerate)), 0)
+
+def release_time_for(filename):
+    """Release time configured for a sample file, falling back to RELEASE_TIME."""
+    return RELEASE_TIMES.get(os.path.basename(filename), RELEASE_TIME)
+
+def pitch_shift(audio_data, semitones):
+    ratio = 2 ** (semitones / 12)
+    new_length = int(len(audio_data) / ratio)
+
+    if audio_data.ndim == 1:
+        shifted = resample(audio_data, new_length)
+    else:
+        shifted = np.zeros((new_length, audio_data.shape[1]))
+        for ch in range(audio_data.shape[1]):
+            shifted[:, ch] = resample(audio_data[:, ch], new_length)
+
+    # Normalize the output to prevent clipping
+    max_amplitude = np.max(np.abs(shifted))
+    if max_amplitude > 0:
+        shifted = shifted / max_amplitude * 0.7  # Scale to 70% of maximum to leave headroom
+    return shifted
+
+# Basic pitch shift via naive resampling
+def naive_pitch_shift(sample, semitones):
+    factor = 2 ** (semitones / 12.0)
+    indices = np.round(np.arange(0, len(sample), factor)).astype(int)
+    indices = indices[indices < len(sample)]
+    return sample[indices]
+
+def limit_audio(audio_data, threshold=0.8):
+    """
+    Apply simple limiting to audio data to prevent clipping.
+
+    Args:
+        audio_data (np.ndarray): Input audio data
+        threshold (float): Amplitude threshold (0.0 to 1.0)
+
+    Returns:
+        np.ndarray: Limited audio data
+    """
+    max_amplitude = np.max(np.abs(audio_data))
+    if max_amplitude > threshold:
+        return audio_data * (threshold / max_amplitude)
+    return audio_data
+
+def create_pedalboard():
+    board = EffectBoard()
+    board.add_reverb(room_size=0.8, wet_level=0.3, dry_level=0.7)
+    board.add_delay(delay_seconds=0.5, feedback=0.3, mix=0.5)
+    board.add_distortion(drive_db=20)
+    return board
+
+
+# Voice class to track each note
+class Voice:
+    def __init__(self, note, sample, midi_time=None, envelope=None):
+        self.note = note
+        self.sample = sample
+        self.position = 0
+        self.midi_time = midi_time  # perf_counter() when the note-on arrived
+        self.envelope = envelope
+
+    def release(self):
+        if self.envelope is not None:
+            self.envelope.release()
+        else:
+            self.position = len(self.sample)
+
+    def mix_into(self, mix, scratch):
+        """Add the next len(mix) frames of this voice into mix, using scratch for the envelope."""
+        frames = len(mix)
+        chunk = read_frames(self.sample, self.position, frames)
+        self.position += frames
+        envelope = self.envelope
+        if envelope is None or (envelope.stage == SUSTAIN and envelope.sustain == 1.0):
+            mix[:len(chunk)] += chunk
+            return
+        out = scratch[:len(chunk)]
+        out[:] = chunk
+        self.envelope.process(out)
+        mix[:len(chunk)] += out
+        if self.envelope.done:
+            self.position = len(self.sample)
+
+    def skip(self, frames):
+        self.position += frames
+        if self.envelope is not None:
+            self.envelope.skip(frames)
+            if self.envelope.done:
+                self.position = len(self.sample)
+
+    def is_done(self):
+        return self.position >= len(self.sample)
+
+
+class Mixer:
+    def __init__(self, sample, samplerate, shift=pitch_shift, effects=None,
+                 release_time=RELEASE_TIME, envelope=None, channels=None, lookahead=LOOKAHEAD, stats=None,
+                 one_shot=False):
+        """
+        Mix pitch-shifted voices of a single sample into fixed-size blocks.
+
+        This is the voice/mixer path shared by the live playback engine and the
+        offline renderer, so both produce identical audio for the same events.
+
+        Args:
+            sample (np.ndarray): Sample data, shape (n,) or (n, channels), or a
+                StreamingSample for long samples streamed from disk
+            samplerate (int): Sample rate of the sample and the output
+            shift (callable): Pitch shift function taking (sample, semitones)
+            effects (EffectBoard): Optional effects applied to the mixed output
+            release_time (float): Release fade in seconds on note off
+            envelope (dict): Extra Envelope arguments (attack, decay, sustain, shape)
+            channels (int): Output channels, defaults to the sample's channels
+            lookahead (float): Scheduling latency for events passed to schedule()
+            stats (CallbackStats): Optional stats for voice counts and latency
+            one_shot (bool): Every note plays its whole sample: note offs are ignored and
+                re-striking a note doesn't cut the voice still sounding (playback.py)
+        """
+        self.shift = shift
+        self.effects = effects
+        self.release_time = release_time
+        self.envelope = envelope or {}
+        self.stats = stats
+        self.one_shot = one_shot
+        self.voices = []
+        self.held = {}
+        self.pending = []  # Scheduled (timestamp, kind, note, voice) events
+        self.lookahead = lookahead
+        self.cache = {}
+        self.scratch = np.zeros((0, 1), dtype=np.float32)
+        self.lock = threading.Lock()
+        self.output_channels = channels
+        self.set_sample(sample, samplerate)
+
+    def set_sample(self, sample, samplerate=None, release_time=None):
+        """Swap the sample and drop cached pitch-shifted copies."""
+        if isinstance(sample, np.ndarray) and sample.ndim == 1:
+            sample = sample[:, np.newaxis]
+        with self.lock:
+            self.sample = sample
+            if samplerate is not None:
+                self.samplerate = samplerate
+            if release_time is not None:
+                self.release_time = release_time
+            if self.output_channels:
+                self.channels = self.output_channels
+            else:
+                self.channels = sample.shape[1] if isinstance(sample, np.ndarray) else sample.channels
+            self.cache = {}
+
+    def shifted(self, note):
+        """Return the sample pitch-shifted to note, computing it once per note."""
+        with self.lock:
+            sample, cache = self.sample, self.cache
+            shifted = cache.get(note)
+        if isinstance(sample, StreamingSample):
+            # Streamed samples are shifted block by block; match pitch_shift's normalization
+            return sample.reader(midi_note_to_semitone(note), normalize=self.shift is pitch_shift)
+        if shifted is None:
+            # Shifted outside the lock so the audio thread isn't held up. set_sample()
+            # replaces the cache, so a copy of an old sample is never stored in the new one.
+            shifted = self.shift(sample, midi_note_to_semitone(note)).astype(np.float32)
+            with self.lock:
+                cache[note] = shifted
+        return shifted
+
+    def make_voice(self, note, midi_time=None):
+        envelope = Envelope(self.samplerate, release=self.release_time, **self.envelope)
+        return Voice(note, self.shifted(note), midi_time, envelope)
+
+    def start_voice(self, voice):
+        with self.lock:
+            if self.one_shot:
+                self.voices.append(voice)
+                return voice
+            # Retriggering a held note releases the previous voice
+            if voice.note in self.held:
+                self.held[voice.note].release()
+            self.held[voice.note] = voice
+            self.voices.append(voice)
+        return voice
+
+    def note_on(self, note, midi_time=None):
+        return self.start_voice(self.make_voice(note, midi_time))
+
+    def note_off(self, note):
+        if self.one_shot:
+            return
+        with self.lock:
+            voice = self.held.pop(note, None)
+            if voice is not None:
+                voice.release()
+
+    def handle(self, status, note, velocity, midi_time=None):
+        """Dispatch a raw channel message; note on with velocity 0 is a note off."""
+        kind = status & 0xF0
+        if kind == NOTE_ON and velocity > 0:
+            self.note_on(note, midi_time)
+        elif kind == NOTE_OFF or kind == NOTE_ON:
+            self.note_off(note)
+
+    def schedule(self, status, note, velocity, timestamp, midi_time=None):
+        """
+        Queue a timestamped event to start at its exact frame in a later block.
+
+        The voice (and its pitch-shifted sample) is prepared here, on the
+        caller's thread, so the audio callback only has to start it.
+
+        Args:
+            status (int): MIDI status byte
+            note (int): MIDI note
+            velocity (int): MIDI velocity
+            timestamp (float): time.monotonic() when the event happened
+            midi_time (float): perf_counter() on arrival, for latency stats
+        """
+        kind = status & 0xF0
+        if kind == NOTE_ON and velocity > 0:
+            event = (timestamp, NOTE_ON, note, self.make_voice(note, midi_time))
+        elif kind in (NOTE_ON, NOTE_OFF):
+            event = (timestamp, NOTE_OFF, note, None)
+        else:
+            return
+        with self.lock:
+            self.pending.append(event)
+
+    def due_events(self, frames, block_time):
+        """Pop scheduled events that fall inside this block, as (offset, kind, note, voice)."""
+        with self.lock:
+            if not self.pending:
+                return []
+            due = []
+            keep = []
+            for timestamp, kind, note, voice in self.pending:
+                offset = 0 if block_time is None else schedule_offset(timestamp, block_time, self.samplerate,
+                                                                       self.lookahead)
+                if offset < frames:
+                    due.append((offset, kind, note, voice))
+                else:
+                    keep.append((timestamp, kind, note, voice))
+            self.pending = keep
+        due.sort(key=lambda event: event[0])
+        return due
+
+    def all_notes_off(self):
+        with self.lock:
+            for voice in self.voices:
+                voice.release()
+            self.held = {}
+
+    def mix_voices(self, mix, output_delay=0.0):
+        """Add every active voice into mix (a block or part of one)."""
+        with self.lock:
+            if len(mix):
+                for voice in self.voices[:]:
+                    if voice.position == 0 and voice.midi_time is not None and self.stats:
+                        self.stats.first_sample(voice.midi_time, output_delay)
+                    voice.mix_into(mix, self.scratch)
+                    if voice.is_done():
+                        self.voices.remove(voice)
+                        if self.held.get(voice.note) is voice:
+                            del self.held[voice.note]
+            if self.stats:
+                self.stats.set_voices(len(self.voices))
+
+    def advance(self, frames):
+        """Move every voice forward by frames without mixing (used to seek offline renders)."""
+        with self.lock:
+            for voice in self.voices[:]:
+                voice.skip(frames)
+                if voice.is_done():
+                    self.voices.remove(voice)
+                    if self.held.get(voice.note) is voice:
+                        del self.held[voice.note]
+
+    def render(self, frames, output_delay=0.0, block_time=None):
+        """
+        Render the next block of the mix.
+
+        Scheduled events due in this block split it, so each one starts on
+        its exact frame.
+
+        Args:
+            frames (int): Number of frames to render
+            output_delay (float): Seconds until this block reaches the DAC,
+                used for first-sample latency stats
+            block_time (float): time.monotonic() when the block's first frame
+                reaches the DAC; None plays every scheduled event now
+
+        Returns:
+            np.ndarray: Mixed audio of shape (frames, channels)
+        """
+        mix = np.zeros((frames, self.channels), dtype=np.float32)
+        if self.scratch.shape[0] < frames or self.scratch.shape[1] != self.channels:
+            self.scratch = np.zeros((frames, self.channels), dtype=np.float32)
+
+        position = 0
+        for offset, kind, note, voice in self.due_events(frames, block_time):
+            self.mix_voices(mix[position:offset], output_delay + position / self.samplerate)
+            position = offset
+            if kind == NOTE_ON:
+                self.start_voice(voice)
+            else:
+                self.note_off(note)
+        self.mix_voices(mix[position:], output_delay + position / self.samplerate)
+
+        if self.effects:
+            mix = self.effects.apply(mix, self.samplerate, normalize=False, reset=False)
+        return mix
@@ -0,0 +1,145 @@
+import numpy as np
+
+LINEAR = "linear"
+EXPONENTIAL = "exponential"
+CURVATURE = 5.0  # Steepness of exponential curves (higher = faster initial change)
+
+ATTACK, DECAY, SUSTAIN, RELEASE, DONE = range(5)
+
+# Shared read-only curves, keyed by (kind, shape, frames[, sustain])
+_tables = {}
+
+
+def _fall(frames, shape):
+    """Curve from 1 down to 0 over frames samples (inclusive of both ends)."""
+    t = np.linspace(0, 1, num=frames, dtype=np.float64)
+    if shape == EXPONENTIAL:
+        floor = np.exp(-CURVATURE)
+        return (np.exp(-CURVATURE * t) - floor) / (1 - floor)
+    if shape == LINEAR:
+        return 1 - t
+    raise ValueError(f"Unknown envelope shape: {shape}")
+
+def get_table(kind, shape, frames, sustain=1.0):
+    """
+    Return a shared, read-only gain curve.
+
+    Args:
+        kind (int): ATTACK (0 to 1), DECAY (1 to sustain) or RELEASE (1 to 0)
+        shape (str): LINEAR or EXPONENTIAL
+        frames (int): Length of the curve in samples
+        sustain (float): Sustain level, only used for DECAY
+
+    Returns:
+        np.ndarray: float32 curve of length frames
+    """
+    key = (kind, shape, frames, sustain if kind == DECAY else None)
+    table = _tables.get(key)
+    if table is None:
+        fall = _fall(frames, shape)
+        if kind == ATTACK:
+            table = 1 - fall
+        elif kind == DECAY:
+            table = sustain + (1 - sustain) * fall
+        else:
+            table = fall
+        table = table.astype(np.float32)
+        table.flags.writeable = False
+        _tables[key] = table
+    return table
+
+
+class Envelope:
+    def __init__(self, samplerate, attack=0.0, decay=0.0, sustain=1.0, release=0.5, shape=LINEAR):
+        """
+        ADSR envelope applied in place to audio blocks.
+
+        Curves come from a shared table cache, so creating an envelope per voice
+        and processing a block allocate nothing; inside a stage a block costs a
+        single vectorized multiply.
+
+        Args:
+            samplerate (int): Sample rate of the audio being processed
+            attack (float): Attack time in seconds
+            decay (float): Decay time in seconds
+            sustain (float): Sustain level (0.0 to 1.0)
+            release (float): Release time in seconds
+            shape (str): LINEAR or EXPONENTIAL
+        """
+        self.sustain = sustain
+        self.tables = {
+            ATTACK: get_table(ATTACK, shape, int(attack * samplerate)),
+            DECAY: get_table(DECAY, shape, int(decay * samplerate), sustain),
+            RELEASE: get_table(RELEASE, shape, max(int(release * samplerate), 1)),
+        }
+        self.release_level = 1.0
+        self._enter(ATTACK)
+
+    def _enter(self, stage):
+        # Skip over zero-length stages
+        while stage in (ATTACK, DECAY) and len(self.tables[stage]) == 0:
+            stage += 1
+        self.stage = stage
+        self.position = 0
+
+    def _next(self):
+        self._enter(DONE if self.stage == RELEASE else self.stage + 1)
+
+    @property
+    def level(self):
+        """Current gain."""
+        if self.stage == SUSTAIN:
+            return self.sustain
+        if self.stage == DONE:
+            return 0.0
+        gain = float(self.tables[self.stage][self.position])
+        return gain * self.release_level if self.stage == RELEASE else gain
+
+    @property
+    def done(self):
+        return self.stage == DONE
+
+    @property
+    def releasing(self):
+        return self.stage >= RELEASE
+
+    def release(self):
+        """Start the release stage from the current level."""
+        if self.stage < RELEASE:
+            self.release_level = self.level
+            self._enter(RELEASE)
+
+    def process(self, buffer):
+        """
+        Multiply buffer (shape (frames,) or (frames, channels)) by the envelope in place.
+        """
+        frames = len(buffer)
+        done = 0
+        while done < frames:
+            if self.stage == SUSTAIN:
+                if self.sustain != 1.0:
+                    buffer[done:] *= self.sustain
+                return
+            if self.stage == DONE:
+                buffer[done:] = 0
+                return
+            table = self.tables[self.stage]
+            take = min(len(table) - self.position, frames - done)
+            gain = table[self.position:self.position + take]
+            segment = buffer[done:done + take]
+            segment *= gain[:, np.newaxis] if segment.ndim > 1 else gain
+            if self.stage == RELEASE and self.release_level != 1.0:
+                segment *= self.release_level
+            self.position += take
+            done += take
+            if self.position >= len(table):
+                self._next()
+
+    def skip(self, frames):
+        """Advance the envelope by frames without processing audio."""
+        while frames > 0 and self.stage not in (SUSTAIN, DONE):
+            take = min(len(self.tables[self.stage]) - self.position, frames)
+            self.position += take
+            frames -= take
+            if self.position >= len(self.tables[self.stage]):
+                self._next()
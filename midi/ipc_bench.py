@@ -0,0 +1,198 @@
+"""
+Round-trip latency of the broadcaster transports: ZMQ over localhost TCP vs
+the shared-memory ring.
+
+A child process echoes every [topic, frame] message straight back. The parent
+sends bursts of single-note frames (like a chord arriving from the keyboard)
+separated by random gaps, and times each frame from send to echo using the
+timestamp carried in the event itself.
+
+Usage:
+    python -m midi.ipc_bench --bursts 2000 -o ipc_bench.json
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+import zmq
+from midi import wire
+from midi.bench import percentiles, git_commit
+from midi.engine import NOTE_ON
+from midi.shm import ShmRing
+
+TRANSPORTS = ("zmq", "shm")
+PING_ADDRESS = "tcp://127.0.0.1:5565"
+PONG_ADDRESS = "tcp://127.0.0.1:5566"
+PING_RING = "midi-bench-ping"
+PONG_RING = "midi-bench-pong"
+STOP = b"stop/"
+
+
+# -------------------------------
+# ECHO PROCESSES
+# -------------------------------
+def zmq_echo():
+    context = zmq.Context()
+    sub = context.socket(zmq.SUB)
+    sub.connect(PING_ADDRESS)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    push = context.socket(zmq.PUSH)
+    push.connect(PONG_ADDRESS)
+    while True:
+        topic, frame = sub.recv_multipart()
+        push.send_multipart([topic, frame])
+        if topic == STOP:
+            break
+    sub.close()
+    push.close()
+    context.term()
+
+def shm_echo():
+    ping = ShmRing.attach(PING_RING)
+    pong = ShmRing.attach(PONG_RING)
+    running = True
+    while running:
+        for topic, frame in ping.recv():
+            pong.send_multipart([topic, frame])
+            running = running and topic != STOP
+    ping.close()
+    pong.close()
+
+
+# -------------------------------
+# CLIENTS
+# -------------------------------
+class ZmqClient:
+    def __init__(self):
+        self.context = zmq.Context()
+        self.pub = self.context.socket(zmq.PUB)
+        self.pub.bind(PING_ADDRESS)
+        self.pull = self.context.socket(zmq.PULL)
+        self.pull.bind(PONG_ADDRESS)
+        self.process = echo_process("zmq")
+
+    def send(self, topic, frame):
+        self.pub.send_multipart([topic, frame])
+
+    def recv(self, timeout):
+        if self.pull.poll(timeout * 1000):
+            return [self.pull.recv_multipart()]
+        return []
+
+    def close(self):
+        self.pub.close()
+        self.pull.close()
+        self.context.term()
+
+class ShmClient:
+    def __init__(self):
+        self.ping = ShmRing(PING_RING, create=True)
+        self.pong = ShmRing(PONG_RING, create=True)
+        self.process = echo_process("shm")
+
+    def send(self, topic, frame):
+        self.ping.send_multipart([topic, frame])
+
+    def recv(self, timeout):
+        return self.pong.recv(timeout)
+
+    def close(self):
+        self.ping.close()
+        self.pong.close()
+
+CLIENTS = {"zmq": ZmqClient, "shm": ShmClient}
+ECHOES = {"zmq": zmq_echo, "shm": shm_echo}
+
+def echo_process(transport):
+    # A separate interpreter, like a sampler started on its own (a multiprocessing
+    # child would share the parent's shared-memory resource tracker)
+    return subprocess.Popen([sys.executable, "-m", "midi.ipc_bench", "--echo", transport])
+
+
+# -------------------------------
+# BENCHMARK
+# -------------------------------
+def note_frame(note):
+    return wire.event_topic(NOTE_ON, note), wire.encode_events([(NOTE_ON, note, 100, time.perf_counter())])
+
+def run_benchmark(transport, bursts=1000, burst_size=(1, 10), gap=(0.005, 0.05), seed=0):
+    """
+    Send bursts of frames and collect their round-trip times.
+
+    Returns:
+        dict: Round-trip percentiles in microseconds and the number of lost frames
+    """
+    rng = random.Random(seed)
+    client = CLIENTS[transport]()
+    try:
+        # Wait until the echo process is connected (ZMQ PUB drops messages before that)
+        while True:
+            client.send(*note_frame(60))
+            if client.recv(0.1):
+                break
+        time.sleep(0.05)
+        while client.recv(0.01):
+            pass
+
+        rtts = []
+        sent = 0
+        for _ in range(bursts):
+            count = rng.randint(*burst_size)
+            for _ in range(count):
+                client.send(*note_frame(rng.randint(36, 96)))
+            sent += count
+            received = 0
+            deadline = time.perf_counter() + 1.0
+            while received < count and time.perf_counter() < deadline:
+                for topic, frame in client.recv(0.1):
+                    for message, timestamp in wire.decode(frame):
+                        rtts.append((time.perf_counter() - timestamp) * 1e6)
+                        received += 1
+            time.sleep(rng.uniform(*gap))
+        client.send(STOP, b"")
+        client.process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        pass
+    finally:
+        if client.process.poll() is None:
+            client.process.terminate()
+        client.close()
+
+    return {
+        "transport": transport,
+        "bursts": bursts,
+        "frames": sent,
+        "lost": sent - len(rtts),
+        "rtt_us": percentiles(rtts),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare round-trip latency of the MIDI transports.")
+    parser.add_argument("--transport", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--bursts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="ipc_bench.json")
+    parser.add_argument("--echo", choices=TRANSPORTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.echo:
+        ECHOES[args.echo]()
+        return
+
+    results = []
+    for transport in args.transport:
+        print(f"[Bench] {transport}...")
+        result = run_benchmark(transport, args.bursts, seed=args.seed)
+        rtt = result["rtt_us"]
+        print(f"[Bench]   rtt p50={rtt.get('p50', 0):.0f}us p99={rtt.get('p99', 0):.0f}us "
+              f"max={rtt.get('max', 0):.0f}us lost={result['lost']}")
+        results.append(result)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"commit": git_commit(), "created": time.time(), "results": results}, f, indent=2)
+    print(f"[Bench] Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
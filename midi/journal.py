@@ -0,0 +1,285 @@
+"""
+Append-only MIDI journal: record what the broadcaster publishes, replay it later.
+
+The recorder subscribes to the broadcaster's PUB socket and appends every
+[topic, frame] message with its arrival time to a memory-mapped file. Every
+INDEX_INTERVAL records an index block is written so a replay can seek to any
+point without scanning the whole performance.
+
+The replayer binds its own PUB socket and republishes a journal at 1x or
+faster, re-stamping MIDI events so samplers schedule them against the current
+clock. Point any sampler at it with --connect.
+
+Usage:
+    python -m midi.journal record gig.mjl
+    python -m midi.journal replay gig.mjl --bind tcp://*:5555 --speed 4 --start 60
+    python -m midi.journal info gig.mjl
+"""
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import time
+import zmq
+from midi import wire
+
+# File layout:
+#   HEADER
+#   then records and index blocks, each starting with a kind byte
+#     RECORD: kind, seconds since start, topic length, frame length, topic, frame
+#     INDEX:  kind, offset of the previous index block (0 = none), entry count,
+#             then count x ENTRY (seconds since start, record offset)
+# The header is rewritten after every append, so a crashed recording is
+# readable up to its last complete record.
+MAGIC = b"MIDIJRN1"
+HEADER = struct.Struct('<8sddQQQ')  # magic, monotonic start, wall-clock start, end, last index, records
+RECORD = struct.Struct('<BdHI')
+INDEX = struct.Struct('<BQI')
+ENTRY = struct.Struct('<dQ')
+RECORD_KIND = 0x52  # 'R'
+INDEX_KIND = 0x49   # 'I'
+
+INDEX_INTERVAL = 256    # Records between index blocks
+GROW_BYTES = 1 << 20    # File growth step
+RECORD_TOPICS = [wire.NOTE_TOPIC, wire.CC_TOPIC, wire.CONTROL_TOPIC]  # Everything except stats
+
+
+class JournalWriter:
+    def __init__(self, filename, start_time=None):
+        """
+        Create a journal for appending.
+
+        Args:
+            filename (str): Journal path (overwritten)
+            start_time (float): time.monotonic() of t=0, defaults to now
+        """
+        self.filename = filename
+        self.start_time = time.monotonic() if start_time is None else start_time
+        self.file = open(filename, 'w+b')
+        self.file.truncate(GROW_BYTES)
+        self.map = mmap.mmap(self.file.fileno(), GROW_BYTES)
+        self.end = HEADER.size
+        self.last_index = 0
+        self.records = 0
+        self.pending = []  # (seconds, offset) not yet in an index block
+        HEADER.pack_into(self.map, 0, MAGIC, self.start_time, time.time(), self.end, 0, 0)
+
+    def _reserve(self, size):
+        if self.end + size > len(self.map):
+            length = len(self.map) + max(GROW_BYTES, size)
+            self.file.truncate(length)
+            self.map.resize(length)
+
+    def _commit_header(self):
+        struct.pack_into('<QQQ', self.map, 24, self.end, self.last_index, self.records)
+
+    def append(self, topic, frame, timestamp=None):
+        """Append one message received at timestamp (time.monotonic(), defaults to now)."""
+        seconds = (time.monotonic() if timestamp is None else timestamp) - self.start_time
+        size = RECORD.size + len(topic) + len(frame)
+        self._reserve(size)
+        offset = self.end
+        RECORD.pack_into(self.map, offset, RECORD_KIND, seconds, len(topic), len(frame))
+        start = offset + RECORD.size
+        self.map[start:start + len(topic)] = topic
+        self.map[start + len(topic):offset + size] = frame
+        self.end += size
+        self.records += 1
+        self.pending.append((seconds, offset))
+        if len(self.pending) >= INDEX_INTERVAL:
+            self.write_index()
+        self._commit_header()
+
+    def write_index(self):
+        if not self.pending:
+            return
+        size = INDEX.size + ENTRY.size * len(self.pending)
+        self._reserve(size)
+        offset = self.end
+        INDEX.pack_into(self.map, offset, INDEX_KIND, self.last_index, len(self.pending))
+        for i, entry in enumerate(self.pending):
+            ENTRY.pack_into(self.map, offset + INDEX.size + i * ENTRY.size, *entry)
+        self.end += size
+        self.last_index = offset
+        self.pending = []
+        self._commit_header()
+
+    def close(self):
+        self.write_index()
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.end)
+        self.file.close()
+
+
+class JournalReader:
+    def __init__(self, filename):
+        """Read-only, memory-mapped view of a journal."""
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start_time, self.wall_time, self.end, self.last_index, self.records = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a MIDI journal")
+        self._index = None
+
+    def index(self):
+        """All index entries as a sorted list of (seconds, offset), following the block chain."""
+        if self._index is None:
+            blocks = []
+            offset = self.last_index
+            while offset:
+                _, previous, count = INDEX.unpack_from(self.map, offset)
+                blocks.append([ENTRY.unpack_from(self.map, offset + INDEX.size + i * ENTRY.size)
+                               for i in range(count)])
+                offset = previous
+            self._index = [entry for block in reversed(blocks) for entry in block]
+        return self._index
+
+    def seek(self, seconds):
+        """Offset of the first record at or after seconds (may land before it on unindexed tails)."""
+        index = self.index()
+        i = bisect.bisect_left(index, (seconds, 0))
+        if i < len(index):
+            return index[i][1]
+        return index[-1][1] if index else HEADER.size
+
+    def __iter__(self):
+        return self.read(0.0)
+
+    def read(self, start=0.0):
+        """Yield (seconds, topic, frame) for every record from start seconds on."""
+        offset = self.seek(start) if start > 0 else HEADER.size
+        while offset < self.end:
+            kind = self.map[offset]
+            if kind == INDEX_KIND:
+                _, _, count = INDEX.unpack_from(self.map, offset)
+                offset += INDEX.size + count * ENTRY.size
+                continue
+            if kind != RECORD_KIND:
+                raise ValueError(f"Corrupt journal at offset {offset}")
+            _, seconds, topic_length, frame_length = RECORD.unpack_from(self.map, offset)
+            topic_start = offset + RECORD.size
+            frame_start = topic_start + topic_length
+            offset = frame_start + frame_length
+            if seconds >= start:
+                yield seconds, self.map[topic_start:frame_start], self.map[frame_start:offset]
+
+    def duration(self):
+        index = self.index()
+        last = 0.0
+        for seconds, _, _ in self.read(index[-1][0] if index else 0.0):
+            last = seconds
+        return last
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+# -------------------------------
+# RECORD / REPLAY
+# -------------------------------
+def record(filename, connect="tcp://localhost:5555"):
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.connect(connect)
+    for topic in RECORD_TOPICS:
+        socket.setsockopt(zmq.SUBSCRIBE, topic)
+    writer = JournalWriter(filename)
+    print(f"Recording {connect} to {filename}... Ctrl+C to stop.")
+    try:
+        while True:
+            topic, frame = socket.recv_multipart()
+            writer.append(topic, frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        socket.close()
+        context.term()
+    print(f"Recorded {writer.records} messages.")
+
+def restamp(frame, offset, speed):
+    """Move a MIDI frame's event timestamps onto the replay clock; control frames pass through."""
+    if not frame or frame[0] != wire.MIDI_FRAME:
+        return frame
+    return wire.encode_events([(message[0], message[1], message[2], offset + timestamp / speed)
+                               for message, timestamp in wire.decode(frame)])
+
+def replay(filename, bind="tcp://*:5555", speed=1.0, start=0.0, loop=False, wait=1.0):
+    """
+    Republish a journal on a PUB socket.
+
+    Args:
+        filename (str): Journal to replay
+        bind (str): Address to bind the PUB socket to
+        speed (float): Playback speed (2.0 = twice as fast)
+        start (float): Seconds into the journal to start from
+        loop (bool): Start over at the end
+        wait (float): Seconds to give subscribers to connect before the first message
+    """
+    reader = JournalReader(filename)
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    socket.bind(bind)
+    time.sleep(wait)
+    sent = 0
+    try:
+        while True:
+            replay_start = time.monotonic()
+            # Journal event timestamps -> replay clock: replay_start + (t - (journal start + start)) / speed
+            offset = replay_start - (reader.start_time + start) / speed
+            for seconds, topic, frame in reader.read(start):
+                delay = replay_start + (seconds - start) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    frame = restamp(bytes(frame), offset, speed)
+                except ValueError as e:
+                    print(f"Skipped malformed frame at {seconds:.3f}s: {e}")
+                    continue
+                socket.send_multipart([bytes(topic), frame])
+                sent += 1
+            if not loop:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket.close()
+        context.term()
+        reader.close()
+    print(f"Replayed {sent} messages.")
+
+def info(filename):
+    reader = JournalReader(filename)
+    print(f"{filename}: {reader.records} messages, {reader.duration():.1f}s, "
+          f"recorded {time.ctime(reader.wall_time)}, {len(reader.index())} indexed, "
+          f"{os.path.getsize(filename)} bytes")
+    reader.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay MIDI journals.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record the broadcaster's output")
+    record_parser.add_argument("journal")
+    record_parser.add_argument("--connect", default="tcp://localhost:5555", help="Broadcaster PUB address")
+    replay_parser = commands.add_parser("replay", help="Republish a journal")
+    replay_parser.add_argument("journal")
+    replay_parser.add_argument("--bind", default="tcp://*:5555",
+                               help="PUB address for samplers (run instead of the broadcaster, or use another port)")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Playback speed multiplier")
+    replay_parser.add_argument("--start", type=float, default=0.0, help="Seconds into the journal to start from")
+    replay_parser.add_argument("--loop", action="store_true", help="Repeat until interrupted")
+    info_parser = commands.add_parser("info", help="Summarize a journal")
+    info_parser.add_argument("journal")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.journal, args.connect)
+    elif args.command == "replay":
+        replay(args.journal, args.bind, args.speed, args.start, args.loop)
+    else:
+        info(args.journal)
@@ -1,37 +1,101 @@
+import argparse
 import rtmidi
 import zmq
 import threading
+import time
+from midi import wire
+from midi.shm import ShmRing
 
-def forward_messages(pull_socket, pub_socket):
-    while True:
-        try:
-            msg = pull_socket.recv_pyobj()
-            pub_socket.send_pyobj(msg)
-        except zmq.ZMQError:
-            pass
-
-# Set up PUB socket for MIDI messages
-pub_context = zmq.Context()
-pub_socket = pub_context.socket(zmq.PUB)
-pub_socket.bind("tcp://*:5555")
-
-# Set up PULL socket for file change messages
-pull_context = zmq.Context()
-pull_socket = pull_context.socket(zmq.PULL)
-pull_socket.bind("tcp://*:5556")
-
-# Start message forwarding in a separate thread
-forward_thread = threading.Thread(target=forward_messages, args=(pull_socket, pub_socket))
-forward_thread.daemon = True
-forward_thread.start()
-
-# Set up MIDI input
-midi_in = rtmidi.MidiIn()
-if midi_in.get_port_count() > 0:
+BATCH_WINDOW = 0.001  # Events arriving within this window (seconds) are sent as one frame per topic
+
+PUB_ADDRESS = "tcp://*:5555"
+PULL_ADDRESS = "tcp://*:5556"
+EVENTS_ADDRESS = "inproc://midi-events"
+
+pending = []
+pending_lock = threading.Lock()
+clock = wire.MidiClock()
+
+def on_midi(message_data, data=None):
+    """rtmidi callback: queue every channel message (note on/off, CC, pitch bend, ...)."""
+    message, delta_time = message_data
+    timestamp = clock.stamp(delta_time)
+    if 0x80 <= message[0] < 0xF0:
+        status, data1, data2 = (list(message) + [0, 0])[:3]
+        with pending_lock:
+            pending.append((status, data1, data2, timestamp))
+
+def flush(outputs):
+    """Send pending events to every output (the proxy's PUSH socket and any shared-memory rings)."""
+    global pending
+    with pending_lock:
+        events, pending = pending, []
+    for topic, group in wire.group_by_topic(events).items():
+        frame = wire.encode_events(group)
+        for output in outputs:
+            output.send_multipart([topic, frame])
+
+def run_proxy(context):
+    """
+    Fan messages out with a native ZMQ proxy: the PULL side collects control
+    and stats messages from tcp://*:5556 and MIDI from inproc, the PUB side
+    filters by topic prefix for each subscriber. No Python code touches the
+    messages in between.
+    """
+    frontend = context.socket(zmq.PULL)
+    frontend.bind(PULL_ADDRESS)
+    frontend.bind(EVENTS_ADDRESS)
+    backend = context.socket(zmq.PUB)
+    backend.bind(PUB_ADDRESS)
+    try:
+        zmq.proxy(frontend, backend)
+    except zmq.ContextTerminated:
+        pass
+    finally:
+        frontend.close()
+        backend.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast MIDI input to samplers.")
+    parser.add_argument("--shm", nargs="+", default=[], metavar="NAME",
+                        help="Also write MIDI to these shared-memory rings (same-host samplers run with --transport shm)")
+    args = parser.parse_args()
+
+    context = zmq.Context()
+
+    proxy_thread = threading.Thread(target=run_proxy, args=(context,), daemon=True)
+    proxy_thread.start()
+
+    # Only the main thread sends MIDI, through the inproc side of the proxy
+    push_socket = context.socket(zmq.PUSH)
+    push_socket.connect(EVENTS_ADDRESS)
+    rings = [ShmRing(name, create=True) for name in args.shm]
+    outputs = [push_socket] + rings
+
+    # Set up MIDI input
+    midi_in = rtmidi.MidiIn()
+    if midi_in.get_port_count() == 0:
+        print('No MIDI input ports found.')
+        return
     midi_in.open_port(0)
+    midi_in.set_callback(on_midi)
     print('MIDI input listening...')
-    while True:
-        msg = midi_in.get_message()
-        if msg and msg[0][0] == 144:  # Note on/off message
-            print(msg)
-            pub_socket.send_pyobj(msg)
\ No newline at end of file
+
+    try:
+        while True:
+            time.sleep(BATCH_WINDOW)
+            flush(outputs)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        midi_in.close_port()
+        push_socket.close()
+        for ring in rings:
+            if ring.dropped:
+                print(f"[{ring.name}] Dropped {ring.dropped} frames (ring full)")
+            # Left in place so samplers stay attached and a restarted broadcaster takes the ring over
+            ring.close(unlink=False)
+        context.term()
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,87 @@
 import numpy as np
-import soundfile as sf
 import sounddevice as sd
 import rtmidi
-import threading
-
-data, samplerate = sf.read("C Major Piano.wav")
-original_note = 60
-
-# Convert mono to stereo if needed
-if len(data.shape) == 1:
-    data = np.column_stack((data, data))  # Duplicate mono channel to create stereo
-
-print(data.shape)
-
-# Keep track of active voices
-active_voices = []
-voices_lock = threading.Lock()
-
-# Basic pitch shift via naive resampling
-def pitch_shift(sample, semitones):
-    factor = 2 ** (semitones / 12.0)
-    indices = np.round(np.arange(0, len(sample), factor)).astype(int)
-    indices = indices[indices < len(sample)]
-    return sample[indices]
-
-# Voice class to track each note
-class Voice:
-    def __init__(self, note, sample):
-        self.note = note
-        self.sample = sample
-        self.position = 0
-
-    def get_samples(self, frames):
-        end = self.position + frames
-        chunk = self.sample[self.position:end]
-        self.position = end
-        return chunk
-
-    def is_done(self):
-        return self.position >= len(self.sample)
+import time
+from midi import wire
+from midi.engine import Mixer, naive_pitch_shift
+from midi.streaming import StreamingSample, load_source
+from midi.stats import CallbackStats, StatsReporter, log_sink
+
+SAMPLE_FILE = "C Major Piano.wav"
+
+# audio_callback's `time` argument shadows the module
+clock_now = time.monotonic
+
+mixer = None
+stats = None
+clock = wire.MidiClock()
+
+def load(filename=SAMPLE_FILE):
+    """Load the sample and build the mixer and stats used by the callbacks."""
+    global mixer, stats
+    data, samplerate = load_source(filename, mono=False)
+    if isinstance(data, StreamingSample):
+        # Long samples keep only their head in memory and stream the rest
+        print(f"Streaming {filename} ({data.frames} frames)")
+    else:
+        # Convert mono to stereo if needed
+        if len(data.shape) == 1:
+            data = np.column_stack((data, data))  # Duplicate mono channel to create stereo
+
+        print(data.shape)
+    stats = CallbackStats(samplerate, name="playback")
+    # One-shots: notes overlap on re-strike and note offs are never sent to the mixer
+    mixer = Mixer(data, samplerate, shift=naive_pitch_shift, channels=2, stats=stats, one_shot=True)
+    return mixer
 
 # Stream callback to mix all voices
 def audio_callback(outdata, frames, time, status):
-    global active_voices
-    mix = np.zeros((frames, data.shape[1]), dtype=np.float32)
-
-    with voices_lock:
-        for voice in active_voices[:]:
-            chunk = voice.get_samples(frames)
-            if len(chunk) < frames:
-                # Pad with zeros if needed
-                chunk = np.pad(chunk, ((0, frames - len(chunk)), (0, 0)))
-            mix += chunk
-            if voice.is_done():
-                active_voices.remove(voice)
-
-    outdata[:] = mix
-
-# Set up audio stream
-stream = sd.OutputStream(channels=data.shape[1], samplerate=samplerate, callback=audio_callback)
-stream.start()
+    start = stats.begin()
+    output_delay = time.outputBufferDacTime - time.currentTime
+    block_time = clock_now() + output_delay
+    outdata[:] = mixer.render(frames, output_delay, block_time)
+    stats.end(start, frames, status)
 
 # Handle MIDI input
 def midi_callback(message_data, time_stamp):
+    midi_time = time.perf_counter()
     message, delta_time = message_data
+    timestamp = clock.stamp(delta_time)
     status = message[0] & 0xF0
     note = message[1]
     velocity = message[2]
 
     if status == 0x90 and velocity > 0:
-        semitone_shift = note - original_note
-        shifted = pitch_shift(data, semitone_shift).astype(np.float32)
-        voice = Voice(note, shifted)
-        with voices_lock:
-            active_voices.append(voice)
-
-# MIDI input setup
-midiin = rtmidi.MidiIn()
-ports = midiin.get_ports()
-if ports:
-    midiin.open_port(0)
-else:
-    midiin.open_virtual_port("Polyphonic Piano")
-midiin.set_callback(midi_callback)
-
-# Keep app alive
-print("Playing... Ctrl+C to stop.")
-try:
-    while True:
-        pass
-except KeyboardInterrupt:
-    print("Exiting.")
-    stream.stop()
-    stream.close()
-    midiin.close_port()
+        # Start on the exact frame, a fixed LOOKAHEAD after the key was pressed
+        mixer.schedule(message[0], note, velocity, timestamp, midi_time)
+
+def main():
+    load()
+
+    # Set up audio stream
+    stream = sd.OutputStream(channels=mixer.channels, samplerate=mixer.samplerate, callback=audio_callback)
+    stream.start()
+    StatsReporter(stats, [log_sink]).start()
+
+    # MIDI input setup
+    midiin = rtmidi.MidiIn()
+    ports = midiin.get_ports()
+    if ports:
+        midiin.open_port(0)
+    else:
+        midiin.open_virtual_port("Polyphonic Piano")
+    midiin.set_callback(midi_callback)
+
+    # Keep app alive
+    print("Playing... Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        print("Exiting.")
+        stream.stop()
+        stream.close()
+        midiin.close_port()
+
+if __name__ == "__main__":
+    main()
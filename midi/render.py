@@ -0,0 +1,187 @@
+"""
+Offline renderer: bounce a MIDI file or event log to WAV at full CPU speed.
+
+Drives the same Mixer/Voice/EffectBoard code as the live engine, so a render
+is a deterministic stand-in for the audio path when there is no sound card.
+
+Usage:
+    python -m midi.render song.mid -o bounce.wav --sample "samples/C Major Piano.wav" --jobs 4
+"""
+import argparse
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from midi.engine import (Mixer, pitch_shift, naive_pitch_shift, limit_audio, create_pedalboard, release_time_for,
+                         BLOCK_SIZE, NOTE_ON)
+
+SEGMENT_SECONDS = 10.0  # Length of each segment handed to a worker process
+PREROLL_SECONDS = 2.0   # Effects warm-up before each segment so tails carry across
+TAIL_SECONDS = 2.0      # Extra time rendered after the last voice when effects are on
+
+# Pitch shift used by each live engine
+SHIFTS = {
+    "sampler": pitch_shift,
+    "playback": naive_pitch_shift,
+}
+# Live engines that play every note as a one-shot (see Mixer's one_shot)
+ONE_SHOT_ENGINES = {"playback"}
+
+
+def load_midi_file(path):
+    """Read note events from a standard MIDI file as (seconds, status, note, velocity)."""
+    import mido  # only needed for .mid input
+
+    events = []
+    now = 0.0
+    for msg in mido.MidiFile(path):  # msg.time is the delta in seconds
+        now += msg.time
+        if msg.type in ("note_on", "note_off"):
+            events.append((now, *msg.bytes()))
+    return events
+
+def load_event_log(path):
+    """
+    Read a recorded event log. Each line is a JSON object:
+    {"time": seconds, "status": int, "note": int, "velocity": int}
+    """
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                events.append((event["time"], event["status"], event["note"], event["velocity"]))
+    return events
+
+def load_events(path):
+    if path.lower().endswith((".mid", ".midi")):
+        events = load_midi_file(path)
+    else:
+        events = load_event_log(path)
+    return sorted(events, key=lambda event: event[0])
+
+def load_sample_file(filename):
+    """Load a sample the same way the sampler does (mono, shape (n, 1))."""
+    data, sr = sf.read(filename)
+    if data.ndim > 1:
+        data = np.mean(data, axis=1)
+    return data[:, np.newaxis], sr
+
+def to_frames(events, samplerate):
+    return [(int(round(t * samplerate)), status, note, velocity) for t, status, note, velocity in events]
+
+def render_length(events, sample_length, samplerate, effects):
+    """Frames needed to let every voice (and effect tail) finish."""
+    end = 0
+    for frame, status, note, velocity in events:
+        if status & 0xF0 == NOTE_ON and velocity > 0:
+            ratio = 2 ** ((note - 60) / 12)
+            end = max(end, frame + math.ceil(sample_length / ratio))
+        end = max(end, frame)
+    if effects:
+        end += int(TAIL_SECONDS * samplerate)
+    return end
+
+def render_segment(job):
+    """
+    Render frames [start, end) of a performance.
+
+    Voices that started before the segment are fast-forwarded with
+    Mixer.advance, so segments line up exactly with a single-pass render.
+    With effects, the mix is also rendered for PREROLL_SECONDS before start
+    (and discarded) to warm up reverb and delay state.
+
+    Args:
+        job (tuple): (sample_file, engine, effects, events in frames, start, end)
+
+    Returns:
+        np.ndarray: Rendered audio of shape (end - start, channels)
+    """
+    sample_file, engine, effects, events, start, end = job
+    data, sr = load_sample_file(sample_file)
+    mixer = Mixer(data, sr, shift=SHIFTS[engine], effects=create_pedalboard() if effects else None,
+                  release_time=release_time_for(sample_file), one_shot=engine in ONE_SHOT_ENGINES)
+    warm_start = max(start - int(PREROLL_SECONDS * sr), 0) if effects else start
+    out = []
+    position = 0
+
+    def run_until(target):
+        nonlocal position
+        if position < warm_start:
+            step = min(target, warm_start) - position
+            mixer.advance(step)
+            position += step
+        while position < target:
+            # Keep blocks on the global BLOCK_SIZE grid so segment boundaries don't change the mix
+            frames = min(BLOCK_SIZE - position % BLOCK_SIZE, target - position)
+            block = mixer.render(frames)
+            if position + frames > start:
+                out.append(block[max(start - position, 0):])
+            position += frames
+
+    for frame, status, note, velocity in events:
+        if frame >= end:
+            break
+        run_until(frame)
+        mixer.handle(status, note, velocity)
+    run_until(end)
+
+    if not out:
+        return np.zeros((0, mixer.channels), dtype=np.float32)
+    return np.concatenate(out)
+
+def render(events, sample_file, engine="sampler", effects=False, jobs=1, segment_seconds=SEGMENT_SECONDS):
+    """
+    Render events to audio, splitting long renders across a process pool.
+
+    Returns:
+        tuple: (audio, samplerate)
+    """
+    info = sf.info(sample_file)
+    sr = info.samplerate
+    frame_events = to_frames(events, sr)
+    total = render_length(frame_events, info.frames, sr, effects)
+
+    segment = max(int(segment_seconds * sr) // BLOCK_SIZE, 1) * BLOCK_SIZE
+    bounds = [(start, min(start + segment, total)) for start in range(0, total, segment)]
+    work = [(sample_file, engine, effects, frame_events, start, end) for start, end in bounds]
+
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(pool.map(render_segment, work))
+    else:
+        parts = [render_segment(job) for job in work]
+
+    if not parts:
+        return np.zeros((0, 1), dtype=np.float32), sr
+    return np.concatenate(parts), sr
+
+def render_file(events_file, output_file, sample_file, engine="sampler", effects=False, jobs=1,
+                segment_seconds=SEGMENT_SECONDS):
+    events = load_events(events_file)
+    start_time = time.perf_counter()
+    audio, sr = render(events, sample_file, engine, effects, jobs, segment_seconds)
+    elapsed = time.perf_counter() - start_time
+
+    audio = limit_audio(audio, threshold=0.8)
+    sf.write(output_file, audio, sr)
+    duration = len(audio) / sr
+    print(f"Rendered {duration:.2f}s of audio in {elapsed:.2f}s "
+          f"({duration / elapsed if elapsed > 0 else float('inf'):.1f}x realtime) to {output_file}")
+    return audio, sr
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a MIDI file or event log to WAV without a sound card.")
+    parser.add_argument("events", help=".mid/.midi file or a JSON-lines event log")
+    parser.add_argument("-o", "--output", default="bounce.wav", help="Output WAV file")
+    parser.add_argument("--sample", default="samples/C Major Piano.wav", help="Sample to play (recorded at C4)")
+    parser.add_argument("--engine", choices=sorted(SHIFTS), default="sampler", help="Which live engine's pitch shift to use")
+    parser.add_argument("--effects", action="store_true", help="Apply the sampler's default pedalboard")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes for segment rendering")
+    parser.add_argument("--segment", type=float, default=SEGMENT_SECONDS, help="Segment length in seconds")
+    args = parser.parse_args()
+
+    render_file(args.events, args.output, args.sample, args.engine, args.effects, args.jobs, args.segment)
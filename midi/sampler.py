@@ -1,136 +1,106 @@
 import sounddevice as sd
 import numpy as np
-import soundfile as sf
-from scipy.signal import resample
+import argparse
 import threading
 import time
 import zmq
-from midi.effectboard import EffectBoard
-context = zmq.Context()
-socket = context.socket(zmq.SUB)
-socket.connect("tcp://localhost:5555")
-socket.setsockopt_string(zmq.SUBSCRIBE, '')
-
-# Initialize with default sample
-data, sr = sf.read("samples/C Major Piano.wav")
+from midi.engine import (midi_note_to_semitone, pitch_shift, limit_audio, create_pedalboard, release_time_for,
+                         schedule_offset, BLOCK_SIZE, LOOKAHEAD, NOTE_ON, NOTE_OFF)
+from midi.envelope import Envelope
+from midi.streaming import StreamingSample, load_source, read_frames
+from midi import shm, wire
+from midi.stats import CallbackStats, StatsReporter, log_sink, zmq_sink, STATS_MESSAGE_TYPE
+
+DEFAULT_SAMPLE = "samples/C Major Piano.wav"
+
+# Current sample, set by load_sample()
+data = None
+sr = 44100
+release_time = release_time_for(DEFAULT_SAMPLE)
 active_notes = {}
 
-# Release fade (in seconds)
-RELEASE_TIME = 0.5
-BLOCK_SIZE = 512
+# Slice of the keyboard this instance plays (None = everything), see main()
+note_range = None
+# Fixed latency added to timestamped notes; must cover stream startup (see --lookahead)
+lookahead = LOOKAHEAD
 
-if data.ndim == 1:
-    data = data[:, np.newaxis]  # convert mono to (n, 1)
-    
-def midi_note_to_semitone(note, base_note=60):
-    return note - base_note  # Assuming sample was recorded at MIDI note 60 (C4)
+stats = CallbackStats(sr, name="sampler")
 
 def load_sample(filename):
-    global data, sr
+    global data, sr, release_time
     try:
-        data, sr = sf.read(filename)
-        print(f"Raw loaded sample shape: {data.shape}, Sample rate: {sr}")
-        
-        # Convert stereo to mono by averaging channels
-        if data.ndim > 1:
-            data = np.mean(data, axis=1)  # Average channels to mono
-            print(f"Converted stereo to mono")
-            
-        data = data[:, np.newaxis]  # Ensure 2D shape (n_samples, 1)
-        print(f"Final sample shape: {data.shape}")
+        # Long samples (pads) are streamed from disk; others are loaded whole.
+        # Either way the sample is mono, shape (n_samples, 1)
+        data, sr = load_source(filename)
+        stats.samplerate = sr
+        release_time = release_time_for(filename)
+        if isinstance(data, StreamingSample):
+            print(f"Streaming sample from disk: {len(data)} frames, Sample rate: {sr}")
+        else:
+            print(f"Final sample shape: {data.shape}, Sample rate: {sr}")
         print(f"Loaded new sample: {filename}")
         return True
     except Exception as e:
         print(f"Error loading sample {filename}: {e}")
         return False
     
-def pitch_shift(audio_data, semitones):
-    ratio = 2 ** (semitones / 12)
-    new_length = int(len(audio_data) / ratio)
-
-    if audio_data.ndim == 1:
-        shifted = resample(audio_data, new_length)
-    else:
-        shifted = np.zeros((new_length, audio_data.shape[1]))
-        for ch in range(audio_data.shape[1]):
-            shifted[:, ch] = resample(audio_data[:, ch], new_length)
-    
-    # Normalize the output to prevent clipping
-    max_amplitude = np.max(np.abs(shifted))
-    if max_amplitude > 0:
-        shifted = shifted / max_amplitude * 0.7  # Scale to 70% of maximum to leave headroom
-    return shifted
-
-def limit_audio(audio_data, threshold=0.8):
-    """
-    Apply simple limiting to audio data to prevent clipping.
-    
-    Args:
-        audio_data (np.ndarray): Input audio data
-        threshold (float): Amplitude threshold (0.0 to 1.0)
-        
-    Returns:
-        np.ndarray: Limited audio data
-    """
-    max_amplitude = np.max(np.abs(audio_data))
-    if max_amplitude > threshold:
-        return audio_data * (threshold / max_amplitude)
-    return audio_data
-
-def create_pedalboard():
-    board = EffectBoard()
-    board.add_reverb(room_size=0.8, wet_level=0.3, dry_level=0.7)
-    board.add_delay(delay_seconds=0.5, feedback=0.3, mix=0.5)
-    board.add_distortion(drive_db=20)
-    return board
-
 class SamplePlayer(threading.Thread):
-    def __init__(self, audio_data, use_pedalboard=True):
+    def __init__(self, audio_data, use_pedalboard=True, midi_time=None, start_time=None):
         super().__init__()
         self.audio_data = audio_data
         self.playing = True
-        self.stream = sd.OutputStream(samplerate=sr, channels=1, callback=self.callback, blocksize=BLOCK_SIZE)  # Smaller frame size
+        self.midi_time = midi_time  # perf_counter() when the triggering MIDI message arrived
+        self.start_time = start_time  # time.monotonic() timestamp of the note on, if known
+        self.stop_time = None
+        self.stream = None
         self.pointer = 0
         self.lock = threading.Lock()
-        self.fade = []
-        self.fade_time = 0
+        self.envelope = Envelope(sr, release=release_time)
         self.pedalboard = create_pedalboard() if use_pedalboard else None
     def run(self):
+        # The stream is opened here so players can be driven without a device (see midi/bench.py)
+        self.stream = sd.OutputStream(samplerate=sr, channels=1, callback=self.callback, blocksize=BLOCK_SIZE,  # Smaller frame size
+                                      finished_callback=stats.voice_finished)
+        stats.voice_started()
         self.stream.start()
         while self.stream.active:
             time.sleep(0.01)
 
-    def stop(self):
+    def stop(self, timestamp=None):
+        """Release the note, at timestamp + lookahead if a timestamp is given."""
         with self.lock:
-            self.playing = False
+            if timestamp:
+                self.stop_time = timestamp
+            else:
+                self.playing = False
             
     def callback(self, outdata, frames, time_info, status):
+        start = stats.begin()
+        try:
+            self.render(outdata, frames, time_info)
+        finally:
+            stats.end(start, frames, status)
+
+    def render(self, outdata, frames, time_info):
+        # When this block's first frame reaches the DAC, on the time.monotonic() clock
+        block_time = time.monotonic() + (time_info.outputBufferDacTime - time_info.currentTime)
         with self.lock:
-            if not self.playing:
-                # Apply release fade
-                release_samples = int(RELEASE_TIME * sr)
-                if len(self.fade) == 0:
-                    fade = np.linspace(1, 0, num=min(release_samples, max(len(self.audio_data) - self.pointer, 0)))
-                    self.fade = fade
-                if self.pointer < len(self.audio_data) and self.fade_time < RELEASE_TIME:
-                    remaining = self.audio_data[self.pointer:self.pointer + frames]
-                    
-                    # Ensure remaining is mono before applying fade
-                    if remaining.ndim > 1:
-                        remaining = np.mean(remaining, axis=1)
-                        remaining = remaining[:, np.newaxis]
-                    
-                    remaining = remaining * self.fade[:min(len(self.fade), frames)]
-                    remaining = remaining[:, 0]  # Convert to 1D for output
-                    outdata[:len(remaining), 0] = remaining
-                    outdata[len(remaining):, 0].fill(0)
+            if self.stop_time is not None and block_time >= self.stop_time + lookahead:
+                self.playing = False
+            if not self.playing and not self.envelope.releasing:
+                self.envelope.release()
+
+            if self.envelope.releasing:
+                # Apply release fade (audio_data is mono, see load_sample)
+                if self.pointer < len(self.audio_data) and not self.envelope.done:
+                    remaining = read_frames(self.audio_data, self.pointer, frames)
+                    outdata[:len(remaining)] = remaining
+                    outdata[len(remaining):].fill(0)
+                    self.envelope.process(outdata)
                     self.pointer += frames
-                    self.fade = self.fade[frames:]
-                    self.fade_time += frames / sr
                 else:
                     print("finished fading")
                     outdata.fill(0)
-                    self.fade = []
                     raise sd.CallbackStop()
                 return
 
@@ -138,7 +108,21 @@ class SamplePlayer(threading.Thread):
                 outdata.fill(0)
                 raise sd.CallbackStop()
             
-            chunk = self.audio_data[self.pointer:self.pointer + frames]
+            if self.pointer == 0 and self.start_time:
+                # Start on the exact frame: pad with silence until timestamp + lookahead
+                offset = schedule_offset(self.start_time, block_time, sr, lookahead)
+                if offset >= frames:
+                    outdata.fill(0)
+                    return
+                self.start_time = None
+                outdata[:offset] = 0
+                outdata = outdata[offset:]
+                frames -= offset
+
+            if self.pointer == 0 and self.midi_time is not None:
+                stats.first_sample(self.midi_time, time_info.outputBufferDacTime - time_info.currentTime)
+
+            chunk = read_frames(self.audio_data, self.pointer, frames)
             if chunk.ndim == 1:
                 chunk = chunk[:, np.newaxis]
                 
@@ -159,42 +143,121 @@ class SamplePlayer(threading.Thread):
 
             self.pointer += frames
 
-print("Sampler started. Waiting for MIDI messages...")
-while True:
-    try:
-        msg = socket.recv_pyobj()
-        print("Received message", msg)
-        
-        # Check if this is a file change message (type 255)
-        if isinstance(msg, tuple) and len(msg) > 0 and msg[0][0] == 255:
-            filename = msg[0][1]  # The filename is in the second byte
-            if load_sample(filename):
-                # Stop all currently playing notes
-                for note, player in list(active_notes.items()):
-                    player.stop()
-                    del active_notes[note]
-            continue
-            
-        # Handle regular MIDI messages (type 144)
-        if isinstance(msg, tuple) and len(msg) > 0 and msg[0][0] == 144:
-            print("Received MIDI", msg)
-            note = msg[0][1]
-            velocity = msg[0][2]
-            if velocity > 0:
-                semitone = midi_note_to_semitone(note)
-                # If note exists, stop it first
-                if note in active_notes:
-                    active_notes[note].stop()
-                    del active_notes[note]
-                # Create new player
-                player = SamplePlayer(pitch_shift(data, semitone), use_pedalboard=False)
-                active_notes[note] = player
-                active_notes[note].start()
-            elif velocity == 0 and note in active_notes:
-                active_notes[note].stop()
-                # Don't delete from active_notes here - let the fade complete first
-            
-    except zmq.ZMQError:
-        pass
-    except KeyboardInterrupt:
-        break
\ No newline at end of file
+def handle_message(msg, midi_time):
+    """Handle one decoded broadcaster message (see midi/wire.py)."""
+    status = msg[0][0]
+
+    # Skip stats snapshots (type 254), including our own
+    if status == STATS_MESSAGE_TYPE:
+        return
+    print("Received message", msg)
+
+    # Check if this is a file change message (type 255)
+    if status == wire.FILE_CHANGE:
+        filename = msg[0][1]  # The filename is in the second byte
+        if load_sample(filename):
+            # Stop all currently playing notes
+            for note, player in list(active_notes.items()):
+                player.stop()
+                del active_notes[note]
+        return
+
+    # Handle note on (0x90) and note off (0x80, or note on with velocity 0) on any channel
+    kind = status & 0xF0
+    if kind not in (NOTE_ON, NOTE_OFF):
+        return
+    note = msg[0][1]
+    velocity = msg[0][2]
+    # Topics filter by octave; drop the few notes outside our exact range
+    if note_range and not note_range[0] <= note <= note_range[1]:
+        return
+    if kind == NOTE_ON and velocity > 0:
+        semitone = midi_note_to_semitone(note)
+        # If note exists, stop it first
+        if note in active_notes:
+            active_notes[note].stop()
+            del active_notes[note]
+        # Create new player
+        if isinstance(data, StreamingSample):
+            shifted = data.reader(semitone, normalize=True)
+        else:
+            shifted = pitch_shift(data, semitone)
+        player = SamplePlayer(shifted, use_pedalboard=False, midi_time=midi_time, start_time=msg[1])
+        active_notes[note] = player
+        active_notes[note].start()
+    elif note in active_notes:
+        active_notes[note].stop(msg[1])
+        # Don't delete from active_notes here - let the fade complete first
+
+def parse_note_range(text):
+    low, high = text.split("-")
+    return int(low), int(high)
+
+def main():
+    global note_range, lookahead
+    parser = argparse.ArgumentParser(description="Play MIDI from the broadcaster with the current sample.")
+    parser.add_argument("--connect", default="tcp://localhost:5555", help="Broadcaster PUB address")
+    parser.add_argument("--channels", type=int, nargs="+", help="Only play these MIDI channels (0-15)")
+    parser.add_argument("--notes", type=parse_note_range, help="Only play this note range, e.g. 48-71")
+    parser.add_argument("--transport", choices=("zmq", "shm"), default="zmq",
+                        help="zmq works across hosts; shm reads MIDI from a shared-memory ring on this host")
+    parser.add_argument("--shm-name", default=shm.DEFAULT_NAME, help="Ring name passed to midi_broadcast --shm")
+    parser.add_argument("--lookahead", type=float, default=LOOKAHEAD,
+                        help="Seconds of fixed latency used to place notes on their exact frame")
+    args = parser.parse_args()
+    note_range = args.notes
+    lookahead = args.lookahead
+
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.connect(args.connect)
+    # Subscribe only to our slice; the PUB socket drops everything else
+    topics = wire.subscriptions(args.channels, args.notes)
+    ring = None
+    if args.transport == "shm":
+        # MIDI comes from the ring, ZMQ only carries control frames
+        ring = shm.ShmRing.attach(args.shm_name)
+        topics = [wire.CONTROL_TOPIC]
+        midi_topics = tuple(wire.subscriptions(args.channels, args.notes, controls=False))
+    for topic in topics:
+        socket.setsockopt(zmq.SUBSCRIBE, topic)
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+    if ring is not None:
+        poller.register(ring.fileno(), zmq.POLLIN)
+
+    # Stats are pushed to the broadcaster, which republishes them on the PUB socket
+    stats_socket = context.socket(zmq.PUSH)
+    stats_socket.connect("tcp://localhost:5556")
+
+    # Initialize with default sample
+    load_sample(DEFAULT_SAMPLE)
+
+    reporter = StatsReporter(stats, [log_sink, zmq_sink(stats_socket)])
+    reporter.start()
+
+    print("Sampler started. Waiting for MIDI messages...")
+    while True:
+        try:
+            ready = dict(poller.poll())
+            midi_time = time.perf_counter()
+            messages = []
+            if socket in ready:
+                messages.append(socket.recv_multipart())
+            if ring is not None:
+                if ring.fileno() in ready:
+                    ring.clear_bell()
+                # The ring has no prefix filtering, so apply the subscription here
+                messages.extend(m for m in ring.read_all() if m[0].startswith(midi_topics))
+            for topic, frame in messages:
+                for msg in wire.decode(frame):
+                    handle_message(msg, midi_time)
+        except zmq.ZMQError:
+            pass
+        except ValueError as e:
+            print(f"Dropped malformed frame: {e}")
+        except KeyboardInterrupt:
+            break
+
+if __name__ == "__main__":
+    main()
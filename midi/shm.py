@@ -0,0 +1,226 @@
+import errno
+import os
+import select
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# Same-host transport: a single-producer/single-consumer byte ring in shared
+# memory plus a named FIFO used as a doorbell. The producer (broadcaster) never
+# blocks: when the ring is full the frame is dropped and counted.
+#
+# Layout: HEADER, then `capacity` bytes of records. Each record is RECORD
+# (payload length, topic length) followed by the topic and the frame, the same
+# two parts ZMQ sends. A payload length of WRAP means "skip to the start of the
+# ring". Positions in the header only ever grow; the offset in the ring is
+# position % capacity.
+HEADER = struct.Struct('<QQQQ')  # capacity, write position, read position, dropped frames
+HEADER_SIZE = 64                 # Keep the data area cache-line aligned
+RECORD = struct.Struct('<IH')
+WRAP = 0xFFFFFFFF
+DEFAULT_CAPACITY = 1 << 20
+DEFAULT_NAME = "midi-sampler"
+ATTACH_TIMEOUT = 10.0            # Seconds a consumer waits for the producer to create the ring
+
+# Byte offsets of the HEADER fields each side updates
+_WRITE = 8
+_READ = 16
+_DROPPED = 24
+_POSITION = struct.Struct('<Q')
+
+
+def doorbell_path(name):
+    return os.path.join("/tmp", f"{name}.bell")
+
+
+class ShmRing:
+    def __init__(self, name=DEFAULT_NAME, capacity=DEFAULT_CAPACITY, create=False):
+        """
+        Shared-memory ring for [topic, frame] traffic between processes on one host.
+
+        The producer only writes the write position and the consumer only
+        writes the read position, each as one aligned 8-byte store after the
+        data it covers, so no lock is needed.
+
+        Args:
+            name (str): Shared memory name, shared by both sides
+            capacity (int): Ring size in bytes (only used when creating)
+            create (bool): Create the segment and doorbell (producer side)
+        """
+        self.name = name
+        if create:
+            self.shm = self.create(name, capacity)
+            if not os.path.exists(doorbell_path(name)):
+                os.mkfifo(doorbell_path(name))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Before Python 3.13 attaching registers the segment too, and the
+            # tracker would unlink it when the consumer exits
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            if HEADER.unpack_from(self.shm.buf, 0)[0] == 0:
+                # Created but the producer hasn't written the header yet
+                self.shm.close()
+                raise FileNotFoundError(f"Shared memory ring {name} is not initialized yet")
+        self.owner = create
+        self.capacity = HEADER.unpack_from(self.shm.buf, 0)[0]
+        self.data = self.shm.buf[HEADER_SIZE:HEADER_SIZE + self.capacity]
+        # O_RDWR keeps the FIFO open without a peer, so neither side blocks on open or gets ENXIO
+        self.bell = os.open(doorbell_path(name), os.O_RDWR | os.O_NONBLOCK)
+
+    @staticmethod
+    def create(name, capacity):
+        """
+        Create the segment, or take over one left by an earlier producer.
+
+        An existing segment of the same capacity is kept, and consumers still
+        attached to it carry on: any unread records are discarded by moving
+        the write position back to the read position. Only a segment of a
+        different capacity is replaced, and its consumers have to reattach.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity)
+            HEADER.pack_into(shm.buf, 0, capacity, 0, 0, 0)
+            return shm
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+        existing = HEADER.unpack_from(shm.buf, 0)[0]
+        if existing == capacity and shm.size >= HEADER_SIZE + capacity:
+            _POSITION.pack_into(shm.buf, _WRITE, _POSITION.unpack_from(shm.buf, _READ)[0])
+            _POSITION.pack_into(shm.buf, _DROPPED, 0)
+            return shm
+        print(f"Replacing shared memory ring {name} ({existing} -> {capacity} bytes); consumers must reattach")
+        shm.close()
+        shm.unlink()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity)
+        HEADER.pack_into(shm.buf, 0, capacity, 0, 0, 0)
+        return shm
+
+    def _get(self, offset):
+        return _POSITION.unpack_from(self.shm.buf, offset)[0]
+
+    def _set(self, offset, value):
+        _POSITION.pack_into(self.shm.buf, offset, value)
+
+    @property
+    def dropped(self):
+        return self._get(_DROPPED)
+
+    def used(self):
+        """Bytes written but not yet read."""
+        return self._get(_WRITE) - self._get(_READ)
+
+    # -------------------------------
+    # PRODUCER
+    # -------------------------------
+    def write(self, topic, frame):
+        """Append one [topic, frame] message. Returns False (and counts a drop) if the ring is full."""
+        size = RECORD.size + len(topic) + len(frame)
+        write = self._get(_WRITE)
+        free = self.capacity - (write - self._get(_READ))
+        offset = write % self.capacity
+        padding = self.capacity - offset if offset + size > self.capacity else 0
+        if size + padding > free:
+            self._set(_DROPPED, self._get(_DROPPED) + 1)
+            return False
+        if padding:
+            if padding >= RECORD.size:
+                RECORD.pack_into(self.data, offset, WRAP, 0)
+            write += padding
+            offset = 0
+        RECORD.pack_into(self.data, offset, len(topic) + len(frame), len(topic))
+        start = offset + RECORD.size
+        self.data[start:start + len(topic)] = topic
+        self.data[start + len(topic):offset + size] = frame
+        # Publish only after the record is complete
+        self._set(_WRITE, write + size)
+        return True
+
+    def ring(self):
+        """Wake the consumer. A full FIFO means a wakeup is already pending."""
+        try:
+            os.write(self.bell, b'\0')
+        except BlockingIOError:
+            pass
+
+    def send_multipart(self, parts):
+        """Drop-in for socket.send_multipart([topic, frame]) on the producer side."""
+        ok = self.write(*parts)
+        self.ring()
+        return ok
+
+    # -------------------------------
+    # CONSUMER
+    # -------------------------------
+    def read_all(self, limit=None):
+        """Pop every complete message (or at most limit) currently in the ring as (topic, frame), oldest first."""
+        messages = []
+        read = self._get(_READ)
+        write = self._get(_WRITE)
+        while read < write and (limit is None or len(messages) < limit):
+            offset = read % self.capacity
+            if self.capacity - offset < RECORD.size:
+                read += self.capacity - offset
+                continue
+            length, topic_length = RECORD.unpack_from(self.data, offset)
+            if length == WRAP:
+                read += self.capacity - offset
+                continue
+            start = offset + RECORD.size
+            messages.append((bytes(self.data[start:start + topic_length]),
+                             bytes(self.data[start + topic_length:start + length])))
+            read += RECORD.size + length
+        self._set(_READ, read)
+        return messages
+
+    def fileno(self):
+        """Doorbell fd, readable when the producer has rung. Usable with select or zmq.Poller."""
+        return self.bell
+
+    def clear_bell(self):
+        try:
+            while os.read(self.bell, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def recv(self, timeout=None):
+        """Wait for the doorbell (up to timeout seconds) and return the pending messages."""
+        messages = self.read_all()
+        if messages:
+            return messages
+        readable, _, _ = select.select([self.bell], [], [], timeout)
+        if readable:
+            self.clear_bell()
+        return self.read_all()
+
+    def close(self, unlink=True):
+        """
+        Detach. The producer also removes the segment and doorbell unless
+        unlink=False, which leaves them for the next producer to take over,
+        so consumers stay attached across a producer restart.
+        """
+        del self.data
+        os.close(self.bell)
+        self.shm.close()
+        if self.owner and not unlink:
+            # Otherwise the resource tracker unlinks it when this process exits
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        elif self.owner:
+            self.shm.unlink()
+            try:
+                os.unlink(doorbell_path(self.name))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME, timeout=ATTACH_TIMEOUT):
+        """Attach as the consumer, waiting up to timeout seconds for the producer to create the ring."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return cls(name, create=False)
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
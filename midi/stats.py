@@ -0,0 +1,221 @@
+import bisect
+import threading
+import time
+from midi import wire
+
+# Message type used when stats are pushed through the broadcaster (255 is file change)
+STATS_MESSAGE_TYPE = 254
+EXPORT_INTERVAL = 5.0  # seconds between exports
+
+# Callback duration buckets, as a fraction of the block deadline (frames / samplerate)
+DEADLINE_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0)
+# MIDI-to-first-sample latency buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Warn if the instrumentation itself costs more than this fraction of the deadline
+OVERHEAD_BUDGET = 0.01
+
+
+class CallbackStats:
+    def __init__(self, samplerate, name="audio"):
+        """
+        Collect timing and xrun counters for a sounddevice callback.
+
+        All recording methods do a fixed amount of work (a bisect over a short
+        tuple and a few integer updates) so they are safe to call every block.
+
+        Args:
+            samplerate (int): Stream sample rate, used to compute block deadlines
+            name (str): Label included in exported snapshots
+        """
+        self.name = name
+        self.samplerate = samplerate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters and histograms."""
+        with self.lock:
+            self.callbacks = 0
+            self.frames = 0
+            self.deadline_misses = 0
+            self.max_load = 0.0
+            self.total_load = 0.0
+            self.callback_hist = [0] * (len(DEADLINE_BUCKETS) + 1)
+            self.output_underflows = 0
+            self.output_overflows = 0
+            self.input_underflows = 0
+            self.input_overflows = 0
+            self.voices = 0
+            self.peak_voices = 0
+            self.latency_hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            self.latency_count = 0
+            self.latency_total_ms = 0.0
+            self.overhead = 0.0
+            self.started = time.perf_counter()
+
+    def begin(self):
+        """Mark the start of a callback. Returns the token to pass to end()."""
+        return time.perf_counter()
+
+    def end(self, start, frames, status=None):
+        """
+        Record one finished callback.
+
+        Args:
+            start (float): Value returned by begin()
+            frames (int): Number of frames the callback had to produce
+            status (sd.CallbackFlags): The status argument of the callback
+        """
+        now = time.perf_counter()
+        load = (now - start) * self.samplerate / frames if frames else 0.0
+        with self.lock:
+            self.callbacks += 1
+            self.frames += frames
+            self.total_load += load
+            self.callback_hist[bisect.bisect_left(DEADLINE_BUCKETS, load)] += 1
+            if load > 1.0:
+                self.deadline_misses += 1
+            if load > self.max_load:
+                self.max_load = load
+            if status:
+                self.output_underflows += bool(status.output_underflow)
+                self.output_overflows += bool(status.output_overflow)
+                self.input_underflows += bool(status.input_underflow)
+                self.input_overflows += bool(status.input_overflow)
+            self.overhead += time.perf_counter() - now
+
+    def first_sample(self, midi_time, output_delay=0.0):
+        """
+        Record the latency between a MIDI message arriving and its first sample.
+
+        Args:
+            midi_time (float): time.perf_counter() when the MIDI message was received
+            output_delay (float): Extra seconds until the block reaches the DAC
+                (time_info.outputBufferDacTime - time_info.currentTime)
+        """
+        now = time.perf_counter()
+        latency_ms = (now - midi_time + max(output_delay, 0.0)) * 1000
+        with self.lock:
+            self.latency_hist[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            self.latency_count += 1
+            self.latency_total_ms += latency_ms
+            self.overhead += time.perf_counter() - now
+
+    def set_voices(self, count):
+        """Update the active voice gauge."""
+        with self.lock:
+            self._set_voices(count)
+
+    def voice_started(self):
+        with self.lock:
+            self._set_voices(self.voices + 1)
+
+    def voice_finished(self):
+        with self.lock:
+            self._set_voices(max(self.voices - 1, 0))
+
+    def _set_voices(self, count):
+        self.voices = count
+        if count > self.peak_voices:
+            self.peak_voices = count
+
+    def snapshot(self):
+        """Return a plain dict of the current counters, safe to pickle or log."""
+        with self.lock:
+            calls = self.callbacks
+            return {
+                "name": self.name,
+                "uptime": time.perf_counter() - self.started,
+                "callbacks": calls,
+                "deadline_ms": self.frames / calls / self.samplerate * 1000 if calls else 0.0,
+                "deadline_misses": self.deadline_misses,
+                "mean_load": self.total_load / calls if calls else 0.0,
+                "max_load": self.max_load,
+                "callback_hist": dict(zip(_bucket_labels(DEADLINE_BUCKETS), self.callback_hist)),
+                "output_underflows": self.output_underflows,
+                "output_overflows": self.output_overflows,
+                "input_underflows": self.input_underflows,
+                "input_overflows": self.input_overflows,
+                "voices": self.voices,
+                "peak_voices": self.peak_voices,
+                "latency_hist_ms": dict(zip(_bucket_labels(LATENCY_BUCKETS_MS), self.latency_hist)),
+                "mean_latency_ms": self.latency_total_ms / self.latency_count if self.latency_count else 0.0,
+                "overhead_per_call_us": self.overhead / calls * 1e6 if calls else 0.0,
+            }
+
+
+def _bucket_labels(edges):
+    return [f"<={edge}" for edge in edges] + [f">{edges[-1]}"]
+
+
+def measure_overhead(samplerate=44100, frames=512, iterations=10000):
+    """
+    Time the begin()/end() pair on an idle callback.
+
+    Returns:
+        tuple: (seconds per call, fraction of the block deadline)
+    """
+    stats = CallbackStats(samplerate, name="overhead")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        stats.end(stats.begin(), frames)
+    per_call = (time.perf_counter() - start) / iterations
+    return per_call, per_call * samplerate / frames
+
+
+def log_sink(snapshot):
+    """Print a one-line summary of a stats snapshot."""
+    print(f"[Stats:{snapshot['name']}] callbacks={snapshot['callbacks']} "
+          f"misses={snapshot['deadline_misses']} "
+          f"load={snapshot['mean_load']:.2f}/{snapshot['max_load']:.2f} "
+          f"xruns={snapshot['output_underflows']}u/{snapshot['output_overflows']}o "
+          f"voices={snapshot['voices']} (peak {snapshot['peak_voices']}) "
+          f"latency={snapshot['mean_latency_ms']:.1f}ms "
+          f"overhead={snapshot['overhead_per_call_us']:.1f}us")
+
+
+def zmq_sink(socket):
+    """
+    Build a sink that pushes snapshots to the broadcaster's PULL socket,
+    which forwards them on the PUB socket as type 254 control frames.
+    """
+    def send(snapshot):
+        socket.send_multipart([wire.STATS_TOPIC, wire.encode_control(STATS_MESSAGE_TYPE, snapshot)])
+    return send
+
+
+class StatsReporter(threading.Thread):
+    def __init__(self, stats, sinks, interval=EXPORT_INTERVAL):
+        """
+        Periodically export a CallbackStats snapshot to one or more sinks.
+
+        Args:
+            stats (CallbackStats): Stats to export
+            sinks (list): Callables taking a snapshot dict
+            interval (float): Seconds between exports
+        """
+        super().__init__(daemon=True)
+        self.stats = stats
+        self.sinks = sinks
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            snapshot = self.stats.snapshot()
+            if snapshot["overhead_per_call_us"] > OVERHEAD_BUDGET * snapshot["deadline_ms"] * 1000:
+                print(f"[Stats:{snapshot['name']}] Warning: instrumentation overhead above budget")
+            for sink in self.sinks:
+                try:
+                    sink(snapshot)
+                except Exception as e:
+                    print(f"[Stats:{snapshot['name']}] Error exporting stats: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    per_call, fraction = measure_overhead()
+    print(f"Instrumentation overhead: {per_call * 1e6:.2f}us per callback "
+          f"({fraction * 100:.3f}% of a 512-frame deadline at 44.1kHz)")
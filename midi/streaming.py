@@ -0,0 +1,262 @@
+import threading
+import weakref
+from functools import lru_cache
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+# Samples whose decoded (mono float32) size is above this are streamed from disk
+STREAM_THRESHOLD_BYTES = 1 << 20
+HEAD_SECONDS = 0.5    # Preloaded at load time, covers the first refill
+RING_SECONDS = 1.0    # Per-voice ring buffer refilled by the I/O thread
+REFILL_SECONDS = 0.1  # Minimum free space before the I/O thread reads again
+PEAK_SCAN_FRAMES = 65536
+SINC_HALF_LENGTH = 16 # Input samples on each side of the interpolation point
+SINC_PHASES = 256     # Fractional positions the interpolation filter is tabulated at
+KAISER_BETA = 5.0
+ROLLOFF = 0.9         # Filter cutoff as a fraction of the output Nyquist, leaving room for the transition band
+
+
+def to_mono(block):
+    if block.ndim > 1:
+        block = np.mean(block, axis=1)
+    return block[:, np.newaxis].astype(np.float32)
+
+@lru_cache(maxsize=None)
+def interpolation_table(cutoff):
+    """
+    Kaiser-windowed sinc taps for every tabulated fractional position.
+
+    Row p holds the 2 * SINC_HALF_LENGTH weights for input samples
+    floor(x) - SINC_HALF_LENGTH + 1 .. floor(x) + SINC_HALF_LENGTH when
+    x - floor(x) = p / SINC_PHASES. cutoff (relative to the source Nyquist)
+    below 1 low-passes for upward shifts, like pitch_shift's FFT resample
+    dropping everything above the new Nyquist.
+    """
+    offsets = np.arange(-SINC_HALF_LENGTH + 1, SINC_HALF_LENGTH + 1)
+    t = offsets[np.newaxis, :] - (np.arange(SINC_PHASES + 1) / SINC_PHASES)[:, np.newaxis]
+    window = np.i0(KAISER_BETA * np.sqrt(np.clip(1 - (t / SINC_HALF_LENGTH) ** 2, 0, 1))) / np.i0(KAISER_BETA)
+    taps = cutoff * np.sinc(cutoff * t) * window
+    # Unity gain at DC for every phase
+    return (taps / taps.sum(axis=1, keepdims=True)).astype(np.float32)
+
+def read_frames(sample, position, frames):
+    """Read frames from a resident array or a streaming reader, starting at position."""
+    if isinstance(sample, np.ndarray):
+        return sample[position:position + frames]
+    return sample.read(position, frames)
+
+
+class StreamingSample:
+    def __init__(self, filename, head_seconds=HEAD_SECONDS, samplerate=None):
+        """
+        A long sample of which only the head is kept in memory.
+
+        The peak is found with a chunked scan at load time so streamed notes
+        can match pitch_shift's normalization without decoding the whole file
+        into memory.
+
+        Args:
+            filename (str): Path to the audio file
+            head_seconds (float): Seconds to preload
+            samplerate (int): Rate to play at, defaults to the file's; readers
+                resample from the file's rate on the fly
+        """
+        self.filename = filename
+        info = sf.info(filename)
+        self.source_rate = info.samplerate
+        self.samplerate = samplerate or info.samplerate
+        self.frames = info.frames
+        self.channels = 1
+        self.peak = 0.0
+        with sf.SoundFile(filename) as f:
+            for block in f.blocks(blocksize=PEAK_SCAN_FRAMES, dtype='float32', always_2d=True):
+                self.peak = max(self.peak, float(np.max(np.abs(np.mean(block, axis=1)), initial=0.0)))
+            f.seek(0)
+            self.head = to_mono(f.read(min(int(head_seconds * self.source_rate), self.frames),
+                                       dtype='float32', always_2d=True))
+
+    def __len__(self):
+        return self.frames
+
+    def reader(self, semitones=0, normalize=False):
+        """
+        Create a voice-level reader that plays the sample pitch-shifted by semitones.
+
+        Args:
+            semitones (float): Pitch shift in semitones (varispeed, like pitch_shift)
+            normalize (bool): Scale to 70% of the peak, matching engine.pitch_shift
+        """
+        gain = 0.7 / self.peak if normalize and self.peak > 0 else 1.0
+        reader = StreamReader(self, 2 ** (semitones / 12) * self.source_rate / self.samplerate, gain)
+        get_streamer().register(reader)
+        return reader
+
+
+class StreamReader:
+    def __init__(self, sample, ratio, gain=1.0):
+        """
+        Sequential, pitch-shifted view of a StreamingSample.
+
+        Behaves like the pitch-shifted array for read_frames(): len() is the
+        shifted length, and read() must be called with increasing positions.
+        The I/O thread fills the ring; the audio thread only copies out of it.
+        Resampling is band-limited (windowed sinc), so a streamed note sounds
+        like the same note rendered resident by pitch_shift.
+        """
+        self.sample = sample
+        self.ratio = ratio
+        self.gain = gain
+        self.taps = interpolation_table(round(min(1.0, ROLLOFF / ratio), 4))
+        self.ring = np.zeros((int(RING_SECONDS * sample.source_rate), 1), dtype=np.float32)
+        self.filled = len(sample.head)    # Source frames available (head + ring)
+        self.consumed = 0                 # Source frames no longer needed by the reader
+        self.underruns = 0
+        self.file = None
+
+    def __len__(self):
+        return int(self.sample.frames / self.ratio)
+
+    def source(self, start, count):
+        """Source frames [start, start + count), zero-padded past the end or on underrun."""
+        out = np.zeros((count, 1), dtype=np.float32)
+        head = self.sample.head
+        end = min(start + count, self.sample.frames)
+        position = start
+        if position < len(head):
+            n = min(len(head), end) - position
+            out[:n] = head[position:position + n]
+            position += n
+        available = min(end, self.filled)
+        if available < end:
+            self.underruns += 1
+        ring_size = len(self.ring)
+        while position < available:
+            offset = position % ring_size
+            n = min(available - position, ring_size - offset)
+            out[position - start:position - start + n] = self.ring[offset:offset + n]
+            position += n
+        return out
+
+    def read(self, position, frames):
+        frames = min(frames, len(self) - position)
+        if frames <= 0:
+            return np.zeros((0, 1), dtype=np.float32)
+        positions = (position + np.arange(frames)) * self.ratio
+        first = int(positions[0])
+        last = int(positions[-1])
+        # Source frames covering every output's filter support; zeros before the start
+        low = first - SINC_HALF_LENGTH + 1
+        block = self.source(max(low, 0), last + SINC_HALF_LENGTH + 1 - max(low, 0))[:, 0]
+        if low < 0:
+            block = np.concatenate((np.zeros(-low, dtype=np.float32), block))
+        base = positions.astype(int)
+        windows = np.lib.stride_tricks.sliding_window_view(block, 2 * SINC_HALF_LENGTH)[base - first]
+        weights = self.taps[np.rint((positions - base) * SINC_PHASES).astype(int)]
+        out = np.einsum('ij,ij->i', windows, weights)[:, np.newaxis]
+        self.consumed = max(last - SINC_HALF_LENGTH + 1, 0)
+        get_streamer().wake()
+        if self.gain != 1.0:
+            out *= self.gain
+        return out
+
+    def refill(self):
+        """Read from disk into free ring space. Called only from the I/O thread."""
+        ring_size = len(self.ring)
+        free = ring_size - (self.filled - max(self.consumed, len(self.sample.head)))
+        remaining = self.sample.frames - self.filled
+        if remaining <= 0 or free < min(int(REFILL_SECONDS * self.sample.source_rate), remaining):
+            return False
+        if self.file is None:
+            self.file = sf.SoundFile(self.sample.filename)
+        self.file.seek(self.filled)
+        block = to_mono(self.file.read(min(free, remaining), dtype='float32', always_2d=True))
+        offset = self.filled % ring_size
+        n = min(len(block), ring_size - offset)
+        self.ring[offset:offset + n] = block[:n]
+        self.ring[:len(block) - n] = block[n:]
+        self.filled += len(block)
+        return True
+
+    def finished(self):
+        return self.filled >= self.sample.frames
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class DiskStreamer(threading.Thread):
+    def __init__(self):
+        """Background I/O thread that keeps every active StreamReader's ring topped up."""
+        super().__init__(daemon=True)
+        self.readers = weakref.WeakSet()
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+
+    def register(self, reader):
+        with self.lock:
+            self.readers.add(reader)
+        self.wake()
+
+    def wake(self):
+        self.wake_event.set()
+
+    def run(self):
+        while True:
+            self.wake_event.wait(REFILL_SECONDS / 2)
+            self.wake_event.clear()
+            with self.lock:
+                readers = list(self.readers)
+            for reader in readers:
+                try:
+                    reader.refill()
+                except Exception as e:
+                    print(f"[Streamer] Error reading {reader.sample.filename}: {e}")
+                    reader.filled = reader.sample.frames
+                if reader.finished():
+                    reader.close()
+                    with self.lock:
+                        self.readers.discard(reader)
+            del readers
+
+
+_streamer = None
+_streamer_lock = threading.Lock()
+
+def get_streamer():
+    global _streamer
+    if _streamer is None:
+        with _streamer_lock:
+            if _streamer is None:
+                _streamer = DiskStreamer()
+                _streamer.start()
+    return _streamer
+
+def load_source(filename, threshold=STREAM_THRESHOLD_BYTES, mono=True, samplerate=None):
+    """
+    Load a sample as a resident mono array, or as a StreamingSample if its
+    decoded size is above threshold bytes. With mono=False a resident sample
+    keeps its channels, as sf.read returns them (streamed samples are always mono).
+    With samplerate set, a file recorded at another rate is resampled to it,
+    for outputs that can't follow the sample's own rate.
+
+    Returns:
+        tuple: (sample, samplerate)
+    """
+    info = sf.info(filename)
+    if threshold is not None and info.frames * 4 > threshold:
+        sample = StreamingSample(filename, samplerate=samplerate)
+        return sample, sample.samplerate
+    data, sr = sf.read(filename)
+    if samplerate and samplerate != sr:
+        common = gcd(samplerate, sr)
+        data = resample_poly(data, samplerate // common, sr // common, axis=0)
+        sr = samplerate
+    if not mono:
+        return data, sr
+    if data.ndim > 1:
+        data = np.mean(data, axis=1)
+    return data[:, np.newaxis], sr
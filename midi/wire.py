@@ -0,0 +1,132 @@
+import json
+import struct
+import time
+
+# Frame layout (second part of a [topic, frame] message): one kind byte, then the payload.
+#   MIDI_FRAME:    uint16 event count, then count x EVENT
+#   CONTROL_FRAME: UTF-8 JSON [type, value] (file change 255, stats 254)
+MIDI_FRAME = 0x01
+CONTROL_FRAME = 0x02
+
+# status, data1 (note), data2 (velocity), timestamp (time.monotonic() seconds)
+EVENT = struct.Struct('<BBBd')
+COUNT = struct.Struct('<BH')
+
+FILE_CHANGE = 255
+RESYNC_THRESHOLD = 0.005  # Re-anchor the MIDI clock when it drifts this far (seconds)
+
+# Topic prefixes, sent as the first part of every multipart message so PUB/SUB
+# filtering happens inside ZMQ:
+#   note/ch03/o05/  note on/off on channel 3, notes 60-71 (octave = note // 12)
+#   cc/ch03/        every other channel message (CC, pitch bend, aftertouch...)
+#   ctl/            control frames (file change)
+#   stats/          stats snapshots
+NOTE_TOPIC = b"note/"
+CC_TOPIC = b"cc/"
+CONTROL_TOPIC = b"ctl/"
+STATS_TOPIC = b"stats/"
+
+
+class MidiClock:
+    def __init__(self):
+        """
+        Turn rtmidi delta times into time.monotonic() timestamps.
+
+        Consecutive deltas come from the driver and are more precise than the
+        time the Python callback happens to run, so timestamps follow the
+        deltas and only snap back to the wall clock when they drift.
+        """
+        self.last = None
+
+    def stamp(self, delta_time):
+        now = time.monotonic()
+        if self.last is None or abs(self.last + delta_time - now) > RESYNC_THRESHOLD:
+            self.last = now
+        else:
+            self.last += delta_time
+        return self.last
+
+
+def event_topic(status, note):
+    """Topic for a channel message."""
+    channel = status & 0x0F
+    if status & 0xF0 in (0x80, 0x90):
+        return b"note/ch%02d/o%02d/" % (channel, note // 12)
+    return b"cc/ch%02d/" % channel
+
+def subscriptions(channels=None, notes=None, controls=True):
+    """
+    Topic prefixes for a subscriber that only wants a slice of the keyboard.
+
+    Args:
+        channels (list): MIDI channels (0-15), or None for all
+        notes (tuple): Inclusive (low, high) note range, or None for all.
+            Filtering is per octave, so callers should still check the exact note
+        controls (bool): Also receive control frames (file change)
+
+    Returns:
+        list: Byte prefixes to pass to setsockopt(zmq.SUBSCRIBE, ...)
+    """
+    topics = [CONTROL_TOPIC] if controls else []
+    if channels is None and notes is None:
+        return topics + [NOTE_TOPIC, CC_TOPIC]
+    for channel in (range(16) if channels is None else channels):
+        if notes is None:
+            topics.append(b"note/ch%02d/" % channel)
+        else:
+            topics.extend(b"note/ch%02d/o%02d/" % (channel, octave)
+                          for octave in range(notes[0] // 12, notes[1] // 12 + 1))
+        topics.append(b"cc/ch%02d/" % channel)
+    return topics
+
+def group_by_topic(events):
+    """Split a batch of events into {topic: [events]} keeping arrival order."""
+    groups = {}
+    for event in events:
+        groups.setdefault(event_topic(event[0], event[1]), []).append(event)
+    return groups
+
+
+def encode_events(events):
+    """
+    Encode MIDI events into one binary frame.
+
+    Args:
+        events (list): (status, data1, data2, timestamp) tuples; missing data
+            bytes (e.g. program change) should be 0
+
+    Returns:
+        bytes: The frame
+    """
+    frame = bytearray(COUNT.size + EVENT.size * len(events))
+    COUNT.pack_into(frame, 0, MIDI_FRAME, len(events))
+    offset = COUNT.size
+    for event in events:
+        EVENT.pack_into(frame, offset, *event)
+        offset += EVENT.size
+    return bytes(frame)
+
+def encode_control(kind, value):
+    """Encode a control message (file change, stats) as a frame."""
+    return bytes([CONTROL_FRAME]) + json.dumps([kind, value]).encode('utf-8')
+
+def decode(frame):
+    """
+    Decode a frame into messages shaped like rtmidi's (message, timestamp):
+    ([status, data1, data2], timestamp) for MIDI, ((type, value), 0) for control.
+    """
+    if not frame:
+        return []
+    if frame[0] == MIDI_FRAME:
+        # Checked here so a truncated frame is a ValueError like any other malformed one, not a struct.error
+        if len(frame) < COUNT.size:
+            raise ValueError(f"Truncated MIDI frame: {len(frame)} bytes")
+        _, count = COUNT.unpack_from(frame, 0)
+        if len(frame) < COUNT.size + count * EVENT.size:
+            raise ValueError(f"Truncated MIDI frame: {count} events in {len(frame)} bytes")
+        return [([status, data1, data2], timestamp)
+                for status, data1, data2, timestamp in EVENT.iter_unpack(frame[COUNT.size:COUNT.size + count * EVENT.size])]
+    if frame[0] == CONTROL_FRAME:
+        kind, value = json.loads(frame[1:].decode('utf-8'))
+        return [((kind, value), 0)]
+    raise ValueError(f"Unknown frame kind: {frame[0]}")
@@ -0,0 +1,151 @@
+"""
+Staged pipeline runner.
+
+Each stage is a long-lived thread connected to the next by a bounded
+queue. All stages run their setup (model loading and so on) at once when
+the pipeline starts, so a slow setup overlaps with the stages before it.
+Upstream stages keep working until the queue in front of the slow stage
+fills up.
+
+A stage's process function is a generator. It receives one input and
+yields any number of outputs, so a stage can filter, expand (partial
+transcripts) or pass items through. The first stage's process takes no
+input and yields items until it is done. The pipeline then drains stage
+by stage.
+
+    pipeline = Pipeline([
+        Stage("listen", listen),
+        Stage("transcribe", transcribe, setup=load_whisper),
+        Stage("play", play),
+    ])
+    pipeline.run()
+    pipeline.report()
+"""
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 8
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name, process, setup=None, flush=None, maxsize=QUEUE_SIZE):
+        """
+        Args:
+            name (str): Shown in the timing report
+            process (callable): Generator function; process(item) (or process() for the
+                first stage) yields the items passed downstream
+            setup (callable): Run once in the stage's thread before it takes any input
+            flush (callable): Generator function run once its input has ended
+            maxsize (int): Size of the queue feeding this stage
+        """
+        self.name = name
+        self.process = process
+        self.setup = setup
+        self.flush = flush
+        self.maxsize = maxsize
+        self.setup_time = 0.0
+        self.ready_at = None   # Seconds after the pipeline started
+        self.count = 0         # Inputs processed
+        self.produced = 0      # Outputs yielded
+        self.busy = 0.0        # Time inside process(), not counting waits on the next queue
+        self.waited = 0.0      # Time inputs spent queued in front of this stage
+        self.slowest = 0.0
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        self.queues = [None] + [queue.Queue(stage.maxsize) for stage in stages[1:]] + [None]
+        self.stop_event = threading.Event()
+        self.outputs = []
+        self.errors = []
+        self.started = None
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def stop(self):
+        """Ask the first stage to finish; items already in flight still drain through."""
+        self.stop_event.set()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def run(self):
+        """Run until the first stage finishes and everything has drained. Returns the last stage's outputs."""
+        self.started = time.perf_counter()
+        threads = [threading.Thread(target=self.run_stage, args=(i,), name=stage.name, daemon=True)
+                   for i, stage in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+        return self.outputs
+
+    def emit(self, index, item):
+        out = self.queues[index + 1]
+        if out is None:
+            self.outputs.append(item)
+        else:
+            out.put((item, time.perf_counter()))
+
+    def drain(self, index, generator):
+        stage = self.stages[index]
+        start = time.perf_counter()
+        for item in generator:
+            now = time.perf_counter()
+            stage.busy += now - start
+            stage.produced += 1
+            self.emit(index, item)
+            start = time.perf_counter()
+        stage.busy += time.perf_counter() - start
+
+    def run_stage(self, index):
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        ended = inbox is None   # True once _DONE has been taken from the inbox
+        try:
+            if stage.setup:
+                start = time.perf_counter()
+                stage.setup()
+                stage.setup_time = time.perf_counter() - start
+            stage.ready_at = self.elapsed()
+            if inbox is None:
+                self.drain(index, stage.process())
+                stage.count = stage.produced
+                return
+            while True:
+                item, queued = inbox.get()
+                if item is _DONE:
+                    ended = True
+                    if stage.flush:
+                        self.drain(index, stage.flush())
+                    return
+                stage.waited += time.perf_counter() - queued
+                busy = stage.busy
+                self.drain(index, stage.process(item))
+                stage.count += 1
+                stage.slowest = max(stage.slowest, stage.busy - busy)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop()
+            # Keep draining so upstream stages don't block on a full queue. Once
+            # _DONE has been taken (an error in flush) there is nothing left to drain.
+            while not ended and inbox.get()[0] is not _DONE:
+                pass
+        finally:
+            if self.queues[index + 1] is not None:
+                self.queues[index + 1].put((_DONE, time.perf_counter()))
+
+    def report(self):
+        print(f"{'stage':<12} {'setup':>7} {'ready':>7} {'items':>6} {'busy':>8} {'mean':>8} {'max':>8} {'queued':>8}")
+        for stage in self.stages:
+            mean = stage.busy / stage.count if stage.count else stage.busy
+            ready = f"{stage.ready_at:6.2f}s" if stage.ready_at is not None else "      -"
+            print(f"{stage.name:<12} {stage.setup_time:6.2f}s {ready} {stage.count:>6} {stage.busy:7.2f}s "
+                  f"{mean * 1000:6.1f}ms {stage.slowest * 1000:6.1f}ms {stage.waited:7.2f}s")
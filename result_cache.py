@@ -0,0 +1,93 @@
+"""
+Time-limited LRU cache for search results.
+
+Keys are built from the route, the normalized query and the request's
+parameters, so "Hard  Kick" and "hard kick" share an entry. Entries
+expire ttl seconds after they were stored. Once maxsize entries are held,
+the least recently used one is evicted.
+
+    cache = ResultCache(maxsize=256, ttl=300)
+    key = cache_key("search", query_text, top_k=5)
+    results = cache.get(key)
+    if results is None:
+        results = cache.put(key, run_search())
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 256
+TTL = 300.0    # Seconds a result stays valid
+
+
+def normalize_query(text):
+    """Lowercase and collapse whitespace."""
+    return " ".join(str(text).lower().split())
+
+
+def cache_key(route, query, **params):
+    return (route, normalize_query(query), tuple(sorted(params.items())))
+
+
+class ResultCache:
+    def __init__(self, maxsize=MAX_ENTRIES, ttl=TTL):
+        """
+        Args:
+            maxsize (int): Entries kept before the least recently used is evicted; 0 disables the cache
+            ttl (float): Seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()   # key -> (expires, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The cached value, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Store value (not None) and return it."""
+        if self.maxsize <= 0:
+            return value
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, route=None):
+        """Drop every entry, or only those for one route."""
+        with self.lock:
+            if route is None:
+                self.entries.clear()
+                return
+            for key in [key for key in self.entries if key[0] == route]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Compare int8 (quantized) inference against fp32 for Whisper and the sentence model.
+
+Whisper: transcribes every .wav in --fixtures and reports WER and mean
+latency per mode. A reference transcript is read from a .txt file next to
+each .wav when one exists. Otherwise the fp32 transcript is the reference,
+so the int8 WER measures how much quantization changes the output.
+whisper_STT/fixtures holds the repo's vocal samples at 16 kHz (built by
+scripts/make_whisper_fixtures.py, which can also record spoken requests
+with their .txt references).
+
+Sentence model: encodes each description in samples.csv (plus a few
+typical spoken requests) in both modes. It searches the stored fp32
+embeddings and reports how often int8 returns the same top-1 sample,
+the overlap of the top-3, and the cosine similarity between the two query
+embeddings.
+
+Both runs also report load time. Run twice to see the cached int8 load.
+
+Usage:
+    python scripts/benchmark_inference.py --fixtures whisper_STT/fixtures
+    python scripts/benchmark_inference.py --skip-whisper --threads 4
+"""
+import argparse
+import ast
+import csv
+import glob
+import os
+import re
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference import load_sentence_model, load_whisper, set_threads
+
+EXTRA_QUERIES = [
+    "hard kick sound for hip hop or trap",
+    "soft violin for a sad melody",
+    "deep 808 bass with a long tail",
+    "bright piano chord",
+    "ambient pad like clouds",
+]
+
+
+def words(text):
+    return re.sub(r"[^\w' ]", " ", text.lower()).split()
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + insertions + deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+def wer(references, hypotheses):
+    errors = sum(word_errors(words(r), words(h)) for r, h in zip(references, hypotheses))
+    total = sum(len(words(r)) for r in references)
+    return errors / total if total else 0.0
+
+
+def run_whisper(mode, files, model_size):
+    import whisper
+
+    start = time.perf_counter()
+    model = load_whisper(model_size, mode)
+    load_time = time.perf_counter() - start
+    texts, latencies = [], []
+    for path in files:
+        audio = whisper.load_audio(path)
+        start = time.perf_counter()
+        texts.append(model.transcribe(audio, fp16=False, language="en")["text"].strip())
+        latencies.append(time.perf_counter() - start)
+    return load_time, texts, latencies
+
+def benchmark_whisper(args):
+    files = sorted(glob.glob(os.path.join(args.fixtures, "*.wav")))
+    if not files:
+        print(f"No .wav fixtures in {args.fixtures}; skipping Whisper")
+        return
+    results = {mode: run_whisper(mode, files, args.whisper_model) for mode in ("fp32", "int8")}
+    references = []
+    for path, fp32_text in zip(files, results["fp32"][1]):
+        reference_file = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(reference_file):
+            with open(reference_file, encoding='utf-8') as f:
+                references.append(f.read())
+        else:
+            references.append(fp32_text)
+
+    print(f"\nWhisper {args.whisper_model}, {len(files)} files")
+    print(f"{'mode':<6} {'load':>8} {'mean':>8} {'p95':>8} {'WER':>7}")
+    for mode, (load_time, texts, latencies) in results.items():
+        print(f"{mode:<6} {load_time:>7.2f}s {np.mean(latencies):>7.3f}s {np.percentile(latencies, 95):>7.3f}s "
+              f"{wer(references, texts):>6.1%}")
+    fp32_mean, int8_mean = np.mean(results["fp32"][2]), np.mean(results["int8"][2])
+    print(f"int8 speedup: {fp32_mean / int8_mean:.2f}x")
+
+
+def load_samples(csv_filename):
+    with open(csv_filename, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    names = [row['filename'] for row in rows]
+    descriptions = [row['description'] for row in rows]
+    index = np.array([ast.literal_eval(row['embedding']) for row in rows], dtype=np.float32)
+    index /= np.linalg.norm(index, axis=1, keepdims=True)
+    return names, descriptions, index
+
+def benchmark_sentence(args):
+    names, descriptions, index = load_samples(args.samples)
+    queries = descriptions + EXTRA_QUERIES
+    encoded = {}
+    print(f"\nSentence model {args.sentence_model}, {len(queries)} queries against {len(names)} samples")
+    print(f"{'mode':<6} {'load':>8} {'mean':>9} {'p95':>9}")
+    for mode in ("fp32", "int8"):
+        start = time.perf_counter()
+        model = load_sentence_model(args.sentence_model, mode)
+        load_time = time.perf_counter() - start
+        model.encode(queries[0])  # Warm-up
+        latencies, vectors = [], []
+        for query in queries:
+            start = time.perf_counter()
+            vectors.append(model.encode(query))
+            latencies.append(time.perf_counter() - start)
+        vectors = np.array(vectors, dtype=np.float32)
+        encoded[mode] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        print(f"{mode:<6} {load_time:>7.2f}s {np.mean(latencies) * 1000:>7.2f}ms "
+              f"{np.percentile(latencies, 95) * 1000:>7.2f}ms")
+
+    ranked = {mode: np.argsort(-(vectors @ index.T), axis=1) for mode, vectors in encoded.items()}
+    top1 = np.mean(ranked["fp32"][:, 0] == ranked["int8"][:, 0])
+    top3 = np.mean([len(set(a[:3]) & set(b[:3])) / 3 for a, b in zip(ranked["fp32"], ranked["int8"])])
+    cosine = np.sum(encoded["fp32"] * encoded["int8"], axis=1)
+    print(f"top-1 agreement {top1:.1%}, top-3 overlap {top3:.1%}, "
+          f"query cosine fp32 vs int8 mean {cosine.mean():.4f} (min {cosine.min():.4f})")
+    for i in np.flatnonzero(ranked["fp32"][:, 0] != ranked["int8"][:, 0]):
+        print(f"  differs: {queries[i][:60]!r}: {names[ranked['fp32'][i, 0]]} -> {names[ranked['int8'][i, 0]]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8 against fp32 inference.")
+    parser.add_argument("--fixtures", default="whisper_STT/fixtures", help="Directory of .wav (+ .txt reference) files")
+    parser.add_argument("--samples", default="samples.csv")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--sentence-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads for both modes")
+    parser.add_argument("--skip-whisper", action="store_true")
+    parser.add_argument("--skip-sentence", action="store_true")
+    args = parser.parse_args()
+
+    if args.threads:
+        set_threads(args.threads)
+    if not args.skip_whisper:
+        benchmark_whisper(args)
+    if not args.skip_sentence:
+        benchmark_sentence(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Check that transcription can't cause audio dropouts when audio runs in its
+own process.
+
+Starts midi.audio_server, loops a sample through it, and runs Whisper
+transcription in this process for --seconds. It then compares the server's
+output underflows and missed callback deadlines from before and after the
+workload. Exits 1 if there were any. Use --in-process to run the same audio
+server inside this interpreter for comparison.
+
+Without Whisper installed, a pure-Python loop that holds the GIL stands in
+for the transcription.
+
+Usage:
+    python scripts/check_audio_isolation.py --seconds 30
+    python scripts/check_audio_isolation.py --seconds 30 --in-process
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import zmq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from midi import wire
+from midi.audio_server import AudioServer, AudioClient, STATUS_ADDRESS
+
+DEFAULT_SAMPLE = "samples/C Major Piano.wav"
+
+
+def whisper_workload(audio_file):
+    import whisper
+    model = whisper.load_model("tiny")
+    def run():
+        model.transcribe(audio_file, fp16=False)
+    return run
+
+def python_workload():
+    def run():
+        # Pure-Python work only gives up the GIL every switch interval (5 ms)
+        total = 0
+        for i in range(2_000_000):
+            total += i * i % 7
+        return total
+    return run
+
+def watch_status(snapshots, stop):
+    """Collect stats snapshots published by the audio server."""
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.SUB)
+    socket.connect(STATUS_ADDRESS)
+    socket.setsockopt(zmq.SUBSCRIBE, wire.STATS_TOPIC)
+    while not stop.is_set():
+        if socket.poll(200):
+            topic, frame = socket.recv_multipart()
+            for (kind, snapshot), _ in wire.decode(frame):
+                snapshots.append(snapshot)
+    socket.close()
+
+def xruns(snapshot):
+    return snapshot["output_underflows"] + snapshot["deadline_misses"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check for audio xruns while transcribing.")
+    parser.add_argument("--seconds", type=float, default=30.0, help="How long to run the workload")
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE, help="Sample to loop (and transcribe)")
+    parser.add_argument("--in-process", action="store_true", help="Run audio in this process instead")
+    args = parser.parse_args()
+
+    try:
+        workload = whisper_workload(args.sample)
+        name = "whisper"
+    except ImportError:
+        workload = python_workload()
+        name = "python loop (whisper not installed)"
+
+    server = None
+    process = None
+    snapshots = []
+    stop = threading.Event()
+    if args.in_process:
+        server = AudioServer()
+        threading.Thread(target=server.run, daemon=True).start()
+        current = server.stats.snapshot
+    else:
+        process = subprocess.Popen([sys.executable, "-m", "midi.audio_server"])
+        threading.Thread(target=watch_status, args=(snapshots, stop), daemon=True).start()
+        current = lambda: snapshots[-1] if snapshots else None
+
+    client = AudioClient()
+    client.play(args.sample, volume=0.5, loop=True)
+    # Let the stream settle before measuring
+    time.sleep(3)
+    before = current()
+    if before is None:
+        print("No stats from the audio server; is it running?")
+        sys.exit(2)
+
+    print(f"Running {name} for {args.seconds:.0f}s with audio {'in this process' if args.in_process else 'isolated'}...")
+    start = time.monotonic()
+    runs = 0
+    while time.monotonic() - start < args.seconds:
+        workload()
+        runs += 1
+    time.sleep(1.5)  # One more stats export after the workload
+    after = current()
+
+    client.shutdown()
+    client.close()
+    stop.set()
+    if process is not None:
+        process.wait(timeout=5)
+
+    count = xruns(after) - xruns(before)
+    callbacks = after["callbacks"] - before["callbacks"]
+    if not callbacks:
+        print("The audio callback never ran; check the output device")
+        sys.exit(2)
+    print(f"{runs} workload runs, {callbacks} callbacks, max load {after['max_load']:.2f}, "
+          f"{after['output_underflows'] - before['output_underflows']} underflows, "
+          f"{after['deadline_misses'] - before['deadline_misses']} missed deadlines")
+    if count:
+        print("FAIL: audio dropped out during the workload")
+        sys.exit(1)
+    print("OK: no xruns")
+
+if __name__ == "__main__":
+    main()
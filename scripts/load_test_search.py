@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Load-test app.py's /search with and without micro-batching.
+
+Each client thread sends --requests GET /search queries through its own
+Flask test client, all at once. This runs once per --batch-sizes entry
+(1 = every query encoded on its own, the old behaviour) and reports
+requests/s, client-side latency, and the encoder's mean batch and encode
+time. Queries are the sample descriptions with a counter appended, so no
+two are identical.
+
+--local-index answers from the on-disk index over sounds.csv/samples.csv
+(SEARCH_BACKEND=local) instead of Pinecone, so no network is needed. The
+result cache is off while testing so every request is encoded.
+
+Usage:
+    python scripts/load_test_search.py --clients 16 --requests 25 --local-index
+    python scripts/load_test_search.py --batch-sizes 1,8,32 --wait-ms 2
+"""
+import argparse
+import csv
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(app_module, queries, clients, requests_per_client):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def client(number):
+        test_client = app_module.app.test_client()
+        mine = []
+        barrier.wait()
+        for i in range(requests_per_client):
+            query = queries[(number * requests_per_client + i) % len(queries)]
+            start = time.perf_counter()
+            response = test_client.get('/search', query_string={'query': f"{query} {number}-{i}"})
+            mine.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                with lock:
+                    errors.append(response.get_json())
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /search with and without micro-batching.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=25, help="Requests per client")
+    parser.add_argument("--batch-sizes", default="1,32", help="Comma-separated max_batch values to compare")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="Batch window in milliseconds")
+    parser.add_argument("--samples", default="samples.csv", help="Source of the query texts")
+    parser.add_argument("--local-index", action="store_true", help="Search the local index instead of Pinecone")
+    args = parser.parse_args()
+
+    os.environ["SEARCH_CACHE_SIZE"] = "0"
+    if args.local_index:
+        os.environ["SEARCH_BACKEND"] = "local"
+    import app as app_module
+    from batch_encoder import BatchEncoder
+
+    with open(args.samples, newline='', encoding='utf-8') as f:
+        queries = [row['description'] for row in csv.DictReader(f)]
+    print("Loading the sentence model and the index...")
+    app_module.model.encode(["warm-up"])
+    app_module.index.get()
+
+    total = args.clients * args.requests
+    print(f"{args.clients} clients x {args.requests} requests, {args.wait_ms:g} ms window\n")
+    print(f"{'max_batch':>9} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'batch':>6} {'encode':>8} {'errors':>6}")
+    baseline = None
+    for max_batch in (int(size) for size in args.batch_sizes.split(",")):
+        app_module.encoder = BatchEncoder(app_module.model, max_batch=max_batch, max_wait=args.wait_ms / 1000)
+        elapsed, latencies, errors = run(app_module, queries, args.clients, args.requests)
+        stats = app_module.encoder.stats()
+        throughput = total / elapsed
+        baseline = baseline or throughput
+        p50, p95, p99 = (np.percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        print(f"{max_batch:>9} {throughput:>8.1f} {p50:>6.1f}ms {p95:>6.1f}ms {p99:>6.1f}ms "
+              f"{stats['mean_batch']:>6.1f} {stats['encode_ms'].get('p50', 0):>6.1f}ms {len(errors):>6}"
+              f"  x{throughput / baseline:.2f}")
+        if errors:
+            print(f"  first error: {errors[0]}")
+
+if __name__ == "__main__":
+    main()
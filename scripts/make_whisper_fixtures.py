@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Build the Whisper fixture set used by scripts/benchmark_inference.py.
+
+By default this converts the vocal samples in samples/ (PS2_Vox*.wav) to
+16 kHz mono 16-bit WAVs in whisper_STT/fixtures. The committed fixtures were
+made this way. They have no .txt reference, so the benchmark scores int8
+against the fp32 transcript.
+
+With --record, each prompt below is read aloud into the microphone (through
+the capture service) and saved as a numbered .wav. The prompt is saved next
+to it as its .txt reference, so the benchmark reports a real WER for it.
+
+Usage:
+    python scripts/make_whisper_fixtures.py
+    python scripts/make_whisper_fixtures.py --record --seconds 4
+"""
+import argparse
+import glob
+import os
+import sys
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_RATE = 16000
+VOCALS = os.path.join(ROOT, "samples", "PS2_Vox*.wav")
+FIXTURES = os.path.join(ROOT, "whisper_STT", "fixtures")
+# Spoken requests like the ones main.py turns into samples
+PROMPTS = [
+    "play a hard kick sound for hip hop",
+    "give me a soft violin for a sad melody",
+    "I want a deep eight oh eight bass",
+    "switch to a bright piano chord",
+    "find an ambient pad that sounds like clouds",
+]
+
+
+def fixture_name(path):
+    return os.path.splitext(os.path.basename(path))[0].replace(" ", "_").replace("(", "").replace(")", "")
+
+def convert(path, output_dir):
+    data, sr = sf.read(path)
+    if data.ndim > 1:
+        data = np.mean(data, axis=1)
+    common = gcd(sr, SAMPLE_RATE)
+    data = resample_poly(data, SAMPLE_RATE // common, sr // common)
+    output = os.path.join(output_dir, fixture_name(path) + ".wav")
+    sf.write(output, data, SAMPLE_RATE, subtype='PCM_16')
+    print(f"{path} -> {output}")
+
+def record(output_dir, seconds):
+    from whisper_STT.capture import get_capture
+
+    capture = get_capture()
+    for i, prompt in enumerate(PROMPTS, 1):
+        input(f"\nPress Enter, then say: \"{prompt}\"")
+        audio = capture.record(seconds)
+        base = os.path.join(output_dir, f"request_{i:02d}")
+        sf.write(base + ".wav", audio, capture.sample_rate, subtype='PCM_16')
+        with open(base + ".txt", "w", encoding='utf-8') as f:
+            f.write(prompt + "\n")
+        print(f"Saved {base}.wav")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Whisper benchmark fixtures.")
+    parser.add_argument("--output", default=FIXTURES, help="Fixture directory")
+    parser.add_argument("--record", action="store_true", help="Record the spoken prompts from the microphone")
+    parser.add_argument("--seconds", type=float, default=4.0, help="Seconds recorded per prompt")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.record:
+        record(args.output, args.seconds)
+    else:
+        for path in sorted(glob.glob(VOCALS)):
+            convert(path, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
+import os
 import pyaudio
-import wave
 import sys
-import time
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whisper_STT.capture import CaptureService, get_capture
 
 def test_microphone(device_name):
     # Initialize PyAudio
@@ -35,91 +39,45 @@ def test_microphone(device_name):
         
     # print(p.get_device_info_by_index(device_name))
         
-    # Set recording parameters
-    CHUNK = 1024
-    FORMAT = pyaudio.paInt16
-    CHANNELS = 1
-    RATE = 48000
-    RECORD_SECONDS = 5
-    
+    # Done listing; the capture service opens its own stream
+    p.terminate()
+
     try:
-        # Open audio stream
-        stream = p.open(format=FORMAT,
-                       channels=CHANNELS,
-                       rate=RATE,
-                       input=True,
-                       input_device_index=device_name,
-                       frames_per_buffer=CHUNK)
-        
+        # The capture service resamples from the device's native rate to 16 kHz as it records
+        capture = CaptureService(device=device_name)
         print("Recording 5 seconds of audio...")
-        
-        # Record audio
-        frames = []
-        for i in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
-            data = stream.read(CHUNK)
-            frames.append(data)
-            
+        reader = capture.reader()
+        audio = np.zeros(5 * capture.sample_rate, dtype=np.float32)
+        filled = 0
+        for block in reader.blocks(capture.sample_rate // 10):
+            audio[filled:filled + len(block)] = block[:len(audio) - filled]
+            filled += len(block)
+            print(f"  level {capture.level():6.1f} dBFS")
+            if filled >= len(audio):
+                break
         print("Finished recording")
-        
-        # Stop and close the stream
-        stream.stop_stream()
-        stream.close()
-        
-        # Save the recorded data as a WAV file
-        wf = wave.open("test_microphone.wav", 'wb')
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(p.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
-        wf.close()
-        
+        capture.close()
+
+        sf.write("test_microphone.wav", audio, capture.sample_rate, subtype='PCM_16')
         print("Saved audio to test_microphone.wav")
         return True
-        
+
     except Exception as e:
         print(f"Error recording audio: {e}")
         return False
-    finally:
-        # Terminate PyAudio
-        p.terminate()
-        
-        
+
+
 def record_audio(seconds=30, output_filename="output.wav"):
     """Record audio from default microphone for a given duration."""
-    # Audio recording parameters
-    CHUNK = 1024
-    FORMAT = pyaudio.paInt16
-    CHANNELS = 1
-    RATE = 44100
-
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK)
+    capture = get_capture()
 
     print(f"Recording for {seconds} seconds...")
-    frames = []
-
-    for _ in range(0, int(RATE / CHUNK * seconds)):
-        data = stream.read(CHUNK)
-        frames.append(data)
-
+    audio = capture.record(seconds)
     print("Recording finished.")
 
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    # Save the recorded data as a WAV file
-    wf = wave.open(output_filename, "wb")
-    wf.setnchannels(CHANNELS)
-    wf.setsampwidth(p.get_sample_size(FORMAT))
-    wf.setframerate(RATE)
-    wf.writeframes(b''.join(frames))
-    wf.close()
+    sf.write(output_filename, audio, capture.sample_rate, subtype='PCM_16')
     print(f"Audio saved to {output_filename}")
+    return True
 
 if __name__ == "__main__":
     success = record_audio(seconds=5, output_filename="output.wav")
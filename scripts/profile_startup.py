@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Show where each entry point spends its start-up time.
+
+Imports every entry point in a fresh interpreter with `python -X importtime`
+and prints the wall time of the import plus the modules that cost the most,
+both cumulative (a module and everything it pulled in) and self. Background
+preloading (lazy.py) is turned off while measuring, so only what an entry
+point imports eagerly is counted. Entry points whose imports fail (a
+dependency that isn't installed here) are reported with the error.
+
+Exits 1 if any entry point takes longer than --budget seconds to import.
+
+Usage:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py main app --top 15 --budget 1.0
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = [
+    "main",
+    "app",
+    "text_to_filename",
+    "load_sample",
+    "whisper_STT.live_cts_whisper",
+    "whisper_STT.server",
+    "midi.audio_server",
+]
+# Prints the import's wall time as the last line of stdout
+PROBE = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def parse_importtime(stderr):
+    """
+    Rows of `-X importtime` output as (name, depth, self_us, cumulative_us).
+    Depth is the nesting of the import (0 for modules imported by the probe itself).
+    """
+    rows, other = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            other.append(line)
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows, other
+
+
+def profile(module):
+    """Returns (wall seconds or None, importtime rows, error text or None)."""
+    env = dict(os.environ, PRELOAD="0", PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    rows, other = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        errors = [line for line in other if line.strip()]
+        return None, rows, errors[-1] if errors else f"exit code {result.returncode}"
+    return float(result.stdout.strip().splitlines()[-1]), rows, None
+
+
+def direct_imports(module, rows):
+    """
+    The rows a module imported itself. -X importtime prints a module after
+    everything it imported, so they are the rows one level deeper just above it.
+    """
+    positions = [i for i, row in enumerate(rows) if row[0] == module]
+    if not positions:
+        return []
+    depth = rows[positions[-1]][1]
+    direct = []
+    for row in reversed(rows[:positions[-1]]):
+        if row[1] <= depth:
+            break
+        if row[1] == depth + 1:
+            direct.append(row)
+    return sorted(direct, key=lambda row: -row[3])
+
+
+def report(module, wall, rows, error, top):
+    print(f"\n== {module}")
+    if error:
+        print(f"   import failed: {error}")
+    else:
+        print(f"   import wall time {wall * 1000:.0f} ms, {len(rows)} modules")
+    direct = direct_imports(module, rows)
+    if direct:
+        print(f"   {'cumulative':>10}  imported by {module}")
+        for name, _, _, cumulative in direct[:top]:
+            print(f"   {cumulative / 1000:8.1f}ms  {name}")
+    heaviest = sorted(rows, key=lambda row: -row[2])
+    if heaviest:
+        print(f"   {'self':>10}  most expensive modules")
+        for name, _, self_us, _ in heaviest[:top]:
+            print(f"   {self_us / 1000:8.1f}ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of the entry points.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Modules to import (default: all entry points)")
+    parser.add_argument("--top", type=int, default=10, help="Modules listed per entry point")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds an import may take")
+    args = parser.parse_args()
+
+    summary = []
+    for module in args.modules:
+        wall, rows, error = profile(module)
+        report(module, wall, rows, error, args.top)
+        summary.append((module, wall, error))
+
+    print(f"\n{'entry point':<32} {'import':>9}")
+    over_budget = False
+    for module, wall, error in summary:
+        if error:
+            print(f"{module:<32} {'failed':>9}  {error[:60]}")
+            continue
+        flag = "  over budget" if wall > args.budget else ""
+        over_budget |= wall > args.budget
+        print(f"{module:<32} {wall * 1000:>7.0f}ms{flag}")
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
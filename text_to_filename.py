@@ -1,7 +1,11 @@
-import pandas as pd
-import numpy as np
 import ast
-from sentence_transformers import SentenceTransformer
+import csv
+import numpy as np
+from inference import load_sentence_model
+from lazy import Lazy
+
+# Built on the first call and reused, instead of reloading the model for every request
+model = Lazy(lambda: load_sentence_model('all-MiniLM-L6-v2'), "sentence model")
 
 
 def cosine_similarity(vec1, vec2):
@@ -12,10 +16,14 @@ def load_dataset(csv_filename):
     """
     Load the sounds dataset from a CSV.
     The CSV must have an 'embedding' column with string representations of a list.
+    Returns a list of row dicts (csv instead of pandas, which costs more to
+    import than the whole search).
     """
-    df = pd.read_csv(csv_filename)
-    df['embedding'] = df['embedding'].apply(ast.literal_eval)
-    return df
+    with open(csv_filename, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row['embedding'] = ast.literal_eval(row['embedding'])
+    return rows
 
 def compute_query_embedding(query, model):
     """Compute the embedding vector for the query text."""
@@ -23,21 +31,15 @@ def compute_query_embedding(query, model):
 
 def find_best_match(query_embedding, csv_filename):
     """
-    Compare the query embedding against all embeddings in the DataFrame,
+    Compare the query embedding against all embeddings in the dataset,
     and return the row with the highest cosine similarity.
     """
-    df = load_dataset(csv_filename)
-    similarities = []
-    for _, row in df.iterrows():
-        sound_embedding = np.array(row['embedding'])
-        sim = cosine_similarity(query_embedding, sound_embedding)
-        similarities.append(sim)
-    df['similarity'] = similarities
-    df_sorted = df.sort_values(by='similarity', ascending=False)
-    return df_sorted.iloc[0]
+    rows = load_dataset(csv_filename)
+    for row in rows:
+        row['similarity'] = cosine_similarity(query_embedding, np.array(row['embedding']))
+    return max(rows, key=lambda row: row['similarity'])
 
 def text_to_filename(text, csv_filename):
-    model = SentenceTransformer('all-MiniLM-L6-v2')
     query_embedding = compute_query_embedding(text, model)
     best_match = find_best_match(query_embedding, csv_filename)
     return best_match['filename']
@@ -0,0 +1,148 @@
+"""
+On-disk vector index over the sound CSVs, usable in place of the Pinecone index.
+
+The first load parses the embedding column of every CSV (sounds.csv from
+/random_search, samples.csv for the local samples). The normalized vectors,
+ids and metadata are then saved to one .npz file. Later loads read that file
+directly, unless a CSV has changed since, in which case it is rebuilt.
+query() and upsert() take the same arguments as Pinecone's, so app.py can
+use either.
+
+    index = LocalIndex(["sounds.csv", "samples.csv"], path="search_index.npz")
+    index.query(vector=embedding, top_k=5, include_metadata=True)["matches"]
+"""
+import ast
+import csv
+import json
+import os
+import threading
+import numpy as np
+
+CSV_FILES = ["sounds.csv", "samples.csv"]
+INDEX_PATH = "search_index.npz"
+METADATA_FIELDS = ["name", "description", "preview", "filename"]
+
+
+def csv_signature(csv_files):
+    """(path, mtime, size) of each CSV that exists, to tell whether a saved index is stale."""
+    return [[path, os.path.getmtime(path), os.path.getsize(path)] for path in csv_files if os.path.exists(path)]
+
+
+def read_csv(csv_filename):
+    """
+    Rows of a sounds.csv (id, name, ...) or samples.csv (filename, ...) as
+    (id, embedding, metadata).
+    """
+    with open(csv_filename, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            sound_id = str(row.get('id') or row['filename'])
+            metadata = {field: row[field] for field in METADATA_FIELDS if row.get(field)}
+            metadata.setdefault('name', row.get('filename', sound_id))
+            yield sound_id, ast.literal_eval(row['embedding']), metadata
+
+
+class LocalIndex:
+    def __init__(self, csv_files=CSV_FILES, path=INDEX_PATH):
+        """
+        Args:
+            csv_files (list): CSVs with an 'embedding' column; an id seen twice keeps its first row
+            path (str): Where the built index is saved, None to keep it in memory only
+        """
+        self.csv_files = list(csv_files)
+        self.path = path
+        self.lock = threading.Lock()
+        if not self.load():
+            self.build()
+
+    def load(self):
+        """Read the saved index if it was built from the current CSVs."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as saved:
+            header = json.loads(str(saved['header']))
+            if header['sources'] != csv_signature(self.csv_files):
+                return False
+            self.vectors = saved['vectors']
+        self.ids = header['ids']
+        self.metadata = header['metadata']
+        print(f"[Index] Loaded {len(self.ids)} vectors from {self.path}")
+        return True
+
+    def build(self):
+        ids, vectors, metadata, seen = [], [], [], set()
+        for csv_filename in self.csv_files:
+            if not os.path.exists(csv_filename):
+                continue
+            for sound_id, embedding, fields in read_csv(csv_filename):
+                if sound_id in seen:
+                    continue
+                seen.add(sound_id)
+                ids.append(sound_id)
+                vectors.append(embedding)
+                metadata.append(fields)
+        if not ids:
+            raise FileNotFoundError(f"No embeddings found in {', '.join(self.csv_files)}")
+        vectors = np.array(vectors, dtype=np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.ids = ids
+        self.metadata = metadata
+        print(f"[Index] Built {len(ids)} vectors from {', '.join(self.csv_files)}")
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        header = {"sources": csv_signature(self.csv_files), "ids": self.ids, "metadata": self.metadata}
+        # Written next to the target and renamed so a crash can't leave half an index
+        temporary = self.path + ".tmp.npz"
+        np.savez(temporary, vectors=self.vectors, header=np.array(json.dumps(header)))
+        os.replace(temporary, self.path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, vector, top_k=5, include_metadata=True):
+        """Cosine-similarity search, returned in the shape of a Pinecone query response."""
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.lock:
+            vectors, ids, metadata = self.vectors, self.ids, self.metadata
+        scores = vectors @ query
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        matches = []
+        for i in best:
+            match = {"id": ids[i], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = metadata[i]
+            matches.append(match)
+        return {"matches": matches}
+
+    def upsert(self, vectors):
+        """Add or replace (id, embedding, metadata) tuples, as Pinecone's upsert, and save."""
+        with self.lock:
+            ids, metadata = list(self.ids), list(self.metadata)
+            matrix = self.vectors.copy()
+            positions = {sound_id: i for i, sound_id in enumerate(ids)}
+            new_rows = []
+            for sound_id, embedding, fields in vectors:
+                embedding = np.asarray(embedding, dtype=np.float32)
+                embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+                if sound_id in positions:
+                    position = positions[sound_id]
+                    if position < len(matrix):
+                        matrix[position] = embedding
+                    else:
+                        new_rows[position - len(matrix)] = embedding
+                    metadata[position] = fields
+                else:
+                    positions[sound_id] = len(ids)
+                    ids.append(sound_id)
+                    metadata.append(fields)
+                    new_rows.append(embedding)
+            if new_rows:
+                matrix = np.vstack([matrix, np.array(new_rows)])
+            # Swapped in together so a concurrent query sees either the old or the new index
+            self.vectors, self.ids, self.metadata = matrix, ids, metadata
+            self.save()
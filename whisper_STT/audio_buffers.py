@@ -0,0 +1,67 @@
+import queue
+import numpy as np
+
+PCM16_SCALE = 1.0 / 32768.0  # int16 full scale -> [-1.0, 1.0), same as Whisper's own loader
+
+
+def pcm16_into(data, out):
+    """
+    Convert a pyaudio paInt16 buffer into float32 samples in place.
+
+    Args:
+        data (bytes): Raw little-endian int16 mono frames from stream.read()
+        out (np.ndarray): float32 destination slice, at least len(data) // 2 long
+
+    Returns:
+        int: Number of samples written
+    """
+    samples = np.frombuffer(data, dtype=np.int16)
+    np.multiply(samples, PCM16_SCALE, out=out[:len(samples)], casting='unsafe')
+    return len(samples)
+
+
+class ChunkPool:
+    def __init__(self, chunk_samples, count=3):
+        """
+        Preallocated float32 chunk buffers shared by a recorder and a transcriber.
+
+        The recorder takes a buffer, fills it and queues it; the transcriber
+        hands it back once Whisper is done with it, so steady-state capture
+        allocates nothing.
+
+        Args:
+            chunk_samples (int): Samples per chunk (seconds * sample rate)
+            count (int): Buffers to preallocate
+        """
+        self.chunk_samples = chunk_samples
+        self.free = queue.Queue()
+        for _ in range(count):
+            self.free.put(np.zeros(chunk_samples, dtype=np.float32))
+
+    def acquire(self):
+        """Get a free buffer, allocating a new one if the transcriber is holding them all."""
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            print("[ChunkPool] All buffers in use, allocating another (transcription is falling behind)")
+            return np.zeros(self.chunk_samples, dtype=np.float32)
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+
+def record_into(stream, buffer, chunk_size, stop_event=None):
+    """
+    Fill buffer from a pyaudio input stream.
+
+    Returns:
+        int: Samples written (less than len(buffer) if stop_event was set)
+    """
+    filled = 0
+    while filled < len(buffer):
+        if stop_event is not None and stop_event.is_set():
+            break
+        frames = min(chunk_size, len(buffer) - filled)
+        data = stream.read(frames, exception_on_overflow=False)
+        filled += pcm16_into(data, buffer[filled:])
+    return filled
@@ -0,0 +1,259 @@
+"""
+Always-on microphone capture.
+
+One PyAudio input stream is opened at the device's native rate and kept
+open. Its callback converts each block to float32 and resamples it to
+16 kHz with a streaming polyphase filter. The result goes into a ring
+buffer holding the last RING_SECONDS. Consumers (transcription, VAD, level
+meters) read zero-copy views out of the ring. A recording can therefore
+start up to RING_SECONDS in the past (pre-roll), and no consumer pays for
+opening the device.
+
+    capture = get_capture()                 # starts the stream once per process
+    audio = capture.record(5, pre_roll=0.5) # 5.5 s ending 5 s from now (a copy)
+    for block in capture.reader(pre_roll=0.5).blocks(1024):
+        ...                                 # zero-copy views, in order
+"""
+import atexit
+import math
+import threading
+import numpy as np
+from whisper_STT.audio_buffers import PCM16_SCALE
+
+SAMPLE_RATE = 16000
+RING_SECONDS = 30.0     # Audio kept for pre-roll and slow consumers
+FRAMES_PER_BUFFER = 1024
+RECORD_BLOCK = 1600     # Samples copied at a time by record() (0.1 s)
+FILTER_HALF_LENGTH = 10 # Zero crossings of the sinc on each side, same as scipy's resample_poly
+KAISER_BETA = 5.0
+
+_capture = None
+_capture_lock = threading.Lock()
+
+
+class StreamingResampler:
+    def __init__(self, in_rate, out_rate=SAMPLE_RATE):
+        """
+        Polyphase FIR resampler that keeps its filter history between blocks,
+        so blocks can be any size without clicks at the joins. Same filter
+        design as scipy.signal.resample_poly. Output lags the input by the
+        filter's group delay (about 1 ms for 48k -> 16k).
+        """
+        from scipy.signal import firwin
+
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+        factor = max(self.up, self.down)
+        taps = firwin(2 * FILTER_HALF_LENGTH * factor + 1, 1.0 / factor, window=('kaiser', KAISER_BETA))
+        taps *= self.up
+        # Pad to a whole number of phases: phases[p, j] = taps[p + j * up]
+        self.width = -(-len(taps) // self.up)
+        padded = np.zeros(self.width * self.up)
+        padded[:len(taps)] = taps
+        # Reversed per phase so each output is a dot product with a forward input window
+        self.phases = padded.reshape(self.width, self.up).T[:, ::-1].astype(np.float32)
+        self.history = np.zeros(self.width - 1, dtype=np.float32)
+        self.consumed = 0   # Input samples seen
+        self.produced = 0   # Output samples emitted
+
+    def process(self, block):
+        """Resample one float32 block. Returns a new array (may be empty)."""
+        if self.passthrough:
+            return block
+        extended = np.concatenate((self.history, block))
+        total = self.consumed + len(block)
+        # Output n uses input samples up to index n * down // up
+        available = -(-total * self.up // self.down)
+        n = np.arange(self.produced, available)
+        newest = n * self.down // self.up
+        # Position of each window's oldest sample in `extended`
+        start = newest - (self.consumed - len(self.history)) - (self.width - 1)
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.width)[start]
+        out = np.einsum('ij,ij->i', windows, self.phases[(n * self.down) % self.up])
+        self.history = extended[-(self.width - 1):].copy()
+        self.consumed = total
+        self.produced = available
+        return out.astype(np.float32, copy=False)
+
+
+class CaptureRing:
+    def __init__(self, seconds=RING_SECONDS, sample_rate=SAMPLE_RATE):
+        """
+        Single-writer float32 ring. Each sample is stored twice (at i and
+        i + capacity), so any span of up to `capacity` samples is one
+        contiguous slice and can be handed out as a view without copying.
+        Positions count samples since capture started and only ever grow.
+        """
+        self.sample_rate = sample_rate
+        self.capacity = int(seconds * sample_rate)
+        self.buffer = np.zeros(2 * self.capacity, dtype=np.float32)
+        self.position = 0
+        self.condition = threading.Condition()
+
+    def write(self, samples):
+        total = len(samples)
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        start = (self.position + total - n) % self.capacity
+        first = min(n, self.capacity - start)
+        for offset in (start, start + self.capacity):
+            self.buffer[offset:offset + first] = samples[:first]
+        # The part that wrapped goes to the start of both copies
+        rest = n - first
+        if rest:
+            self.buffer[:rest] = samples[first:]
+            self.buffer[self.capacity:self.capacity + rest] = samples[first:]
+        with self.condition:
+            self.position += total
+            self.condition.notify_all()
+
+    def oldest(self):
+        return max(0, self.position - self.capacity)
+
+    def view(self, start, end):
+        """
+        Samples [start, end) as a read-only view. Valid until the writer
+        laps it (capacity samples later); copy anything kept longer.
+        """
+        if start < self.oldest() or end > self.position or end - start > self.capacity:
+            raise IndexError(f"Samples {start}-{end} are not in the ring ({self.oldest()}-{self.position})")
+        offset = start % self.capacity
+        view = self.buffer[offset:offset + end - start]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, samples):
+        samples = min(samples, self.position - self.oldest())
+        return self.view(self.position - samples, self.position)
+
+    def wait_for(self, position, timeout=None):
+        """Block until the ring holds samples up to position. Returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.position >= position, timeout)
+
+
+class CaptureReader:
+    def __init__(self, ring, pre_roll=0.0):
+        """Sequential consumer of a CaptureRing, starting pre_roll seconds in the past."""
+        self.ring = ring
+        self.next = max(ring.oldest(), ring.position - int(pre_roll * ring.sample_rate))
+        self.overruns = 0
+
+    def read(self, samples, timeout=None):
+        """
+        Next `samples` samples as a zero-copy view (blocks until captured).
+        If the reader fell more than a ring behind, it skips to the oldest
+        audio still held and counts an overrun. Returns None on timeout.
+        """
+        if not self.ring.wait_for(self.next + samples, timeout):
+            return None
+        if self.next < self.ring.oldest():
+            self.overruns += 1
+            self.next = self.ring.oldest()
+        view = self.ring.view(self.next, self.next + samples)
+        self.next += samples
+        return view
+
+    def blocks(self, samples, timeout=2.0):
+        """Iterate over consecutive blocks; stops if capture stalls for timeout seconds."""
+        while True:
+            block = self.read(samples, timeout)
+            if block is None:
+                return
+            yield block
+
+
+class CaptureService:
+    def __init__(self, device=None, sample_rate=SAMPLE_RATE, ring_seconds=RING_SECONDS,
+                 frames_per_buffer=FRAMES_PER_BUFFER):
+        """
+        Keep one input stream open and fill a CaptureRing at sample_rate.
+
+        Args:
+            device (int): PyAudio input device index, default input if None
+            sample_rate (int): Rate of the audio in the ring (the device runs at its native rate)
+            ring_seconds (float): Longest pre-roll / slowest consumer the ring supports
+        """
+        import pyaudio
+
+        self.pyaudio = pyaudio
+        self.audio = pyaudio.PyAudio()
+        info = (self.audio.get_device_info_by_index(device) if device is not None
+                else self.audio.get_default_input_device_info())
+        self.device_rate = int(info['defaultSampleRate'])
+        self.device_name = info['name']
+        self.ring = CaptureRing(ring_seconds, sample_rate)
+        self.resampler = StreamingResampler(self.device_rate, sample_rate)
+        self.block = np.zeros(frames_per_buffer, dtype=np.float32)
+        self.overflows = 0
+        self.stream = self.audio.open(format=pyaudio.paInt16,
+                                      channels=1,
+                                      rate=self.device_rate,
+                                      input=True,
+                                      input_device_index=device,
+                                      frames_per_buffer=frames_per_buffer,
+                                      stream_callback=self.callback)
+        print(f"[Capture] {self.device_name} at {self.device_rate} Hz -> {sample_rate} Hz ring of {ring_seconds:.0f}s")
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if status & self.pyaudio.paInputOverflow:
+            self.overflows += 1
+        if len(self.block) < frame_count:
+            self.block = np.zeros(frame_count, dtype=np.float32)
+        samples = np.frombuffer(in_data, dtype=np.int16)
+        np.multiply(samples, PCM16_SCALE, out=self.block[:len(samples)], casting='unsafe')
+        self.ring.write(self.resampler.process(self.block[:len(samples)]))
+        return None, self.pyaudio.paContinue
+
+    @property
+    def sample_rate(self):
+        return self.ring.sample_rate
+
+    def reader(self, pre_roll=0.0):
+        return CaptureReader(self.ring, pre_roll)
+
+    def record(self, seconds, pre_roll=0.0):
+        """
+        Audio from pre_roll seconds ago until `seconds` from now, as a new array
+        (blocks until it has been captured).
+        """
+        reader = self.reader(pre_roll)
+        total = (self.ring.position - reader.next) + int(seconds * self.sample_rate)
+        # Copied a block at a time, so a recording can be longer than the ring
+        audio = np.empty(total, dtype=np.float32)
+        filled = 0
+        while filled < total:
+            block = reader.read(min(RECORD_BLOCK, total - filled), timeout=2.0)
+            if block is None:
+                raise RuntimeError(f"Capture from {self.device_name} stalled")
+            audio[filled:filled + len(block)] = block
+            filled += len(block)
+        return audio
+
+    def level(self, seconds=0.05):
+        """Level of the most recent audio in dBFS, read straight from the ring."""
+        recent = self.ring.latest(int(seconds * self.sample_rate))
+        if not len(recent):
+            return -120.0
+        return 10 * np.log10(np.mean(recent * recent) + 1e-12)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+
+def get_capture(device=None, **options):
+    """Process-wide capture service, opened on first use and closed at exit."""
+    global _capture
+    with _capture_lock:
+        if _capture is None:
+            _capture = CaptureService(device, **options)
+            atexit.register(_capture.close)
+            # Let the first buffers arrive so the ring isn't empty for immediate readers
+            _capture.ring.wait_for(1, timeout=1.0)
+        return _capture
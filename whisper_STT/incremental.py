@@ -0,0 +1,140 @@
+import re
+import numpy as np
+from whisper_STT.vad import FRAME_SECONDS, HANG_OVER
+
+SAMPLE_RATE = 16000
+STEP_SECONDS = 0.5      # Re-decode the window after this much new audio
+TRIM_SECONDS = 10.0     # Drop committed audio from the window once it is this long
+MAX_WINDOW = 20.0       # Hard cap on the window, even if nothing has been committed
+OVERLAP_WORDS = 5       # Longest committed tail matched against the start of a new hypothesis
+TIME_TOLERANCE = 0.1    # Words ending this close to the last committed word count as repeats
+PROMPT_WORDS = 30       # Committed words passed to Whisper as the prompt after a trim
+
+
+def normalize(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+def join_words(words):
+    return "".join(word for _, _, word in words).strip()
+
+
+class StreamingTranscriber:
+    def __init__(self, model, on_partial=None, on_final=None, sample_rate=SAMPLE_RATE, step=STEP_SECONDS,
+                 hang_over=HANG_OVER, **decode_options):
+        """
+        Incremental Whisper transcription over a rolling window with local agreement.
+
+        Every `step` seconds of new audio the whole window is decoded again.
+        A word becomes stable (committed) once two consecutive decodes agree on
+        it, so text is available long before the speaker pauses, and words
+        near a window edge are not lost as they are with fixed chunks.
+
+        Args:
+            model: Loaded whisper model
+            on_partial (callable): on_partial(stable, unstable) after each decode;
+                stable text never changes afterwards, unstable is the current guess
+            on_final (callable): on_final(text) at the end of each utterance
+            hang_over (float): Seconds of non-speech that end an utterance
+            decode_options: Extra arguments for model.transcribe (language, fp16, ...)
+        """
+        self.model = model
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.sample_rate = sample_rate
+        self.step_samples = int(step * sample_rate)
+        self.hang_samples = int(hang_over * sample_rate)
+        self.decode_options = decode_options
+        self.buffer = np.zeros(int(MAX_WINDOW * sample_rate), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.length = 0          # Samples in the window
+        self.offset = 0.0        # Stream time (seconds) of the window's first sample
+        self.unprocessed = 0     # Samples added since the last decode
+        self.silence = 0         # Trailing non-speech samples
+        self.committed = []      # (start, end, word) agreed by two decodes
+        self.previous = []       # Uncommitted tail of the last hypothesis
+        self.last_end = -1.0     # End time of the last committed word
+
+    def insert(self, audio, speech=True):
+        """
+        Add captured audio. Non-speech audio is only kept within the hang-over
+        after speech; once the hang-over runs out the utterance is finalized.
+        """
+        if not speech:
+            if not self.length:
+                return  # Nothing to transcribe, don't spend compute on silence
+            self.silence += len(audio)
+            if self.silence >= self.hang_samples:
+                self.finish()
+                return
+        else:
+            self.silence = 0
+        if self.length + len(audio) > len(self.buffer):
+            self.trim(force=True)
+        n = min(len(audio), len(self.buffer) - self.length)
+        self.buffer[self.length:self.length + n] = audio[:n]
+        self.length += n
+        self.unprocessed += n
+        if self.unprocessed >= self.step_samples:
+            self.process()
+
+    def decode(self):
+        """Decode the window into (start, end, word) with stream times."""
+        prompt = join_words(self.committed[-PROMPT_WORDS:]) or None
+        result = self.model.transcribe(self.buffer[:self.length], word_timestamps=True,
+                                       condition_on_previous_text=False, initial_prompt=prompt,
+                                       **self.decode_options)
+        return [(self.offset + word["start"], self.offset + word["end"], word["word"])
+                for segment in result.get("segments", []) for word in segment.get("words", [])]
+
+    def process(self):
+        self.unprocessed = 0
+        words = [w for w in self.decode() if w[1] > self.last_end + TIME_TOLERANCE]
+        # Whisper often repeats the last committed words at the start of the window
+        tail = [normalize(w[2]) for w in self.committed[-OVERLAP_WORDS:]]
+        for n in range(min(len(tail), len(words)), 0, -1):
+            if tail[-n:] == [normalize(w[2]) for w in words[:n]]:
+                words = words[n:]
+                break
+
+        # Local agreement: commit the prefix this decode shares with the previous one
+        agreed = 0
+        while (agreed < len(words) and agreed < len(self.previous)
+               and normalize(words[agreed][2]) == normalize(self.previous[agreed][2])):
+            agreed += 1
+        if agreed:
+            self.committed.extend(words[:agreed])
+            self.last_end = words[agreed - 1][1]
+        self.previous = words[agreed:]
+        if self.on_partial:
+            self.on_partial(join_words(self.committed), join_words(self.previous))
+        self.trim()
+
+    def trim(self, force=False):
+        """Drop audio that only contains committed words once the window gets long."""
+        if self.length < TRIM_SECONDS * self.sample_rate and not force:
+            return
+        cut = int((self.last_end - self.offset) * self.sample_rate)
+        if force and cut <= 0:
+            cut = self.length // 2  # Nothing agreed for a whole window; keep the newer half
+        cut = min(max(cut, 0), self.length)
+        if cut:
+            self.buffer[:self.length - cut] = self.buffer[cut:self.length]
+            self.length -= cut
+            self.offset += cut / self.sample_rate
+
+    def finish(self):
+        """End the utterance: decode what's left once more and emit the final text."""
+        if self.length and self.unprocessed:
+            self.process()
+        text = join_words(self.committed + self.previous)
+        self.reset()
+        if text and self.on_final:
+            self.on_final(text)
+
+
+def block_is_speech(detector, block, sample_rate=SAMPLE_RATE):
+    """Run a frame-level VAD detector over a capture block; speech if any frame is."""
+    frame = int(FRAME_SECONDS * sample_rate)
+    return any(detector.is_speech(block[i:i + frame]) for i in range(0, len(block) - frame + 1, frame))
@@ -1,31 +1,39 @@
+import argparse
 import pyaudio
-import wave
-import whisper
 import threading
 import queue
 import time
 import os
+import numpy as np
+from whisper_STT.audio_buffers import ChunkPool, record_into, pcm16_into  # run from the repo root: python -m whisper_STT.live_cts_whisper
+from whisper_STT.vad import Segmenter, make_detector
+from whisper_STT.incremental import StreamingTranscriber, block_is_speech
+from whisper_STT.server import TranscriptionClient
+from inference import MODES, load_whisper
+from whisper_STT.workers import Chunk, ChunkQueue, LagMonitor, TranscriberPool, POLICIES, set_torch_threads
 
 # --------------------------------
 # CONFIGURATION
 # --------------------------------
-CHUNK_DURATION = 10         # seconds for each audio chunk
+CHUNK_DURATION = 10         # seconds for each audio chunk (with VAD: the longest utterance)
 SAMPLE_RATE = 16000         # Whisper prefers 16kHz
 CHANNELS = 1                # Mono
 CHUNK_SIZE = 1024           # Frames per buffer
 AUDIO_FORMAT = pyaudio.paInt16
 
-OUTPUT_FOLDER = "./chunks"   # Folder to temporarily store chunk WAVs
 TRANSCRIPT_FILE = "transcript.txt"  # File to store transcribed text
 
 # Global stop event to signal threads to quit
 stop_event = threading.Event()
 
 
-def record_chunks(q: queue.Queue):
+def record_chunks(q: ChunkQueue, pool: ChunkPool, vad=None):
     """
-    Continuously records audio in CHUNK_DURATION-second chunks.
-    For each chunk, saves a unique WAV file and puts the filename on the queue.
+    Continuously records audio and queues it as Chunks.
+    With a VAD ("energy" or "webrtc") only utterances are queued, cut at
+    speech boundaries; without one, fixed CHUNK_DURATION-second chunks.
+    Audio is converted straight into float32 buffers from the pool - nothing
+    touches the disk.
     """
     p = pyaudio.PyAudio()
 
@@ -39,32 +47,74 @@ def record_chunks(q: queue.Queue):
     print("[Recorder] Started recording chunks. Press Ctrl+C to stop.")
 
     try:
+        if vad is not None:
+            record_utterances(stream, q, pool, vad)
+            return
+
         while not stop_event.is_set():
-            frames = []
             # Record exactly CHUNK_DURATION seconds
-            for _ in range(0, int(SAMPLE_RATE / CHUNK_SIZE * CHUNK_DURATION)):
-                if stop_event.is_set():
-                    break
-                data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                frames.append(data)
+            buffer = pool.acquire()
+            samples = record_into(stream, buffer, CHUNK_SIZE, stop_event)
 
-            if not frames:
+            if not samples:
+                pool.release(buffer)
                 break  # if we got no frames, probably stopping
 
-            chunk_filename = os.path.join(OUTPUT_FOLDER, f"chunk_{chunk_counter}.wav")
+            chunk_name = f"chunk_{chunk_counter}"
+            print(f"[Recorder] Captured {chunk_name} ({samples / SAMPLE_RATE:.1f}s)")
+            q.put(Chunk(chunk_name, buffer, samples, time.monotonic()))  # Hand the audio to the transcribers
+
+            chunk_counter += 1
 
-            # Save the chunk to a WAV file
-            with wave.open(chunk_filename, 'wb') as wf:
-                wf.setnchannels(CHANNELS)
-                wf.setsampwidth(p.get_sample_size(AUDIO_FORMAT))
-                wf.setframerate(SAMPLE_RATE)
-                wf.writeframes(b''.join(frames))
+    finally:
+        print("[Recorder] Stopping microphone...")
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+        print("[Recorder] Microphone closed.")
+        q.close()
 
-            print(f"[Recorder] Wrote chunk: {chunk_filename}")
-            q.put(chunk_filename)  # Put the file on the queue for transcription
 
-            chunk_counter += 1
+def record_utterances(stream, q: ChunkQueue, pool: ChunkPool, vad):
+    """Feed the microphone through the VAD and queue each utterance as it ends."""
+    counter = 0
 
+    def on_utterance(audio):
+        nonlocal counter
+        buffer = pool.acquire()
+        buffer[:len(audio)] = audio
+        name = f"utterance_{counter}"
+        print(f"[Recorder] Captured {name} ({len(audio) / SAMPLE_RATE:.1f}s)")
+        q.put(Chunk(name, buffer, len(audio), time.monotonic()))
+        counter += 1
+
+    segmenter = Segmenter(make_detector(vad), on_utterance, SAMPLE_RATE, max_utterance=CHUNK_DURATION)
+    block = np.zeros(CHUNK_SIZE, dtype=np.float32)
+    while not stop_event.is_set():
+        data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
+        segmenter.feed(block[:pcm16_into(data, block)])
+    segmenter.flush()
+
+
+def record_stream(q: queue.Queue, vad=None):
+    """
+    Streaming mode: queue every captured block as (audio, is_speech) for
+    the incremental transcriber. Without a VAD every block counts as speech.
+    """
+    p = pyaudio.PyAudio()
+    stream = p.open(format=AUDIO_FORMAT,
+                    channels=CHANNELS,
+                    rate=SAMPLE_RATE,
+                    input=True,
+                    frames_per_buffer=CHUNK_SIZE)
+    detector = make_detector(vad) if vad else None
+    print("[Recorder] Streaming microphone. Press Ctrl+C to stop.")
+    try:
+        while not stop_event.is_set():
+            data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
+            block = np.empty(CHUNK_SIZE, dtype=np.float32)
+            block = block[:pcm16_into(data, block)]
+            q.put((block, detector is None or block_is_speech(detector, block, SAMPLE_RATE)))
     finally:
         print("[Recorder] Stopping microphone...")
         stream.stop_stream()
@@ -73,68 +123,110 @@ def record_chunks(q: queue.Queue):
         print("[Recorder] Microphone closed.")
 
 
-def transcribe_chunks(q: queue.Queue, model):
+def transcribe_stream(q: queue.Queue, model):
     """
-    Pulls chunk filenames from the queue, transcribes them with Whisper,
-    prints the text, and then deletes the WAV file.
-    Also appends the text to TRANSCRIPT_FILE.
+    Streaming mode: re-decode a rolling window every STEP_SECONDS, printing
+    partial text as soon as two decodes agree on it and the final text when
+    the speaker pauses. Finals are appended to TRANSCRIPT_FILE.
     """
-    # Open the transcript file in append mode
-    # so each new chunk’s text is added at the end.
     with open(TRANSCRIPT_FILE, 'a', encoding='utf-8') as transcript_f:
+        def on_partial(stable, unstable):
+            print(f"[Partial] {stable} | {unstable}")
+
+        def on_final(text):
+            print(f"[Final] {text}\n")
+            transcript_f.write(text + "\n")
+            transcript_f.flush()
+
+        transcriber = StreamingTranscriber(model, on_partial, on_final, SAMPLE_RATE)
         while not stop_event.is_set() or not q.empty():
             try:
-                chunk_filename = q.get(timeout=1)  # Wait for a chunk up to 1 second
-            except:
-                # If queue is empty and stop_event not set, keep waiting
+                block, speech = q.get(timeout=1)
+            except queue.Empty:
                 continue
-
-            print(f"[Transcriber] Transcribing {chunk_filename}...")
-
-            result = model.transcribe(chunk_filename)
-            text = result.get("text", "").strip()
-
-            # Print to console
-            print(f"{chunk_filename}: {text}\n")
-
-            # Write to transcript file
-            transcript_f.write(f"{chunk_filename}: {text}\n")
-            transcript_f.flush()  # Make sure it's written to disk immediately
-
-            # Delete the chunk file to save space
-            if os.path.exists(chunk_filename):
-                os.remove(chunk_filename)
-                print(f"[Transcriber] Deleted {chunk_filename}.")
-
+            transcriber.insert(block, speech)
             q.task_done()
+        transcriber.finish()
+        print("[Transcriber] Stream ended. Exiting thread.")
 
-        print("[Transcriber] No more chunks to process. Exiting thread.")
+
+def write_chunks(transcript_f, monitor: LagMonitor):
+    """
+    Returns the result callback for the transcription workers: prints each
+    chunk's text with how far it trails the audio, and appends it to the
+    transcript file. Results arrive in capture order.
+    """
+    def on_result(chunk, text):
+        lag = monitor.record(chunk, time.monotonic())
+        model_note = " [fallback model]" if chunk.fast else ""
+        print(f"{chunk.name}: {text}  (lag {lag:.1f}s{model_note})\n")
+        transcript_f.write(f"{chunk.name}: {text}\n")
+        transcript_f.flush()  # Make sure it's written to disk immediately
+    return on_result
 
 
 def main():
-    # Make sure output folder exists
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+    parser = argparse.ArgumentParser(description="Continuously transcribe the microphone with Whisper.")
+    parser.add_argument("--vad", choices=("energy", "webrtc", "off"), default="energy",
+                        help="Cut audio at speech boundaries (webrtc needs the webrtcvad package), or off for fixed chunks")
+    parser.add_argument("--mode", choices=("chunks", "stream"), default="chunks",
+                        help="chunks: transcribe whole utterances; stream: rolling window with partial results")
+    parser.add_argument("--server", default=None, metavar="ADDRESS",
+                        help="Use a running whisper_STT.server (e.g. tcp://127.0.0.1:5590) instead of loading a model")
+    parser.add_argument("--model", default="tiny", help="Whisper model for the workers")
+    parser.add_argument("--inference", choices=MODES, default=None,
+                        help="int8 for quantized CPU inference (default: INFERENCE_MODE, fp32)")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel transcription workers (chunks mode)")
+    parser.add_argument("--worker-kind", choices=("thread", "process"), default="thread",
+                        help="Threads share the process (torch releases the GIL); processes avoid it entirely")
+    parser.add_argument("--max-queued", type=int, default=4, help="Chunks waiting before the overload policy applies")
+    parser.add_argument("--overload", choices=POLICIES, default="drop-oldest",
+                        help="What to do when transcription falls behind")
+    parser.add_argument("--fallback-model", default=None,
+                        help="Smaller model for --overload smaller-model (e.g. tiny with --model base)")
+    args = parser.parse_args()
+    vad = None if args.vad == "off" else args.vad
 
     # If desired, remove old transcript file or append to it
     if os.path.exists(TRANSCRIPT_FILE):
         print(f"[Main] Warning: {TRANSCRIPT_FILE} already exists. New transcripts will be appended.\n")
 
-    # Prepare the queue that will hold chunk filenames
-    chunk_queue = queue.Queue()
-
-    # Load the Whisper 'tiny' model once
-    print("[Main] Loading Whisper tiny model...")
-    model = whisper.load_model("tiny")
-    print("[Main] Model loaded.")
+    # Utterances can be up to CHUNK_DURATION plus the VAD's pre-roll; one
+    # buffer per queued chunk, per worker, and one being recorded
+    pool = ChunkPool((CHUNK_DURATION + 1) * SAMPLE_RATE, args.max_queued + args.workers + 1)
+
+    if args.server:
+        # Shares the resident model (and its batches) with other producers
+        load_model = lambda name: TranscriptionClient(args.server)
+        print(f"[Main] Transcribing with the server at {args.server}")
+    else:
+        load_model = lambda name: load_whisper(name, args.inference)
+
+    if args.mode == "stream":
+        chunk_queue = queue.Queue()
+        print(f"[Main] Loading Whisper {args.model} model...")
+        model = load_model(args.model)
+        print("[Main] Model loaded.")
+        recorder_thread = threading.Thread(target=record_stream, args=(chunk_queue, vad), daemon=True)
+        transcriber_thread = threading.Thread(target=transcribe_stream, args=(chunk_queue, model), daemon=True)
+        transcriber_thread.start()
+    else:
+        if args.overload == "smaller-model" and (not args.fallback_model or args.server):
+            parser.error("--overload smaller-model needs --fallback-model and a local model")
+        if args.server and args.worker_kind == "process":
+            parser.error("--server works with thread workers (each holds a client connection)")
+        chunk_queue = ChunkQueue(pool, args.max_queued, args.overload, SAMPLE_RATE)
+        monitor = LagMonitor(chunk_queue, SAMPLE_RATE)
+        transcript_f = open(TRANSCRIPT_FILE, 'a', encoding='utf-8')
+        if args.worker_kind == "thread" and not args.server:
+            set_torch_threads(args.workers)
+        workers = TranscriberPool(chunk_queue, write_chunks(transcript_f, monitor), load_model, args.workers,
+                                  args.worker_kind, args.model,
+                                  args.fallback_model if args.overload == "smaller-model" else None,
+                                  args.inference)
+        recorder_thread = threading.Thread(target=record_chunks, args=(chunk_queue, pool, vad), daemon=True)
 
-    # Create threads
-    recorder_thread = threading.Thread(target=record_chunks, args=(chunk_queue,), daemon=True)
-    transcriber_thread = threading.Thread(target=transcribe_chunks, args=(chunk_queue, model), daemon=True)
-
-    # Start threads
     recorder_thread.start()
-    transcriber_thread.start()
 
     try:
         # Keep main alive until Ctrl+C
@@ -147,11 +239,15 @@ def main():
     # Wait for the recorder thread to finish
     recorder_thread.join()
 
-    # Wait until all queued chunks are transcribed
-    chunk_queue.join()
-
-    # Then transcriber thread can exit
-    transcriber_thread.join()
+    if args.mode == "stream":
+        # Wait until all queued blocks are transcribed, then the transcriber can exit
+        chunk_queue.join()
+        transcriber_thread.join()
+    else:
+        # The recorder closed the queue; workers finish what's left and exit
+        workers.join()
+        transcript_f.close()
+        monitor.report()
 
     print("[Main] All done. Exiting.")
 
@@ -0,0 +1,325 @@
+"""
+Resident Whisper transcription service.
+
+Loads the model once, runs a warm-up decode, then serves transcription
+requests from a queue. Requests that arrive together are decoded as one
+padded mel batch with whisper.decode. Long audio, and requests that need
+options like word timestamps, go through model.transcribe one at a time.
+
+In-process:
+    service = TranscriptionService("tiny")
+    service.transcribe(audio)["text"]
+Shared by several processes (main.py, the live loop):
+    python -m whisper_STT.server --model tiny
+    TranscriptionClient().transcribe(audio)["text"]
+Both objects have the same transcribe(audio, **options) signature as a
+whisper model, so they can be passed wherever a model is expected.
+"""
+import argparse
+import atexit
+import collections
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import zmq
+from inference import MODES
+
+SAMPLE_RATE = 16000
+MAX_BATCH = 8
+BATCH_WINDOW = 0.02        # Seconds to wait for more requests to join a batch
+WARMUP_SECONDS = 1.0
+REPORT_INTERVAL = 10.0     # Seconds between metric log lines (0 = off)
+LATENCY_HISTORY = 200      # Recent requests kept for latency percentiles
+SERVER_ADDRESS = "tcp://127.0.0.1:5590"
+
+_services = {}
+_services_lock = threading.Lock()
+_clients = {}
+
+
+class Request:
+    def __init__(self, audio, options):
+        self.audio = audio
+        self.options = options
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class TranscriptionService:
+    def __init__(self, model_size="tiny", device=None, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW,
+                 report_interval=REPORT_INTERVAL, mode=None, **default_options):
+        """
+        Keep a Whisper model resident and serve requests from a queue.
+
+        Args:
+            model_size (str): Whisper model name
+            device (str): torch device, defaults to Whisper's choice
+            max_batch (int): Most requests decoded together
+            batch_window (float): Seconds to wait for more requests after the first
+            report_interval (float): Seconds between metric log lines, 0 to disable
+            mode (str): "fp32" or "int8" (see inference.py), defaults to INFERENCE_MODE
+            default_options: Options applied to every request (language, fp16, ...)
+        """
+        import whisper
+        from inference import load_whisper
+
+        self.whisper = whisper
+        print(f"[Whisper] Loading {model_size} model...")
+        self.model = load_whisper(model_size, mode, device=device)
+        self.default_options = default_options
+        self.fp16 = default_options.get("fp16", self.model.device.type == "cuda")
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.queue = queue.Queue()
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY)
+        self.decode_times = collections.deque(maxlen=LATENCY_HISTORY)
+        self.batch_sizes = collections.Counter()
+        self.completed = 0
+        self.lock = threading.Lock()
+
+        start = time.perf_counter()
+        self.decode_batch([Request(np.zeros(int(WARMUP_SECONDS * SAMPLE_RATE), dtype=np.float32), {})])
+        print(f"[Whisper] Model ready (warm-up decode {time.perf_counter() - start:.2f}s)")
+        self.decode_times.clear()
+        self.latencies.clear()
+        self.batch_sizes.clear()
+        self.completed = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        if report_interval:
+            threading.Thread(target=self.report, args=(report_interval,), daemon=True).start()
+
+    # -------------------------------
+    # REQUESTS
+    # -------------------------------
+    def submit(self, audio, **options):
+        """
+        Queue audio for transcription.
+
+        Args:
+            audio (np.ndarray | str): float32 16kHz mono samples, or a file path
+            options: model.transcribe options for this request
+
+        Returns:
+            Future: Resolves to a dict with "text" (and "segments" for unbatched requests)
+        """
+        if isinstance(audio, str):
+            audio = self.whisper.load_audio(audio)
+        request = Request(np.asarray(audio, dtype=np.float32), options)
+        self.queue.put(request)
+        return request.future
+
+    def transcribe(self, audio, **options):
+        """Blocking transcription with the same signature as model.transcribe."""
+        return self.submit(audio, **options).result()
+
+    def batchable(self, request):
+        # whisper.decode handles one 30 s window with no timestamps or prompts
+        return not request.options and len(request.audio) <= self.whisper.audio.N_SAMPLES
+
+    # -------------------------------
+    # WORKER
+    # -------------------------------
+    def run(self):
+        while True:
+            first = self.queue.get()
+            if not self.batchable(first):
+                self.decode_single(first)
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    request = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if self.batchable(request):
+                    batch.append(request)
+                else:
+                    self.decode_single(request)
+            self.decode_batch(batch)
+
+    def decode_single(self, request):
+        start = time.perf_counter()
+        try:
+            options = dict(self.default_options, **request.options)
+            options.setdefault("fp16", self.fp16)
+            result = self.model.transcribe(request.audio, **options)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        self.finish([request], result_list=[result], decode_time=time.perf_counter() - start)
+
+    def decode_batch(self, batch):
+        """Decode up to 30 s per request as one padded mel batch."""
+        start = time.perf_counter()
+        whisper = self.whisper
+        try:
+            mels = [whisper.log_mel_spectrogram(whisper.pad_or_trim(request.audio), self.model.dims.n_mels)
+                    for request in batch]
+            mel = whisper.audio.torch.stack(mels).to(self.model.device)
+            options = whisper.DecodingOptions(language=self.default_options.get("language"), fp16=self.fp16,
+                                              without_timestamps=True)
+            results = whisper.decode(self.model, mel, options)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.finish(batch, result_list=[{"text": r.text, "language": r.language} for r in results],
+                    decode_time=time.perf_counter() - start)
+
+    def finish(self, batch, result_list, decode_time):
+        now = time.perf_counter()
+        with self.lock:
+            self.batch_sizes[len(batch)] += 1
+            self.decode_times.append(decode_time)
+            for request in batch:
+                self.latencies.append(now - request.submitted)
+            self.completed += len(batch)
+        for request, result in zip(batch, result_list):
+            result["latency"] = now - request.submitted
+            request.future.set_result(result)
+
+    # -------------------------------
+    # METRICS
+    # -------------------------------
+    def stats(self):
+        """Queue depth, request latency (queueing + decode) and decode time percentiles in ms."""
+        with self.lock:
+            latencies = list(self.latencies)
+            decode_times = list(self.decode_times)
+            batches = dict(self.batch_sizes)
+            completed = self.completed
+
+        def percentiles(values):
+            if not values:
+                return {}
+            return {f"p{p}": float(np.percentile(values, p)) * 1000 for p in (50, 95, 99)}
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "completed": completed,
+            "latency_ms": percentiles(latencies),
+            "decode_ms": percentiles(decode_times),
+            "batch_sizes": batches,
+        }
+
+    def report(self, interval):
+        while True:
+            time.sleep(interval)
+            stats = self.stats()
+            if stats["completed"]:
+                print(f"[Whisper] queue={stats['queue_depth']} done={stats['completed']} "
+                      f"latency p50={stats['latency_ms'].get('p50', 0):.0f}ms "
+                      f"p95={stats['latency_ms'].get('p95', 0):.0f}ms "
+                      f"decode p50={stats['decode_ms'].get('p50', 0):.0f}ms batches={stats['batch_sizes']}")
+
+
+def get_service(model_size="tiny", **options):
+    """Process-wide resident service, loaded on first use."""
+    with _services_lock:
+        if model_size not in _services:
+            _services[model_size] = TranscriptionService(model_size, **options)
+        return _services[model_size]
+
+
+# -------------------------------
+# NETWORK FRONT END
+# -------------------------------
+def serve(service, address=SERVER_ADDRESS):
+    """
+    Accept requests from other processes on a ROUTER socket. Requests are
+    submitted to the service as they arrive, so concurrent producers share
+    batches; replies go out as each future completes.
+    """
+    context = zmq.Context()
+    socket = context.socket(zmq.ROUTER)
+    socket.bind(address)
+    replies = collections.deque()
+    print(f"[Whisper] Serving on {address}")
+
+    def reply_when_done(identity, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        replies.append([identity, b"", json.dumps(result, default=float).encode('utf-8')])
+
+    try:
+        while True:
+            if socket.poll(5):
+                identity, _, header, payload = socket.recv_multipart()
+                options = json.loads(header.decode('utf-8'))
+                future = service.submit(np.frombuffer(payload, dtype=np.float32), **options)
+                future.add_done_callback(lambda f, identity=identity: reply_when_done(identity, f))
+            while replies:
+                socket.send_multipart(replies.popleft())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket.close()
+        context.term()
+
+
+class TranscriptionClient:
+    def __init__(self, address=SERVER_ADDRESS, timeout=60.0):
+        """
+        Blocking client for a running server. Calls are serialized (one REQ in
+        flight), so a client can be shared; use one per thread for parallel requests.
+        """
+        self.context = zmq.Context.instance()
+        self.address = address
+        self.timeout = timeout
+        self.socket = None
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **options):
+        with self.lock:
+            return self.request(audio, options)
+
+    def request(self, audio, options):
+        if self.socket is None:
+            self.socket = self.context.socket(zmq.REQ)
+            self.socket.connect(self.address)
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        self.socket.send_multipart([json.dumps(options).encode('utf-8'), audio.tobytes()])
+        if not self.socket.poll(self.timeout * 1000):
+            # A REQ socket can't send again without a reply; start over next time
+            self.socket.close(linger=0)
+            self.socket = None
+            raise TimeoutError(f"No reply from the transcription server at {self.address}")
+        result = json.loads(self.socket.recv().decode('utf-8'))
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    def close(self):
+        with self.lock:
+            if self.socket is not None:
+                self.socket.close(linger=0)
+                self.socket = None
+
+
+def get_client(address=SERVER_ADDRESS):
+    """Process-wide client for the server at address, created on first use and closed at exit."""
+    with _services_lock:
+        if address not in _clients:
+            _clients[address] = TranscriptionClient(address)
+            atexit.register(_clients[address].close)
+        return _clients[address]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a resident Whisper transcription server.")
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--address", default="tcp://*:5590")
+    parser.add_argument("--language", default=None, help="Skip language detection, e.g. en")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--mode", choices=MODES, default=None, help="int8 for quantized CPU inference")
+    args = parser.parse_args()
+    options = {"language": args.language} if args.language else {}
+    serve(TranscriptionService(args.model, max_batch=args.max_batch, mode=args.mode, **options), args.address)
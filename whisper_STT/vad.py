@@ -0,0 +1,175 @@
+import collections
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03   # 30 ms frames (also a frame size webrtcvad accepts)
+PRE_ROLL = 0.3         # Audio kept from before speech was detected (catches soft onsets)
+HANG_OVER = 0.5        # Silence allowed inside an utterance before it is cut
+MIN_SPEECH = 0.25      # Shorter bursts (clicks, bumps) are dropped
+MAX_UTTERANCE = 10.0   # Utterances are cut here even without a pause
+START_FRAMES = 3       # Consecutive speech frames needed to open an utterance
+
+# Energy/zero-crossing detector
+SPEECH_MARGIN_DB = 12.0   # Speech is this far above the noise floor...
+FRICATIVE_MARGIN_DB = 6.0 # ...or this far with a high zero-crossing rate (s, f, sh)
+MIN_SPEECH_DB = -55.0     # Never call anything quieter than this speech
+FRICATIVE_ZCR = 0.25      # Zero crossings per sample typical of unvoiced consonants
+FLOOR_ADAPT = 0.05        # How fast the noise floor follows non-speech frames
+
+
+class EnergyDetector:
+    def __init__(self, initial_floor_db=-60.0):
+        """
+        Frame classifier based on RMS energy against an adaptive noise floor,
+        with the zero-crossing rate used to keep quiet fricatives.
+        No model and no extra dependencies.
+        """
+        self.floor_db = initial_floor_db
+
+    def is_speech(self, frame):
+        energy_db = 10 * np.log10(np.mean(frame * frame) + 1e-12)
+        zcr = np.count_nonzero(np.diff(np.signbit(frame))) / len(frame)
+        above = energy_db - self.floor_db
+        speech = energy_db > MIN_SPEECH_DB and (
+            above > SPEECH_MARGIN_DB or (above > FRICATIVE_MARGIN_DB and zcr > FRICATIVE_ZCR))
+        if not speech:
+            # Follow the background level; drop immediately if it gets quieter
+            self.floor_db = min(energy_db, self.floor_db + FLOOR_ADAPT * (energy_db - self.floor_db))
+        return speech
+
+
+class WebRTCDetector:
+    def __init__(self, aggressiveness=2, sample_rate=SAMPLE_RATE):
+        """
+        Model-based frame classifier using the optional webrtcvad package.
+
+        Args:
+            aggressiveness (int): 0 (keeps most audio) to 3 (most aggressive filtering)
+        """
+        import webrtcvad  # optional, only needed for --vad webrtc
+
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+
+    def is_speech(self, frame):
+        pcm = (np.clip(frame, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        return self.vad.is_speech(pcm, self.sample_rate)
+
+
+def make_detector(kind):
+    if kind == "energy":
+        return EnergyDetector()
+    if kind == "webrtc":
+        return WebRTCDetector()
+    raise ValueError(f"Unknown VAD: {kind}")
+
+
+class Segmenter:
+    def __init__(self, detector, on_utterance, sample_rate=SAMPLE_RATE, pre_roll=PRE_ROLL, hang_over=HANG_OVER,
+                 min_speech=MIN_SPEECH, max_utterance=MAX_UTTERANCE):
+        """
+        Cut a continuous float32 stream into utterances at speech boundaries.
+
+        Each utterance includes pre_roll seconds before speech started and up
+        to hang_over seconds of trailing silence. on_utterance(audio) is called
+        with a view into an internal buffer that is reused afterwards, so the
+        callback must copy what it keeps.
+
+        Args:
+            detector: Object with is_speech(frame) -> bool (EnergyDetector, WebRTCDetector)
+            on_utterance (callable): Called with each utterance as a float32 array
+        """
+        self.detector = detector
+        self.on_utterance = on_utterance
+        self.frame = int(FRAME_SECONDS * sample_rate)
+        self.hang_frames = max(int(hang_over / FRAME_SECONDS), 1)
+        self.min_samples = int(min_speech * sample_rate)
+        self.pre_roll = collections.deque(maxlen=max(int(pre_roll / FRAME_SECONDS), 1))
+        self.buffer = np.zeros(int(max_utterance * sample_rate) + self.frame * self.pre_roll.maxlen, dtype=np.float32)
+        self.max_samples = int(max_utterance * sample_rate)
+        self.pending = np.zeros(self.frame, dtype=np.float32)  # Partial frame carried between feed() calls
+        self.pending_count = 0
+        self.length = 0          # Samples in the current utterance (0 = not in speech)
+        self.speech_samples = 0
+        self.silent_frames = 0
+        self.speech_run = 0
+
+    @property
+    def in_speech(self):
+        return self.length > 0
+
+    def feed(self, samples):
+        """Add float32 samples in any block size."""
+        position = 0
+        while position < len(samples):
+            n = min(self.frame - self.pending_count, len(samples) - position)
+            self.pending[self.pending_count:self.pending_count + n] = samples[position:position + n]
+            self.pending_count += n
+            position += n
+            if self.pending_count == self.frame:
+                self.process_frame(self.pending)
+                self.pending_count = 0
+
+    def process_frame(self, frame):
+        speech = self.detector.is_speech(frame)
+        if not self.in_speech:
+            self.speech_run = self.speech_run + 1 if speech else 0
+            self.pre_roll.append(frame.copy())
+            if self.speech_run >= START_FRAMES:
+                # Open the utterance with the pre-roll, which already holds the onset frames
+                for held in self.pre_roll:
+                    self.append(held)
+                self.pre_roll.clear()
+                self.speech_samples = self.speech_run * self.frame
+                self.silent_frames = 0
+            return
+
+        self.append(frame)
+        if speech:
+            self.speech_samples += self.frame
+            self.silent_frames = 0
+        else:
+            self.silent_frames += 1
+        if self.silent_frames >= self.hang_frames or self.length >= self.max_samples:
+            self.finish()
+
+    def append(self, frame):
+        self.buffer[self.length:self.length + len(frame)] = frame
+        self.length += len(frame)
+
+    def finish(self):
+        """End the current utterance (if any) and emit it unless it was too short."""
+        if self.in_speech and self.speech_samples >= self.min_samples:
+            self.on_utterance(self.buffer[:self.length])
+        self.length = 0
+        self.speech_samples = 0
+        self.silent_frames = 0
+        self.speech_run = 0
+
+    def flush(self):
+        """Call at end of stream to emit a trailing utterance."""
+        if self.in_speech and self.pending_count:
+            self.append(self.pending[:self.pending_count])
+        self.pending_count = 0
+        self.finish()
+
+
+def listen_for_utterance(blocks, detector, timeout, sample_rate=SAMPLE_RATE, **segmenter_args):
+    """
+    Feed float32 blocks (e.g. CaptureReader.blocks()) until the first utterance ends.
+
+    Returns:
+        np.ndarray: The utterance (a copy), or None if nobody spoke within timeout seconds
+    """
+    result = []
+    segmenter = Segmenter(detector, lambda audio: result.append(audio.copy()), sample_rate, **segmenter_args)
+    read = 0
+    for block in blocks:
+        segmenter.feed(block)
+        read += len(block)
+        # Keep listening past the timeout while speech that started before it is still going
+        if result or (read >= timeout * sample_rate and not segmenter.in_speech):
+            break
+    if not result:
+        segmenter.flush()
+    return result[0] if result else None
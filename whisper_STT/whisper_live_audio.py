@@ -1,53 +1,27 @@
-import pyaudio
-import wave
-import whisper
+import soundfile as sf
 import time
+from whisper_STT.capture import get_capture
+from whisper_STT.server import get_service
 
 def record_audio(seconds=30, output_filename="output.wav"):
-    """Record audio from default microphone for a given duration."""
-    # Audio recording parameters
-    CHUNK = 1024
-    FORMAT = pyaudio.paInt16
-    CHANNELS = 1
-    RATE = 44100
-
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK)
+    """Record audio from the default microphone (via the always-on capture ring) for a given duration."""
+    capture = get_capture()
 
     print(f"Recording for {seconds} seconds...")
-    frames = []
-
-    for _ in range(0, int(RATE / CHUNK * seconds)):
-        data = stream.read(CHUNK)
-        frames.append(data)
-
+    audio = capture.record(seconds)
     print("Recording finished.")
 
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    # Save the recorded data as a WAV file
-    wf = wave.open(output_filename, "wb")
-    wf.setnchannels(CHANNELS)
-    wf.setsampwidth(p.get_sample_size(FORMAT))
-    wf.setframerate(RATE)
-    wf.writeframes(b''.join(frames))
-    wf.close()
+    # Save as 16 kHz 16-bit WAV, the rate Whisper resamples to anyway
+    sf.write(output_filename, audio, capture.sample_rate, subtype='PCM_16')
     print(f"Audio saved to {output_filename}")
 
 def transcribe_audio(filename="/home/athavan/Downloads/output.wav", model_size="tiny"):
-    """Transcribe audio file using OpenAI Whisper."""
-    print(f"Loading Whisper '{model_size}' model...")
-    model = whisper.load_model(model_size)
+    """Transcribe audio file using OpenAI Whisper. The model is loaded once per process."""
+    service = get_service(model_size)
 
     print("Transcribing audio...")
     start_time = time.time()
-    result = model.transcribe(filename)
+    result = service.transcribe(filename)
     end_time = time.time()
 
     print("Transcription completed.")
@@ -0,0 +1,304 @@
+import collections
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+
+SAMPLE_RATE = 16000
+MAX_QUEUED = 4          # Chunks waiting for a worker before the overload policy kicks in
+MAX_MERGED = 30.0       # Seconds; Whisper's window, merged chunks longer than this are dropped instead
+REPORT_INTERVAL = 10.0  # Seconds between lag reports
+POLICIES = ("drop-oldest", "merge", "smaller-model")
+
+
+class Chunk:
+    def __init__(self, name, buffer, samples, captured, pooled=True):
+        """
+        Captured audio waiting for transcription.
+
+        Args:
+            buffer (np.ndarray): float32 samples (a ChunkPool buffer unless pooled=False)
+            samples (int): Valid samples in buffer
+            captured (float): time.monotonic() when the last sample was captured
+        """
+        self.name = name
+        self.buffer = buffer
+        self.samples = samples
+        self.captured = captured
+        self.pooled = pooled
+        self.fast = False   # Transcribe with the fallback model
+        self.seq = None     # Output order, assigned when a worker takes it
+
+    @property
+    def audio(self):
+        return self.buffer[:self.samples]
+
+
+class ChunkQueue:
+    def __init__(self, pool, maxsize=MAX_QUEUED, policy="drop-oldest", sample_rate=SAMPLE_RATE):
+        """
+        Bounded FIFO between the recorder and the transcription workers.
+
+        put() never blocks the recorder. When the queue is full the policy decides:
+          drop-oldest    discard the oldest chunk
+          merge          join the two oldest chunks into one (one decode instead of two),
+                         dropping the oldest once the merge would pass Whisper's 30 s window
+          smaller-model  chunks taken while the queue is at least half full are flagged
+                         for the fallback model; drops the oldest if it still fills up
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.pool = pool
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_merged = int(MAX_MERGED * sample_rate)
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.next_seq = 0
+        self.dropped = 0
+        self.merged = 0
+        self.downgraded = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def release(self, chunk):
+        if chunk.pooled:
+            self.pool.release(chunk.buffer)
+
+    def put(self, chunk):
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                self.overflow()
+            self.items.append(chunk)
+            self.condition.notify()
+
+    def overflow(self):
+        if self.policy == "merge" and len(self.items) >= 2:
+            first, second = self.items[0], self.items[1]
+            if first.samples + second.samples <= self.max_merged:
+                audio = np.concatenate((first.audio, second.audio))
+                # Lag is measured from the older chunk's audio
+                merged = Chunk(f"{first.name}+{second.name}", audio, len(audio), first.captured, pooled=False)
+                self.items.popleft()
+                self.items.popleft()
+                self.release(first)
+                self.release(second)
+                self.items.appendleft(merged)
+                self.merged += 1
+                return
+        oldest = self.items.popleft()
+        self.release(oldest)
+        self.dropped += 1
+        print(f"[Queue] Transcription is behind, dropped {oldest.name}")
+
+    def get(self, timeout=None):
+        """Next chunk in capture order, or None on timeout or once closed and empty."""
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            chunk = self.items.popleft()
+            chunk.seq = self.next_seq
+            self.next_seq += 1
+            if self.policy == "smaller-model" and len(self.items) >= self.maxsize // 2:
+                chunk.fast = True
+                self.downgraded += 1
+            return chunk
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class LagMonitor:
+    def __init__(self, queue, sample_rate=SAMPLE_RATE, interval=REPORT_INTERVAL):
+        """
+        Tracks how far transcripts trail the audio they came from (lag = time the
+        text was ready minus the time its last sample was captured) and how much
+        audio the workers get through per second of wall time.
+        """
+        self.queue = queue
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.lags = collections.deque(maxlen=100)
+        self.audio_seconds = 0.0
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.lock = threading.Lock()
+
+    def record(self, chunk, finished):
+        lag = finished - chunk.captured
+        with self.lock:
+            self.lags.append(lag)
+            self.audio_seconds += chunk.samples / self.sample_rate
+            due = finished - self.last_report >= self.interval
+            if due:
+                self.last_report = finished
+        if due:
+            self.report()
+        return lag
+
+    def stats(self):
+        with self.lock:
+            lags = list(self.lags)
+            audio_seconds = self.audio_seconds
+        elapsed = time.monotonic() - self.start
+        return {
+            "queue_depth": len(self.queue),
+            "lag_last": lags[-1] if lags else 0.0,
+            "lag_mean": float(np.mean(lags)) if lags else 0.0,
+            "lag_max": max(lags) if lags else 0.0,
+            "realtime_factor": audio_seconds / elapsed if elapsed else 0.0,
+            "dropped": self.queue.dropped,
+            "merged": self.queue.merged,
+            "downgraded": self.queue.downgraded,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"[Lag] {s['lag_last']:.1f}s behind (mean {s['lag_mean']:.1f}s, max {s['lag_max']:.1f}s), "
+              f"queue {s['queue_depth']}, {s['realtime_factor']:.2f}x realtime, "
+              f"dropped {s['dropped']}, merged {s['merged']}, fallback {s['downgraded']}")
+
+
+class InOrder:
+    def __init__(self, emit):
+        """Re-orders results from parallel workers by chunk.seq before calling emit(chunk, text)."""
+        self.emit = emit
+        self.pending = {}
+        self.next_seq = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, chunk, text):
+        with self.lock:
+            self.pending[chunk.seq] = (chunk, text)
+            while self.next_seq in self.pending:
+                self.emit(*self.pending.pop(self.next_seq))
+                self.next_seq += 1
+
+
+def set_torch_threads(workers):
+    """Split the cores between workers so parallel decodes don't oversubscribe the CPU."""
+    import torch
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+class TranscriberPool:
+    def __init__(self, queue, on_result, load_model, workers=1, kind="thread", model_size="tiny",
+                 fallback_model=None, mode=None):
+        """
+        Transcription workers pulling from a ChunkQueue.
+
+        Threads share this process (torch releases the GIL during inference)
+        but each loads its own model, since Whisper's decoder installs
+        per-call hooks that aren't safe to share. Processes avoid the GIL
+        entirely at the cost of copying each chunk to the worker.
+
+        Args:
+            on_result (callable): on_result(chunk, text), called in capture order
+            load_model (callable): load_model(name) -> object with transcribe(audio);
+                only used by thread workers
+            kind (str): "thread" or "process"
+            fallback_model (str): Model used for chunks flagged by the smaller-model policy
+            mode (str): Inference mode for process workers ("fp32" or "int8")
+        """
+        self.queue = queue
+        self.on_result = InOrder(on_result)
+        self.load_model = load_model
+        self.workers = workers
+        self.model_size = model_size
+        self.fallback_model = fallback_model
+        self.threads = []
+        if kind == "process":
+            context = multiprocessing.get_context("spawn")
+            self.jobs = context.Queue(maxsize=workers)  # Backlog stays in the ChunkQueue where the policy applies
+            self.results = context.Queue()
+            self.in_flight = {}
+            self.processes = [context.Process(target=process_worker,
+                                              args=(model_size, fallback_model, mode, workers, self.jobs, self.results),
+                                              daemon=True) for _ in range(workers)]
+            for process in self.processes:
+                process.start()
+            self.threads = [threading.Thread(target=self.dispatch, daemon=True),
+                            threading.Thread(target=self.collect, daemon=True)]
+        else:
+            self.processes = []
+            self.threads = [threading.Thread(target=self.thread_worker, args=(i,), daemon=True)
+                            for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def thread_worker(self, index):
+        print(f"[Worker {index}] Loading {self.model_size} model...")
+        models = {False: self.load_model(self.model_size)}
+        if self.fallback_model:
+            models[True] = self.load_model(self.fallback_model)
+        while True:
+            chunk = self.queue.get(timeout=1)
+            if chunk is None:
+                if self.queue.closed:
+                    break
+                continue
+            try:
+                text = models.get(chunk.fast, models[False]).transcribe(chunk.audio).get("text", "").strip()
+            except Exception as e:
+                # Still report the chunk (as silence) so InOrder doesn't wait for it forever
+                print(f"[Worker {index}] Failed to transcribe {chunk.name}: {e}")
+                text = ""
+            finally:
+                self.queue.release(chunk)
+            self.on_result(chunk, text)
+
+    def dispatch(self):
+        while True:
+            chunk = self.queue.get(timeout=1)
+            if chunk is None:
+                if self.queue.closed:
+                    break
+                continue
+            self.in_flight[chunk.seq] = chunk
+            self.jobs.put((chunk.seq, chunk.audio.copy(), chunk.fast))
+            self.queue.release(chunk)
+        for _ in self.processes:
+            self.jobs.put(None)
+
+    def collect(self):
+        finished = 0
+        while finished < len(self.processes):
+            message = self.results.get()
+            if message is None:
+                finished += 1
+                continue
+            seq, text = message
+            self.on_result(self.in_flight.pop(seq), text)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+def process_worker(model_size, fallback_model, mode, workers, jobs, results):
+    from inference import load_whisper
+
+    set_torch_threads(workers)
+    models = {False: load_whisper(model_size, mode)}
+    if fallback_model:
+        models[True] = load_whisper(fallback_model, mode)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        seq, audio, fast = job
+        try:
+            text = models.get(fast, models[False]).transcribe(audio).get("text", "").strip()
+        except Exception as e:
+            # An empty result keeps the ordering moving and this process alive for collect()
+            print(f"[Worker] Failed to transcribe chunk {seq}: {e}")
+            text = ""
+        results.put((seq, text))
+    results.put(None)